@@ -0,0 +1,239 @@
+"""
+End-to-end load benchmark of the gateway against the local mock provider.
+
+Starts benchmarks/mock_provider.py and the gateway (uvicorn main:app,
+pointed at the mock) as subprocesses, then drives concurrent streaming
+chats. The same load is first sent straight to the mock and then through
+the gateway, and each side's TTFT percentiles are reported. The overhead
+the gateway adds comes from a third, paired phase: each worker sends one
+request straight to the mock and then the same through the gateway, and
+the percentiles are taken over those per-pair differences (percentiles of
+two separate runs do not subtract). Also reports gateway RPS, CPU per
+stream and resident memory per concurrent stream (Linux /proc accounting).
+
+Run from the backend directory:
+    python -m benchmarks.bench_load [--requests 500] [--pairs 200] [--concurrency 50] [--provider groq]
+        [--ttft-ms 100] [--tokens 200] [--tokens-per-second 400]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from src.services.auth_service import AuthService
+
+JWT_SECRET: str = "benchmark-secret"
+CLOCK_TICKS: int = os.sysconf("SC_CLK_TCK")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    # utime and stime, fields 14 and 15 of proc(5)
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def _rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _wait_for_port(port: int, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+async def _stream_once(
+    session: aiohttp.ClientSession, url: str, first_marker: bytes, **request
+) -> Tuple[Optional[float], bool]:
+    """Return (TTFT seconds, completed) for one streaming request."""
+    started = time.perf_counter()
+    ttft: Optional[float] = None
+    async with session.post(url, **request) as response:
+        if response.status != 200:
+            await response.read()
+            return None, False
+        async for chunk in response.content.iter_any():
+            if ttft is None and first_marker in chunk:
+                ttft = time.perf_counter() - started
+    return ttft, ttft is not None
+
+
+async def _run_phase(
+    requests: int, concurrency: int, make_request, pid: Optional[int] = None
+) -> Dict[str, object]:
+    ttfts: List[float] = []
+    failures = 0
+    peak_rss = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        nonlocal failures
+        while not queue.empty():
+            index = queue.get_nowait()
+            try:
+                ttft, completed = await make_request(session, index)
+            except aiohttp.ClientError:
+                ttft, completed = None, False
+            if completed and ttft is not None:
+                ttfts.append(ttft)
+            else:
+                failures += 1
+
+    async def sample_rss() -> None:
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, _rss_bytes(pid))
+            await asyncio.sleep(0.05)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None)) as session:
+        sampler = asyncio.create_task(sample_rss()) if pid is not None else None
+        cpu_before = _cpu_seconds(pid) if pid is not None else 0.0
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        cpu = _cpu_seconds(pid) - cpu_before if pid is not None else 0.0
+        if sampler is not None:
+            sampler.cancel()
+    return {"ttfts": ttfts, "failures": failures, "elapsed": elapsed, "cpu": cpu, "peak_rss": peak_rss}
+
+
+async def run(args: argparse.Namespace) -> None:
+    mock_port, gateway_port = _free_port(), _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.mock_provider", "--port", str(mock_port),
+            "--ttft-ms", str(args.ttft_ms), "--tokens", str(args.tokens),
+            "--tokens-per-second", str(args.tokens_per_second), "--chunk-tokens", str(args.chunk_tokens),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    gateway_env = {
+        **os.environ,
+        "GEMINI_API_KEY": "mock",
+        "GROQ_API_KEY": "mock",
+        "GEMINI_BASE_URL": f"{mock_url}/v1beta",
+        "GROQ_BASE_URL": f"{mock_url}/openai/v1",
+        "JWT_SECRET_KEY": JWT_SECRET,
+        # Measure the streaming path, not the limiter, queue or cache
+        "RATE_LIMITS": "chat=1000000000/1",
+        "ADMISSION_MAX_STREAMS": str(max(args.concurrency * 2, 32)),
+        "RESPONSE_CACHE_ENABLED": "false",
+    }
+    gateway = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(gateway_port), "--log-level", "warning"],
+        env=gateway_env,
+    )
+    try:
+        await _wait_for_port(mock_port)
+        await _wait_for_port(gateway_port)
+
+        if args.provider == "gemini":
+            direct_url = f"{mock_url}/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse"
+            direct_body = {"contents": [{"role": "user", "parts": [{"text": "hi"}]}]}
+        else:
+            direct_url = f"{mock_url}/openai/v1/chat/completions"
+            direct_body = {"model": "mock", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+
+        async def direct(session: aiohttp.ClientSession, index: int):
+            return await _stream_once(session, direct_url, b"data:", json=direct_body)
+
+        token = AuthService(secret_key=JWT_SECRET).create_access_token("bench-user")
+        gateway_url = f"http://127.0.0.1:{gateway_port}/api/v1/chats/completion"
+
+        async def through_gateway(session: aiohttp.ClientSession, index: int):
+            form = aiohttp.FormData()
+            form.add_field("model_provider", args.provider)
+            form.add_field("messages_json", json.dumps([{"role": "user", "content": f"prompt {index}"}]))
+            return await _stream_once(
+                session, gateway_url, b'"chunk"', data=form,
+                headers={"Authorization": f"Bearer {token}", "Cache-Control": "no-store"},
+            )
+
+        # Warm both paths so one-off imports and allocations are not counted
+        await _run_phase(args.concurrency, args.concurrency, through_gateway)
+        idle_rss = _rss_bytes(gateway.pid)
+
+        async def paired(session: aiohttp.ClientSession, index: int):
+            direct_ttft, direct_completed = await direct(session, index)
+            gateway_ttft, gateway_completed = await through_gateway(session, index)
+            if not (direct_completed and gateway_completed):
+                return None, False
+            return gateway_ttft - direct_ttft, True
+
+        baseline = await _run_phase(args.requests, args.concurrency, direct)
+        loaded = await _run_phase(args.requests, args.concurrency, through_gateway, pid=gateway.pid)
+        pairs = await _run_phase(args.pairs, args.concurrency, paired)
+    finally:
+        gateway.terminate()
+        mock.terminate()
+        gateway.wait()
+        mock.wait()
+
+    completed = len(loaded["ttfts"])
+    if not completed or not baseline["ttfts"]:
+        print(f"no successful streams (gateway failures: {loaded['failures']}, direct: {baseline['failures']})")
+        return
+    print(f"provider={args.provider} requests={args.requests} concurrency={args.concurrency} "
+          f"mock ttft={args.ttft_ms}ms tokens={args.tokens}@{args.tokens_per_second}/s")
+    print(f"gateway RPS        {completed / loaded['elapsed']:10.1f}  ({loaded['failures']} failed)")
+    for label, fraction in (("p50", 0.5), ("p99", 0.99)):
+        print(f"TTFT {label} direct    {_percentile(baseline['ttfts'], fraction) * 1000:10.2f} ms")
+        print(f"TTFT {label} gateway   {_percentile(loaded['ttfts'], fraction) * 1000:10.2f} ms")
+    if pairs["ttfts"]:
+        for label, fraction in (("p50", 0.5), ("p99", 0.99)):
+            overhead = _percentile(pairs["ttfts"], fraction)
+            print(f"TTFT overhead {label}  {overhead * 1000:10.2f} ms  (per request, {len(pairs['ttfts'])} pairs)")
+    print(f"CPU per stream     {loaded['cpu'] / completed * 1000:10.2f} ms")
+    per_stream = max(0, loaded["peak_rss"] - idle_rss) / args.concurrency
+    print(f"RSS per stream     {per_stream / 1024:10.1f} KiB  (idle {idle_rss / 2**20:.1f} MiB, "
+          f"peak {loaded['peak_rss'] / 2**20:.1f} MiB)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--provider", choices=("gemini", "groq"), default="groq")
+    parser.add_argument("--ttft-ms", type=float, default=100.0)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--chunk-tokens", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark of the GCRA rate limiter against the previous deque limiter.
+
+Reports checks/second on a hot key set and retained memory per million
+users (each user making a single request).
+
+Run from the backend directory:
+    python -m benchmarks.bench_rate_limiter [--users 1000000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict
+
+from src.services.rate_limit_service import RateLimitExceeded, RateLimitService
+
+
+class DequeRateLimitService:
+    """The pre-GCRA limiter: a deque of datetimes per user, never evicted."""
+
+    def __init__(self, limit: int = 10, window_seconds: int = 60) -> None:
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.user_requests: Dict[str, Deque[datetime]] = {}
+
+    def check_rate_limit(self, user_id: str) -> None:
+        now = datetime.utcnow()
+        window_start = now - timedelta(seconds=self.window_seconds)
+        if user_id not in self.user_requests:
+            self.user_requests[user_id] = deque()
+        request_queue = self.user_requests[user_id]
+        while request_queue and request_queue[0] < window_start:
+            request_queue.popleft()
+        if len(request_queue) >= self.limit:
+            raise Exception("Rate limit exceeded")
+        request_queue.append(now)
+
+
+def checks_per_second(check: Callable[[str], None], keys: int, total: int) -> float:
+    user_ids = [f"user-{i}" for i in range(keys)]
+    start = time.perf_counter()
+    for i in range(total):
+        try:
+            check(user_ids[i % keys])
+        except (RateLimitExceeded, Exception):
+            pass
+    return total / (time.perf_counter() - start)
+
+
+def bytes_per_million(factory: Callable[[], object], users: int) -> float:
+    user_ids = [f"user-{i}" for i in range(users)]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    limiter = factory()
+    for user_id in user_ids:
+        limiter.check_rate_limit(user_id)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / users * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=2_000_000)
+    parser.add_argument("--hot-keys", type=int, default=10_000)
+    args = parser.parse_args()
+
+    for name, factory in (("gcra", RateLimitService), ("deque", DequeRateLimitService)):
+        limiter = factory()
+        rate = checks_per_second(limiter.check_rate_limit, args.hot_keys, args.checks)
+        memory = bytes_per_million(factory, args.users)
+        print(f"{name:6s} {rate / 1e6:6.2f} M checks/s  {memory / 1024 / 1024:8.1f} MiB per million users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark of near-duplicate cache lookups against a full similarity index.
+
+Fills one provider namespace of `SemanticCacheService` with synthetic
+prompts, then times `get` for rewordings of cached prompts (hits) and
+for unseen prompts (misses), and `put` into the full index.
+
+Run from the backend directory:
+    python -m benchmarks.bench_semantic_cache [--entries 100000] [--lookups 2000] [--dimensions 512]
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from src.services.semantic_cache_service import SemanticCacheService, context_id, embed, np
+
+WORDS = (
+    "how what why explain write summarize translate compare list describe python rust image photo "
+    "caption function error stack trace database index query cache latency memory thread async "
+    "model provider token stream request response server client socket retry quota budget chart"
+).split()
+
+
+def prompt(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18)))
+
+
+def reword(text: str) -> str:
+    """The same prompt as a user might retype it."""
+    return "  " + text.capitalize().replace(" ", "  ") + "?"
+
+
+def timed(call, items) -> List[float]:
+    """Milliseconds per call."""
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        call(item)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name: str, timings: List[float]) -> None:
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:8s} p50 {statistics.median(timings):7.3f} ms  p99 {p99:7.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--threshold", type=float, default=0.92)
+    args = parser.parse_args()
+    if np is None:
+        raise SystemExit("NumPy is not installed")
+
+    rng = random.Random(42)
+    cache = SemanticCacheService(
+        enabled=True, threshold=args.threshold, max_entries=args.entries, dimensions=args.dimensions
+    )
+    prompts = [prompt(rng) for _ in range(args.entries)]
+
+    # Filled through the index directly: `put` deduplicates, which would make filling quadratic
+    start = time.perf_counter()
+    cache.put("groq", [{"role": "user", "content": prompts[0]}], ["warm"], [0.0])
+    index = cache._indexes["groq"]
+    for text in prompts[1:]:
+        context, _ = context_id([{"role": "user", "content": text}])
+        index.insert(embed(text, args.dimensions), context, index.entries[0])
+    print(f"filled   {args.entries:,} entries in {time.perf_counter() - start:.1f}s, "
+          f"matrix {index.vectors.nbytes / 2 ** 20:.1f} MiB")
+
+    def lookup(messages: List[Dict[str, str]]) -> None:
+        cache.get("groq", messages)
+
+    hits = [[{"role": "user", "content": reword(rng.choice(prompts))}] for _ in range(args.lookups)]
+    misses = [[{"role": "user", "content": prompt(rng) + " unseen"}] for _ in range(args.lookups)]
+    report("embed", timed(lambda messages: embed(messages[0]["content"], args.dimensions), hits))
+    before = cache.hits
+    report("hit", timed(lookup, hits))
+    print(f"         {cache.hits - before}/{len(hits)} rewordings served from the cache")
+    before = cache.hits
+    report("miss", timed(lookup, misses))
+    print(f"         {cache.hits - before}/{len(misses)} unseen prompts matched (false hits)")
+    report("put", timed(lambda messages: cache.put("groq", messages, ["answer"], [0.0]), misses))
+
+
+if __name__ == "__main__":
+    main()
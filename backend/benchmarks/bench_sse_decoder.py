@@ -0,0 +1,114 @@
+"""
+Micro-benchmark for the incremental SSE decoder.
+
+Replays multi-megabyte recorded-style Gemini and Groq streams in random
+network-sized chunks and reports parse throughput in MB/s, next to the
+previous str-buffer + split() approach.
+
+Run from the backend directory:
+    python -m benchmarks.bench_sse_decoder [--megabytes 8]
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, List
+
+from src.providers.sse import SSEDecoder
+
+
+def build_gemini_stream(target_bytes: int) -> bytes:
+    """Build a Gemini `alt=sse` style stream (CRLF framed)."""
+    frames: List[bytes] = []
+    size = 0
+    i = 0
+    while size < target_bytes:
+        text = f"token {i} – héllo wörld 🚀 " * 3
+        event = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+        frame = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8")
+        frames.append(frame)
+        size += len(frame)
+        i += 1
+    return b"".join(frames)
+
+
+def build_groq_stream(target_bytes: int) -> bytes:
+    """Build an OpenAI-compatible Groq stream (LF framed, with [DONE])."""
+    frames: List[bytes] = [b": keep-alive\n\n"]
+    size = 0
+    i = 0
+    while size < target_bytes:
+        event = {"choices": [{"delta": {"content": f"token {i} – héllo wörld 🚀 "}}]}
+        frame = f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+        frames.append(frame)
+        size += len(frame)
+        i += 1
+    frames.append(b"data: [DONE]\n\n")
+    return b"".join(frames)
+
+
+def split_chunks(stream: bytes, seed: int = 7) -> List[bytes]:
+    """Cut a stream into 1-16 KiB chunks at arbitrary (UTF-8 unsafe) offsets."""
+    rng = random.Random(seed)
+    chunks: List[bytes] = []
+    pos = 0
+    while pos < len(stream):
+        step = rng.randint(1024, 16 * 1024)
+        chunks.append(stream[pos:pos + step])
+        pos += step
+    return chunks
+
+
+def parse_with_decoder(chunks: List[bytes]) -> int:
+    decoder = SSEDecoder()
+    events = 0
+    for chunk in chunks:
+        events += len(decoder.feed(chunk))
+    return events + len(decoder.flush())
+
+
+def parse_with_legacy_buffer(chunks: List[bytes]) -> int:
+    """The pre-decoder provider loop: decode, concatenate, split per line."""
+    buffer = ""
+    events = 0
+    for chunk in chunks:
+        buffer += chunk.decode("utf-8", errors="replace")
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            line = line.strip()
+            if line.startswith("data:") and line != "data: [DONE]":
+                events += 1
+    return events
+
+
+def measure(parse: Callable[[List[bytes]], int], chunks: List[bytes], total: int, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        parse(chunks)
+        best = min(best, time.perf_counter() - start)
+    return total / best / (1024 * 1024)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="Skip the quadratic baseline")
+    args = parser.parse_args()
+
+    target = int(args.megabytes * 1024 * 1024)
+    for name, builder in (("gemini", build_gemini_stream), ("groq", build_groq_stream)):
+        stream = builder(target)
+        chunks = split_chunks(stream)
+        events = parse_with_decoder(chunks)
+        decoder_mbps = measure(parse_with_decoder, chunks, len(stream), args.rounds)
+        line = f"{name:7s} {len(stream) / 1e6:7.1f} MB  {events:7d} events  decoder {decoder_mbps:8.1f} MB/s"
+        if not args.skip_legacy:
+            legacy_mbps = measure(parse_with_legacy_buffer, chunks, len(stream), 1)
+            line += f"  legacy {legacy_mbps:8.1f} MB/s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
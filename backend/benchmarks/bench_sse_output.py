@@ -0,0 +1,85 @@
+"""
+Benchmark of the SSE output path for a 1k-token answer.
+
+Compares the previous per-token path (json.dumps, one frame and one
+`request.is_disconnected()` poll per token) with the coalescing SSEOutput
+stage. Tokens arrive either in bursts (all at once, as when a network read
+carries many events) or paced at a fixed token rate. Reports frames, bytes
+and CPU per answer.
+
+Run from the backend directory:
+    python -m benchmarks.bench_sse_output [--tokens 1000] [--tokens-per-second 500] [--answers 20]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Callable, Tuple
+
+from starlette.requests import Request
+
+from src.services.sse_output_service import SSEOutput
+
+
+async def token_source(tokens: int, gap: float) -> AsyncIterator[str]:
+    for i in range(tokens):
+        yield f"tok{i % 10} "
+        if gap:
+            await asyncio.sleep(gap)
+
+
+async def _never() -> dict:
+    await asyncio.Event().wait()
+    return {}
+
+
+async def legacy_frames(source: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """The pre-coalescing event_stream loop."""
+    request = Request({"type": "http", "method": "POST", "headers": []}, receive=_never)
+    async for chunk in source:
+        if await request.is_disconnected():
+            break
+        payload = {"type": "chunk", "content": chunk}
+        yield f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+async def measure(make_frames: Callable[[AsyncIterator[str]], AsyncIterator[bytes]],
+                  tokens: int, gap: float, answers: int) -> Tuple[float, float, float]:
+    """Return (frames, bytes, CPU ms) per answer."""
+    frames = size = 0
+    cpu_started = time.process_time()
+    for _ in range(answers):
+        async for frame in make_frames(token_source(tokens, gap)):
+            frames += 1
+            size += len(frame)
+    cpu = time.process_time() - cpu_started
+    return frames / answers, size / answers, cpu / answers * 1000
+
+
+async def run(args: argparse.Namespace) -> None:
+    coalescing = SSEOutput()
+    per_token = SSEOutput(window_seconds=0)
+    scenarios = (("burst", 0.0), (f"{args.tokens_per_second:g} tok/s", 1 / args.tokens_per_second))
+    print(f"{args.tokens}-token answer, window {coalescing.window_seconds * 1000:g} ms, "
+          f"max {coalescing.max_bytes} B per frame")
+    for scenario, gap in scenarios:
+        answers = args.answers if gap == 0 else max(1, args.answers // 10)
+        for name, make_frames in (
+            ("legacy", legacy_frames),
+            ("per-token", per_token.frames),
+            ("coalesced", coalescing.frames),
+        ):
+            frames, size, cpu_ms = await measure(make_frames, args.tokens, gap, answers)
+            print(f"{scenario:>14s} {name:10s} {frames:7.0f} frames {size:8.0f} bytes {cpu_ms:8.2f} ms CPU")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--answers", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the Gemini and Groq streaming APIs.
+
+Serves both wire formats so the gateway can be exercised without calling
+real providers:
+    POST /v1beta/models/{model}:streamGenerateContent?alt=sse   (Gemini SSE, CRLF framed)
+    POST /openai/v1/chat/completions                            (Groq / OpenAI SSE)
+
+Point the gateway at it with
+    GEMINI_BASE_URL=http://127.0.0.1:8900/v1beta
+    GROQ_BASE_URL=http://127.0.0.1:8900/openai/v1
+
+Run from the backend directory:
+    python -m benchmarks.mock_provider [--port 8900] [--ttft-ms 200] [--tokens-per-second 100]
+        [--tokens 200] [--chunk-tokens 1] [--error-rate 0] [--rate-limit-rate 0] [--disconnect-rate 0]
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import Callable, Optional
+
+from aiohttp import web
+
+TOKEN_TEXT: str = "lorem "
+
+
+class MockConfig:
+    """Behaviour of the mock, shared by both formats."""
+
+    def __init__(
+        self,
+        ttft_ms: float = 200.0,
+        tokens_per_second: float = 100.0,
+        tokens: int = 200,
+        chunk_tokens: int = 1,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        disconnect_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+
+
+def _gemini_event(text: str) -> bytes:
+    payload = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+    # Google's endpoint frames events with CRLF
+    return f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8")
+
+
+def _groq_event(text: str) -> bytes:
+    payload = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": text}}]}
+    return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+async def _stream(
+    request: web.Request, config: MockConfig, encode: Callable[[str], bytes], done: Optional[bytes]
+) -> web.StreamResponse:
+    await request.read()
+    roll = config.random.random()
+    if roll < config.rate_limit_rate:
+        return web.json_response(
+            {"error": {"message": "Rate limit reached (mock)"}}, status=429, headers={"Retry-After": "1"}
+        )
+    if roll < config.rate_limit_rate + config.error_rate:
+        return web.json_response({"error": {"message": "Injected failure (mock)"}}, status=500)
+    disconnect_at = (
+        config.random.randrange(1, max(2, config.tokens)) if config.random.random() < config.disconnect_rate else None
+    )
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    await asyncio.sleep(config.ttft_ms / 1000)
+
+    interval = config.chunk_tokens / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+    sent = 0
+    while sent < config.tokens:
+        count = min(config.chunk_tokens, config.tokens - sent)
+        if disconnect_at is not None and sent + count > disconnect_at:
+            # Drop the connection mid-answer, as a failing upstream would
+            request.transport.close()
+            return response
+        await response.write(encode(TOKEN_TEXT * count))
+        sent += count
+        if sent < config.tokens and interval:
+            await asyncio.sleep(interval)
+    if done is not None:
+        await response.write(done)
+    await response.write_eof()
+    return response
+
+
+def create_app(config: MockConfig) -> web.Application:
+    async def gemini(request: web.Request) -> web.StreamResponse:
+        return await _stream(request, config, _gemini_event, None)
+
+    async def groq(request: web.Request) -> web.StreamResponse:
+        return await _stream(request, config, _groq_event, b"data: [DONE]\n\n")
+
+    async def head(request: web.Request) -> web.Response:
+        # Connection warm-up issues a HEAD to the origin
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post("/v1beta/models/{model}:streamGenerateContent", gemini)
+    app.router.add_post("/openai/v1/chat/completions", groq)
+    app.router.add_route("HEAD", "/", head)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--tokens", type=int, default=200, help="answer length in tokens")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="tokens per SSE event")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests failing with 429")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="share of streams cut mid-answer")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        tokens=args.tokens,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        disconnect_rate=args.disconnect_rate,
+        seed=args.seed,
+    )
+    web.run_app(create_app(config), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
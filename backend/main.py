@@ -1,17 +1,41 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from src.routes.auth_routes import auth_router
 from src.routes.chat_routes import chat_router
+from src.routes.metrics_routes import metrics_router
+from src.controllers.chat_controller import startup_chat_service, shutdown_chat_service
+from src.middlewares.rate_limit_middleware import rate_limit_service
+from src.middlewares.trace_middleware import TraceMiddleware
+from src.middlewares.upload_limit_middleware import UploadLimitMiddleware
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(application: FastAPI) -> AsyncIterator[None]:
+    # Providers and their pooled connections are ready before the first request
+    await startup_chat_service()
+    rate_limit_service.start_eviction()
+    try:
+        yield
+    finally:
+        await rate_limit_service.stop_eviction()
+        await shutdown_chat_service()
+
+
 def create_application() -> FastAPI:
     application: FastAPI = FastAPI(
         title="GC 2026 Multimodal Chatbot",
+        lifespan=lifespan,
     )
 
+    # Oversized bodies are refused before they are read into memory or disk;
+    # added first so CORS headers still wrap its 413 responses
+    application.add_middleware(UploadLimitMiddleware)
+
     # Updated CORS to handle both localhost and 127.0.0.1 for Docker stability 
     application.add_middleware(
         CORSMiddleware,
@@ -21,8 +45,12 @@ def create_application() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Outermost, so a request's trace covers every other middleware too
+    application.add_middleware(TraceMiddleware)
+
     application.include_router(auth_router)
     application.include_router(chat_router)
+    application.include_router(metrics_router)
 
     return application
 
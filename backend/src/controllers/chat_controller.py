@@ -1,49 +1,431 @@
+import asyncio
+import hashlib
 import json
+import logging
+import math
+import os
+import time
+from contextlib import aclosing
 from typing import AsyncIterator, Dict, List, Optional
 from fastapi import UploadFile, HTTPException
+from src.providers.http_pool import HttpClientPool
+from src.providers.image_pipeline import image_pipeline
+from src.services.admission_service import INTERACTIVE, AdmissionRejected
+from src.services.batch_service import BatchService
+from src.services.blob_store_service import BlobStoreService
 from src.services.chat_service import ChatService
+from src.services.conversation_service import ConversationService
+from src.services.metrics_service import metrics
+from src.services.response_cache_service import ResponseCacheService, parse_cache_control
+from src.services.semantic_cache_service import SemanticCacheService
+from src.services.single_flight_service import SingleFlightService
+from src.services.state_store_service import get_state_store
+from src.services.stream_registry_service import StreamRegistryService
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_WARMUP: bool = os.getenv("PROVIDER_WARMUP", "true").lower() in ("1", "true", "yes")
+# How long the primary may stay silent before the other provider is started
+HEDGE_DELAY_SECONDS: float = float(os.getenv("HEDGE_DELAY_MS", "1500")) / 1000
+
+# Markers placed on a contestant's queue alongside text chunks
+_STREAM_END = object()
 
 chat_service: ChatService | None = None
+http_client_pool: HttpClientPool = HttpClientPool()
+response_cache_service: ResponseCacheService = ResponseCacheService()
+semantic_cache_service: SemanticCacheService = SemanticCacheService()
+conversation_service: ConversationService = ConversationService(store=get_state_store())
+single_flight_service: SingleFlightService = SingleFlightService()
+batch_service: BatchService = BatchService()
+# Stop requests reach streams on other workers through the state store
+stream_registry_service: StreamRegistryService = StreamRegistryService(store=get_state_store())
+# Shares its index through the state store, so references resolve on any worker
+blob_store_service: BlobStoreService = BlobStoreService(store=get_state_store())
+# Provider payloads of stored images outlive the pipeline's memory cache
+image_pipeline.attach_store(blob_store_service)
+
+
+async def startup_chat_service() -> None:
+    """Build providers on the shared connection pool before the first request."""
+    global chat_service
+    # Blobs left by a previous run; the directory walk stays off the event loop
+    await asyncio.to_thread(blob_store_service.sweep)
+    blob_store_service.start_sweeping()
+    stream_registry_service.start_polling()
+    session = await http_client_pool.start()
+    chat_service = ChatService(session=session)
+    if PROVIDER_WARMUP:
+        await http_client_pool.warm_up(chat_service.warmup_urls())
+
+
+async def shutdown_chat_service() -> None:
+    """Close provider sessions and the shared connection pool."""
+    global chat_service
+    await blob_store_service.stop_sweeping()
+    await stream_registry_service.stop_polling()
+    if chat_service is not None:
+        await chat_service.close()
+        chat_service = None
+    await http_client_pool.close()
+
+
+def get_chat_service() -> ChatService:
+    """The process-wide ChatService, created on first use outside the app lifespan."""
+    global chat_service
+    if chat_service is None:
+        chat_service = ChatService()
+    return chat_service
+
+
+def check_admission(model_provider: str, priority: str = INTERACTIVE) -> None:
+    """
+    Turn a request away before its stream starts when the provider is saturated.
+
+    Raises:
+        HTTPException: 503 with Retry-After when no slot or queue place is left.
+    """
+    try:
+        get_chat_service().admission.check(model_provider.lower(), priority)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        ) from e
+
 
 async def handle_chat_completion(
     model_provider: Optional[str],
     messages: List[Dict[str, str]],
     image_files: Optional[List[UploadFile]] = None,
+    hedge_mode: str = "off",
+    cache_control: Optional[str] = None,
 ) -> AsyncIterator[str]:
-    global chat_service
-    if chat_service is None:
-        chat_service = ChatService()
+    # The helpers below use the module's service, built here on first use
+    get_chat_service()
+
+    may_read, may_write = parse_cache_control(cache_control)
+    use_cache = response_cache_service.enabled and (may_read or may_write)
+    use_semantic = semantic_cache_service.enabled and (may_read or may_write)
+    # Joining another request's stream is a shared answer, like a cache read.
+    # A hedged answer may come from either provider, so those never share one.
+    coalesce = single_flight_service.enabled and may_read and hedge_mode == "off"
+    namespace = model_provider.lower() if model_provider else "auto"
+    request_key: Optional[str] = None
+    digests: List[str] = []
+    if use_cache or coalesce or use_semantic:
+        digests = await _image_digests(image_files)
+        request_key = response_cache_service.build_key(namespace, messages, digests)
+    cache_key = request_key if use_cache else None
+    if cache_key is not None:
+        cached = response_cache_service.get(cache_key) if may_read else None
+        if cached is not None:
+            yield f"data: {json.dumps({'type': 'meta', 'event': 'cache', 'status': 'hit'})}\n\n"
+            async for chunk in response_cache_service.replay(cached):
+                yield chunk
+            return
+    if use_semantic and may_read:
+        # Rewordings of a cached prompt miss the exact key but land close to it
+        similar = await asyncio.to_thread(semantic_cache_service.get, namespace, messages, digests)
+        if similar is not None:
+            cached, similarity = similar
+            meta = {"type": "meta", "event": "cache", "status": "semantic", "similarity": round(similarity, 4)}
+            yield f"data: {json.dumps(meta)}\n\n"
+            async for chunk in response_cache_service.replay(cached):
+                yield chunk
+            return
+
+    chunks: List[str] = []
+    offsets: List[float] = []
+    cacheable = may_write and (cache_key is not None or use_semantic)
+    if coalesce:
+        stream, shared = single_flight_service.subscribe(
+            request_key, lambda: _complete_with_fallback(model_provider, messages, image_files, hedge_mode)
+        )
+        if shared:
+            # Late joiners catch up in a burst, so their timings are not the answer's
+            cacheable = False
+            yield f"data: {json.dumps({'type': 'meta', 'event': 'coalesced'})}\n\n"
+    else:
+        stream = _complete_with_fallback(model_provider, messages, image_files, hedge_mode)
+    started = time.monotonic()
+    async with aclosing(stream) as stream:
+        async for chunk in stream:
+            if chunk.startswith("data:"):
+                event = json.loads(chunk[5:])
+                # Answers that needed a fallback are not worth replaying, and a
+                # pinned provider's key must not hold another provider's answer
+                if event.get("type") != "meta" or (
+                    model_provider
+                    and event.get("event") in ("hedge", "fallback")
+                    and event.get("provider") != namespace
+                ):
+                    cacheable = False
+            elif cacheable:
+                chunks.append(chunk)
+                offsets.append(time.monotonic() - started)
+            yield chunk
+
+    # Only answers that streamed to completion reach this point
+    if cacheable and chunks:
+        offsets = [offset - offsets[0] for offset in offsets]
+        if cache_key is not None:
+            response_cache_service.put(cache_key, chunks, offsets)
+        if use_semantic:
+            await asyncio.to_thread(semantic_cache_service.put, namespace, messages, chunks, offsets, digests)
+
+
+async def handle_batch_completion(items: List[Dict[str, object]]) -> AsyncIterator[str]:
+    """Run independent text-only completions, yielding NDJSON results as they finish."""
+    async for line in batch_service.run(get_chat_service(), items):
+        yield line
 
+
+async def _image_digests(image_files: Optional[List[UploadFile]]) -> List[str]:
+    """SHA-256 of each upload's contents, hashed off the event loop."""
+    if not image_files:
+        return []
+
+    def _digest(upload: UploadFile) -> str:
+        upload.file.seek(0)
+        digest = hashlib.sha256(upload.file.read()).hexdigest()
+        upload.file.seek(0)
+        return digest
+
+    # Stored uploads already carry the hash taken while they were received
+    return [
+        getattr(upload, "digest", None) or await asyncio.to_thread(_digest, upload)
+        for upload in image_files
+    ]
+
+
+async def _complete_with_fallback(
+    model_provider: Optional[str],
+    messages: List[Dict[str, str]],
+    image_files: Optional[List[UploadFile]],
+    hedge_mode: str,
+) -> AsyncIterator[str]:
+    """Stream from the primary provider, hedging or falling back as needed."""
     # Determine primary and fallback providers
     primary = (model_provider.lower() if model_provider 
-               else chat_service.available_provider().lower())
-    fallback = "groq" if primary == "gemini" else "gemini"
+               else chat_service.available_provider())
+    if primary is None:
+        raise HTTPException(status_code=503, detail="No provider is currently available.")
+    fallback = chat_service.fallback_provider(primary)
+
+    # Text already sent to the client, so a fallback can continue it
+    delivered: List[str] = []
+    race: Dict[str, str] = {}
+    usage: Dict[str, int] = {}
+    hedged = hedge_mode != "off" and fallback is not None
 
     try:
-        # Attempt primary provider
-        async for chunk in chat_service.generate_streaming_response(
-            messages=messages,
-            image_files=image_files,
-            requested_provider=primary
-        ):
-            yield chunk
+        if hedged:
+            delay = 0.0 if hedge_mode == "race" else HEDGE_DELAY_SECONDS
+            stream = _hedged_completion(primary, fallback, messages, image_files, delay, race, usage)
+        else:
+            # Attempt primary provider
+            stream = chat_service.generate_streaming_response(
+                messages=messages,
+                image_files=image_files,
+                requested_provider=primary,
+                usage=usage,
+            )
+        # Close explicitly so a client that stops reading cancels the upstream
+        async with aclosing(stream) as stream:
+            async for chunk in stream:
+                if not chunk.startswith("data:"):
+                    delivered.append(chunk)
+                yield chunk
+        if usage.get("prompt_tokens_saved"):
+            yield _context_event(usage)
 
     except Exception as e:
-        print(f"DEBUG: Primary {primary} failed ({str(e)}). Attempting fallback to {fallback}...")
-        
-        # Send an info notification to the UI
-        yield f"data: {json.dumps({'type': 'info', 'content': f'Switching to {fallback} due to provider error...'})}\n\n"
+        if hedged and "winner" not in race:
+            # Both providers already failed before producing a token
+            raise
+        failed = race.get("winner", primary)
+        fallback = chat_service.fallback_provider(failed)
+        if fallback is None:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Provider {failed} failed and no fallback is available: {str(e)}"
+            )
+        logger.warning("Provider %s failed (%s); falling back to %s", failed, e, fallback)
+        metrics.fallbacks.labels(failed, fallback).inc()
+
+        partial = "".join(delivered)
+        if partial:
+            # Resume the interrupted answer instead of regenerating it. The UI
+            # ignores meta events, so the answer continues seamlessly.
+            fallback_messages = _continuation_messages(messages, partial)
+            meta = {"type": "meta", "event": "fallback", "provider": fallback, "resumed_chars": len(partial)}
+            yield f"data: {json.dumps(meta)}\n\n"
+        else:
+            fallback_messages = messages
+            # Send an info notification to the UI
+            yield f"data: {json.dumps({'type': 'info', 'content': f'Switching to {fallback} due to provider error...'})}\n\n"
 
         try:
             # Attempt fallback provider
             async for chunk in chat_service.generate_streaming_response(
-                messages=messages,
+                messages=fallback_messages,
                 image_files=image_files,
-                requested_provider=fallback
+                requested_provider=fallback,
+                usage=usage,
             ):
                 yield chunk
         except Exception as final_error:
             raise HTTPException(
                 status_code=503,
                 detail=f"Both providers failed. Final error: {str(final_error)}"
-            )
\ No newline at end of file
+            )
+        if usage.get("prompt_tokens_saved"):
+            yield _context_event(usage)
+
+
+def _context_event(usage: Dict[str, int]) -> str:
+    """Meta event reporting how much older history was trimmed from the prompt."""
+    meta = {"type": "meta", "event": "context", **usage}
+    return f"data: {json.dumps(meta)}\n\n"
+
+
+def _continuation_messages(messages: List[Dict[str, str]], partial: str) -> List[Dict[str, str]]:
+    """
+    Append the partial answer as an assistant prefill turn.
+
+    Providers treat a trailing assistant message as the start of their own
+    reply and continue it, so only the missing remainder is generated.
+    """
+    return [*messages, {"role": "assistant", "content": partial}]
+
+
+async def _pump(provider_key: str, messages: List[Dict[str, str]],
+                image_files: Optional[List[UploadFile]], queue: asyncio.Queue,
+                usage: Dict[str, int]) -> None:
+    """Forward one provider's stream into a queue, ending with a marker or the error."""
+    try:
+        async for chunk in chat_service.generate_streaming_response(
+            messages=messages,
+            image_files=image_files,
+            requested_provider=provider_key,
+            usage=usage,
+        ):
+            await queue.put(chunk)
+        await queue.put(_STREAM_END)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+
+
+async def _hedged_completion(
+    primary: str,
+    fallback: str,
+    messages: List[Dict[str, str]],
+    image_files: Optional[List[UploadFile]],
+    delay: float,
+    race: Dict[str, str],
+    usage: Dict[str, int],
+) -> AsyncIterator[str]:
+    """
+    Race the fallback provider against a primary that is slow to start.
+
+    The fallback is started once the primary has been silent for `delay`
+    seconds (immediately when 0). Whichever stream emits a token first wins;
+    the other upstream request is cancelled. A `meta` event reports the
+    winner and the estimated time-to-first-token saved; the winner is also
+    recorded in `race` so the caller knows which provider it is streaming,
+    and the winner's prompt usage in `usage`.
+    """
+    started = time.monotonic()
+    queues: Dict[str, asyncio.Queue] = {primary: asyncio.Queue()}
+    usages: Dict[str, Dict[str, int]] = {primary: {}}
+    tasks: Dict[str, asyncio.Task] = {
+        primary: asyncio.create_task(_pump(primary, messages, image_files, queues[primary], usages[primary]))
+    }
+    getters: Dict[asyncio.Task, str] = {}
+    errors: Dict[str, Exception] = {}
+    winner: Optional[str] = None
+    first_chunk: Optional[str] = None
+
+    def _start(provider_key: str) -> None:
+        queues[provider_key] = asyncio.Queue()
+        usages[provider_key] = {}
+        tasks[provider_key] = asyncio.create_task(
+            _pump(provider_key, messages, image_files, queues[provider_key], usages[provider_key])
+        )
+        getters[asyncio.create_task(queues[provider_key].get())] = provider_key
+
+    try:
+        getters[asyncio.create_task(queues[primary].get())] = primary
+        if delay <= 0:
+            _start(fallback)
+
+        while winner is None:
+            if not getters:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Both providers failed. Final error: {str(errors.get(fallback) or errors.get(primary))}"
+                )
+            timeout = None
+            if fallback not in tasks:
+                timeout = max(0.0, delay - (time.monotonic() - started))
+            done, _ = await asyncio.wait(getters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Primary is still silent: hedge with the other provider
+                _start(fallback)
+                continue
+
+            for getter in done:
+                provider_key = getters.pop(getter)
+                item = getter.result()
+                if isinstance(item, Exception) or item is _STREAM_END:
+                    errors[provider_key] = item if isinstance(item, Exception) else RuntimeError("empty response")
+                    if provider_key == primary and fallback not in tasks:
+                        _start(fallback)
+                elif winner is None:
+                    winner, first_chunk = provider_key, item
+
+        race["winner"] = winner
+        usage.update(usages[winner])
+        ttft = time.monotonic() - started
+        for getter in getters:
+            getter.cancel()
+        getters.clear()
+        for provider_key, task in tasks.items():
+            if provider_key != winner:
+                await chat_service.providers[provider_key].cancel_request(task)
+
+        loser = fallback if winner == primary else primary
+        saved_ms: Optional[float] = None
+        if winner == primary:
+            saved_ms = 0.0
+        elif chat_service.router.expected_ttft(loser) is not None:
+            # The primary was still silent at `ttft`, so its usual TTFT bounds the saving
+            saved_ms = max(0.0, chat_service.router.expected_ttft(loser) - ttft) * 1000
+        meta = {
+            "type": "meta",
+            "event": "hedge",
+            "provider": winner,
+            "hedged": fallback in tasks,
+            "ttft_ms": round(ttft * 1000, 1),
+            "ttft_saved_ms": round(saved_ms, 1) if saved_ms is not None else None,
+        }
+        yield f"data: {json.dumps(meta)}\n\n"
+        yield first_chunk
+
+        queue = queues[winner]
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        for getter in getters:
+            getter.cancel()
+        for provider_key, task in tasks.items():
+            await chat_service.providers[provider_key].cancel_request(task)
@@ -1,7 +1,10 @@
-from typing import Annotated
+from typing import Annotated, Dict
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from src.services.auth_service import AuthService
+from src.services.auth_service import OPERATOR_ROLE, AuthService, RefreshTokenStore
+from src.services.rate_limit_service import DEFAULT_TIER
+from src.services.state_store_service import get_state_store
+from src.services.trace_service import span
 from dotenv import load_dotenv
 import os
 
@@ -11,26 +14,50 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 if not JWT_SECRET_KEY:
     raise RuntimeError("JWT_SECRET_KEY not set in environment")
 
-# Use the same AuthService as routes
-auth_service: AuthService = AuthService(secret_key=JWT_SECRET_KEY)
+# The single AuthService of the process; routes import it from here. Refresh
+# tokens live in the shared state store so rotation works across workers.
+auth_service: AuthService = AuthService(
+    secret_key=JWT_SECRET_KEY,
+    refresh_store=RefreshTokenStore(get_state_store()),
+)
 
 _bearer_scheme = HTTPBearer(auto_error=False)
 
 
-async def get_current_user(
+async def get_token_payload(
         credentials: Annotated[HTTPAuthorizationCredentials, Depends(_bearer_scheme)] = None,
-) -> str:
+) -> Dict[str, str]:
     """
-    Validate Bearer token and return user_id.
+    Validate Bearer token and return its payload.
     Raises 401 if missing or invalid.
     """
     if credentials is None or credentials.scheme.lower() != "bearer":
         raise HTTPException(status_code=401, detail="Missing Authorization header")
 
     raw_token = credentials.credentials
-    payload = auth_service.verify_token(raw_token)
-    user_id = payload.get("sub")
-    if not user_id:
+    with span("auth"):
+        payload = auth_service.verify_token(raw_token)
+    if not payload.get("sub"):
         raise HTTPException(status_code=401, detail="Invalid token payload")
 
-    return user_id
+    return payload
+
+
+async def get_current_user(payload: Dict[str, str] = Depends(get_token_payload)) -> str:
+    """Validate Bearer token and return user_id."""
+    return payload["sub"]
+
+
+async def get_current_tier(payload: Dict[str, str] = Depends(get_token_payload)) -> str:
+    """Rate-limit tier of the caller, from its token's `tier` claim."""
+    return payload.get("tier") or DEFAULT_TIER
+
+
+async def require_operator(payload: Dict[str, str] = Depends(get_token_payload)) -> str:
+    """
+    Validate Bearer token and return user_id of an operator.
+    Raises 403 if the token lacks the operator role.
+    """
+    if payload.get("role") != OPERATOR_ROLE:
+        raise HTTPException(status_code=403, detail="Operator role required")
+    return payload["sub"]
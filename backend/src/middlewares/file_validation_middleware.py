@@ -1,24 +1,25 @@
-from typing import List
-from fastapi import HTTPException, UploadFile
+from typing import List, Optional
 
 MAX_IMAGE_SIZE_BYTES: int = 5 * 1024 * 1024
 ALLOWED_IMAGE_TYPES: List[str] = ["image/jpeg", "image/png", "image/webp"]
+# Bytes needed to tell the allowed types apart
+SNIFF_BYTES: int = 12
 
 
-def validate_image_files(image_files: List[UploadFile]) -> None:
-    """Validate uploaded image files.
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return the MIME type of an allowed image from its leading bytes.
 
     Args:
-        image_files: List of uploaded files.
+        head: The first SNIFF_BYTES bytes of the file (fewer if it is shorter).
 
-    Raises:
-        HTTPException: If any file is invalid.
+    Returns:
+        Optional[str]: One of ALLOWED_IMAGE_TYPES, or None if the signature is unknown.
     """
-    for image_file in image_files:
-        if image_file.content_type not in ALLOWED_IMAGE_TYPES:
-            raise HTTPException(status_code=400, detail="Unsupported image type")
-        image_file.file.seek(0, 2)
-        file_size: int = image_file.file.tell()
-        image_file.file.seek(0)
-        if file_size > MAX_IMAGE_SIZE_BYTES:
-            raise HTTPException(status_code=400, detail="Image size exceeds limit")
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
@@ -1,19 +1,39 @@
+import math
+
 from fastapi import HTTPException
 
-from src.services.rate_limit_service import RateLimitService
+from src.services.rate_limit_service import (
+    DEFAULT_ROUTE,
+    DEFAULT_TIER,
+    RateLimitExceeded,
+    RateLimitService,
+)
+from src.services.metrics_service import metrics
+from src.services.state_store_service import get_state_store
 
-rate_limit_service: RateLimitService = RateLimitService()
+# Backed by the shared state store so limits hold across uvicorn workers
+rate_limit_service: RateLimitService = RateLimitService(store=get_state_store())
 
-def enforce_rate_limit(user_id: str) -> None:
+def enforce_rate_limit(user_id: str, route: str = DEFAULT_ROUTE, tier: str = DEFAULT_TIER) -> None:
     """Enforce rate limit for user.
 
     Args:
         user_id: Identifier of user.
+        route: Name of the limited route.
+        tier: Plan of the user.
 
     Raises:
-        HTTPException: If user exceeded limit.
+        HTTPException: 429 if user exceeded limit, 503 if the limiter's state store failed.
     """
     try:
-        rate_limit_service.check_rate_limit(user_id)
-    except Exception as rate_error:
-        raise HTTPException(status_code=429, detail=str(rate_error)) from rate_error
+        rate_limit_service.check_rate_limit(user_id, route=route, tier=tier)
+    except RateLimitExceeded as rate_error:
+        metrics.rate_limit_rejections.labels(route).inc()
+        raise HTTPException(
+            status_code=429,
+            detail=str(rate_error),
+            headers={"Retry-After": str(max(1, math.ceil(rate_error.retry_after)))},
+        ) from rate_error
+    except Exception as store_error:
+        # Not the caller's fault: a 429 would have clients back off from a broken server
+        raise HTTPException(status_code=503, detail="Rate limiter unavailable") from store_error
@@ -0,0 +1,30 @@
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services.trace_service import TraceService, trace_service
+
+
+class TraceMiddleware:
+    """
+    Runs each HTTP request under its own stage trace.
+
+    The trace spans the whole exchange, up to the last byte of a streamed
+    body, so gateway stages late in a stream are timed too; whether it is
+    slow is judged on its time to first token.
+    """
+
+    def __init__(self, app: ASGIApp, service: TraceService = trace_service) -> None:
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.service.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with self.service.trace(f"{scope['method']} {scope['path']}") as trace:
+            async def recording_send(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    trace.status = message["status"]
+                await send(message)
+
+            await self.app(scope, receive, recording_send)
@@ -0,0 +1,69 @@
+import os
+
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.middlewares.file_validation_middleware import MAX_IMAGE_SIZE_BYTES
+
+MAX_IMAGES_PER_REQUEST: int = int(os.getenv("MAX_IMAGES_PER_REQUEST", "4"))
+# Every image at its limit plus room for the text fields and multipart framing
+MAX_REQUEST_BYTES: int = int(
+    os.getenv("MAX_REQUEST_BYTES", str(MAX_IMAGES_PER_REQUEST * MAX_IMAGE_SIZE_BYTES + 2 * 1024 * 1024))
+)
+
+
+class UploadLimitMiddleware:
+    """
+    Rejects request bodies larger than MAX_REQUEST_BYTES before they are buffered.
+
+    A declared Content-Length over the limit is refused with 413 without
+    reading the body. Bodies without one (chunked uploads) are counted as
+    they are received and fail with 413 as soon as they pass the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int = MAX_REQUEST_BYTES) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_bytes:
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+
+        async def counting_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised into whoever is reading the body, e.g. form parsing
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, counting_receive, send)
+
+    async def _reject(self, send: Send) -> None:
+        body = b'{"detail":"Request body too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,29 +1,53 @@
 from abc import ABC, abstractmethod
-from typing import Any, AsyncGenerator, Optional
+from typing import Any, AsyncGenerator, Callable, Mapping, Optional
 import asyncio
 import aiohttp
 
+from .http_pool import build_client_timeout, build_trace_config
+
 class BaseProvider(ABC):
     """
     Abstract base class for AI providers (Gemini, Groq).
     Handles text + image requests, streaming responses, and cancellation.
     """
 
+    # Prompt tokens sent per request; older turns are trimmed beyond this
+    context_token_budget: int = 8000
+
     def __init__(self, api_key: str, base_url: str) -> None:
         self.api_key: str = api_key
         self.base_url: str = base_url
         self.session: Optional[aiohttp.ClientSession] = None
+        self._owns_session: bool = False
+        # Told each response's status and headers, e.g. to learn rate limits
+        self.response_observer: Optional[Callable[[int, Mapping[str, str]], None]] = None
+
+    def attach_session(self, session: aiohttp.ClientSession) -> None:
+        """Use a shared, application-managed session instead of a private one."""
+        self.session = session
+        self._owns_session = False
 
     async def init_session(self) -> None:
-        """Initialize aiohttp session if not already done."""
-        if self.session is None:
-            self.session = aiohttp.ClientSession(headers={"Authorization": f"Bearer {self.api_key}"})
+        """Initialize a private aiohttp session if none was attached."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=build_client_timeout(), trace_configs=[build_trace_config()])
+            self._owns_session = True
 
     async def close_session(self) -> None:
-        """Close aiohttp session to clean up resources."""
-        if self.session:
+        """Close the aiohttp session if this provider created it."""
+        if self.session and self._owns_session:
             await self.session.close()
-            self.session = None
+        self.session = None
+        self._owns_session = False
+
+    def request_headers(self) -> dict[str, str]:
+        """Per-request auth headers, so one session can serve every provider."""
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def observe_response(self, resp: aiohttp.ClientResponse) -> None:
+        """Report a response to the observer before its status is checked."""
+        if self.response_observer is not None:
+            self.response_observer(resp.status, resp.headers)
 
     @abstractmethod
     async def stream_completion(
@@ -1,10 +1,13 @@
 import os
 import json
-import base64
+import asyncio
 from typing import AsyncGenerator, Optional
 from fastapi import UploadFile
 from dotenv import load_dotenv
 from .base import BaseProvider
+from .sse import SSEDecoder
+from .image_pipeline import image_pipeline
+from src.services.trace_service import span
 
 # Load variables from .env
 load_dotenv()
@@ -12,6 +15,10 @@ load_dotenv()
 class GeminiProvider(BaseProvider):
     name = "gemini"
     model = "gemini-2.0-flash"
+    # Larger images are downscaled by Gemini anyway, so don't upload the extra pixels
+    max_image_dimension = int(os.getenv("GEMINI_MAX_IMAGE_DIMENSION", "3072"))
+    # Far below the model's window: long histories cost latency and quota
+    context_token_budget = int(os.getenv("GEMINI_CONTEXT_TOKENS", "32000"))
 
     def __init__(self) -> None:
         # Code now correctly pulls the uppercase key from .env
@@ -19,9 +26,14 @@ class GeminiProvider(BaseProvider):
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment")
 
-        base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:streamGenerateContent"
+        # Overridable to point at a local mock server (benchmarks/mock_provider.py)
+        api_root = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+        base_url = f"{api_root}/models/{self.model}:streamGenerateContent"
         super().__init__(api_key, base_url)
 
+    def request_headers(self) -> dict[str, str]:
+        return {"x-goog-api-key": self.api_key, "Content-Type": "application/json"}
+
     async def stream_completion(
         self,
         messages: list[dict[str, str]],
@@ -34,33 +46,49 @@ class GeminiProvider(BaseProvider):
         contents = []
         for msg in messages:
             parts = [{"text": msg.get("content")}]
-            contents.append({"role": msg.get("role"), "parts": parts})
+            # Gemini calls the assistant role "model"
+            role = "model" if msg.get("role") == "assistant" else msg.get("role")
+            contents.append({"role": role, "parts": parts})
+
+        # Images belong to the latest user turn, not to an assistant prefill
+        user_turns = [c for c in contents if c["role"] == "user"]
+        image_turn = user_turns[-1] if user_turns else contents[-1]
 
         # FIX: Actually attach images to the request
         if image_files:
-            for img in image_files:
-                img_bytes = await img.read()
-                encoded_img = base64.b64encode(img_bytes).decode("utf-8")
-                contents[-1]["parts"].append({
+            # Downscaling and base64 run in a worker pool, off the event loop
+            with span("image_encode", provider=self.name, images=len(image_files)):
+                encoded_images = await asyncio.gather(
+                    *(image_pipeline.encode_upload(img, self.max_image_dimension) for img in image_files)
+                )
+            for encoded in encoded_images:
+                image_turn["parts"].append({
                     "inline_data": {
-                        "mime_type": img.content_type or "image/jpeg",
-                        "data": encoded_img
+                        "mime_type": encoded.mime_type,
+                        "data": encoded.data
                     }
                 })
 
-        headers = {"x-goog-api-key": self.api_key, "Content-Type": "application/json"}
-        
-        async with self.session.post(url, json={"contents": contents}, headers=headers) as resp:
+        async with self.session.post(url, json={"contents": contents}, headers=self.request_headers()) as resp:
+            self.observe_response(resp)
             resp.raise_for_status()
-            buffer = ""
+            decoder = SSEDecoder()
             async for chunk in resp.content.iter_any():
-                buffer += chunk.decode("utf-8")
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-                    if line.startswith("data:"):
-                        try:
-                            data = json.loads(line[5:])
-                            text = data['candidates'][0]['content']['parts'][0].get('text', '')
-                            if text: yield text
-                        except: continue
\ No newline at end of file
+                for data in decoder.feed(chunk):
+                    text = self._extract_text(data)
+                    if text: yield text
+                if decoder.done:
+                    break
+            else:
+                for data in decoder.flush():
+                    text = self._extract_text(data)
+                    if text: yield text
+
+    @staticmethod
+    def _extract_text(data: str) -> Optional[str]:
+        """Pull the text delta out of a single SSE data payload."""
+        try:
+            event = json.loads(data)
+            return event['candidates'][0]['content']['parts'][0].get('text', '')
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            return None
@@ -1,18 +1,29 @@
 from typing import AsyncGenerator, Optional, List, Dict
 from fastapi import UploadFile
 from .base import BaseProvider
-import aiohttp
+from .image_pipeline import image_pipeline
+from .sse import SSEDecoder
+from src.services.trace_service import span
+import asyncio
 import os
 import json
 
 class GroqProvider(BaseProvider):
     name = "groq"
+    # Groq's per-minute token quota is small, so keep prompts short
+    context_token_budget = int(os.getenv("GROQ_CONTEXT_TOKENS", "8000"))
+    model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    # The text model cannot see images; turns with images go to a vision model
+    vision_model = os.getenv("GROQ_VISION_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+    # Groq caps base64 image requests at 4 MB, so images are sent downscaled
+    max_image_dimension = int(os.getenv("GROQ_MAX_IMAGE_DIMENSION", "1536"))
 
     def __init__(self) -> None:
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY must be set")
-        base_url = "https://api.groq.com/openai/v1"
+        # Overridable to point at a local mock server (benchmarks/mock_provider.py)
+        base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
         super().__init__(api_key, base_url)
 
     async def stream_completion(
@@ -25,25 +36,55 @@ class GroqProvider(BaseProvider):
         url = f"{self.base_url}/chat/completions"
 
         payload = {
-            "model": "llama-3.3-70b-versatile",
+            "model": self.model,
             "messages": messages,
             "stream": True
         }
 
-        async with self.session.post(url, json=payload, timeout=60) as resp:
+        if image_files:
+            # Same pool and cache as Gemini: a cited image is encoded once per resolution
+            with span("image_encode", provider=self.name, images=len(image_files)):
+                encoded_images = await asyncio.gather(
+                    *(image_pipeline.encode_upload(img, self.max_image_dimension) for img in image_files)
+                )
+            payload["model"] = self.vision_model
+            payload["messages"] = self._attach_images(messages, encoded_images)
+
+        async with self.session.post(url, json=payload, headers=self.request_headers()) as resp:
+            self.observe_response(resp)
             resp.raise_for_status()
-            buffer = ""
+            decoder = SSEDecoder()
             async for chunk in resp.content.iter_any():
-                buffer += chunk.decode("utf-8")
-                while "\n" in buffer:
-                    line, buffer = buffer.split("\n", 1)
-                    line = line.strip()
-                    if not line or line == "data: [DONE]":
-                        continue
-                    if line.startswith("data:"):
-                        try:
-                            data = json.loads(line[5:])
-                            text = data['choices'][0]['delta'].get('content')
-                            if text: yield text
-                        except:
-                            continue
\ No newline at end of file
+                for data in decoder.feed(chunk):
+                    text = self._extract_text(data)
+                    if text: yield text
+                if decoder.done:
+                    break
+            else:
+                for data in decoder.flush():
+                    text = self._extract_text(data)
+                    if text: yield text
+
+    @staticmethod
+    def _attach_images(messages: List[Dict[str, str]], encoded_images: list) -> List[Dict[str, object]]:
+        """Turn the latest user message into OpenAI-style text and image_url parts."""
+        messages = list(messages)
+        user_turns = [i for i, msg in enumerate(messages) if msg.get("role") == "user"]
+        index = user_turns[-1] if user_turns else len(messages) - 1
+        parts: List[Dict[str, object]] = [{"type": "text", "text": messages[index].get("content", "")}]
+        for encoded in encoded_images:
+            parts.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{encoded.mime_type};base64,{encoded.data}"},
+            })
+        messages[index] = {**messages[index], "content": parts}
+        return messages
+
+    @staticmethod
+    def _extract_text(data: str) -> Optional[str]:
+        """Pull the text delta out of a single SSE data payload."""
+        try:
+            event = json.loads(data)
+            return event['choices'][0]['delta'].get('content')
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            return None
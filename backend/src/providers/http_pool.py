@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import time
+from types import SimpleNamespace
+from typing import Iterable, Optional
+
+import aiohttp
+from yarl import URL
+
+from src.services.trace_service import is_sampled, record_span
+
+logger = logging.getLogger(__name__)
+
+# Pool tuning (overridable from the environment)
+POOL_LIMIT: int = int(os.getenv("HTTP_POOL_LIMIT", "200"))
+POOL_LIMIT_PER_HOST: int = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "50"))
+DNS_CACHE_TTL_SECONDS: int = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+KEEPALIVE_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+WARMUP_TIMEOUT_SECONDS: float = float(os.getenv("HTTP_WARMUP_TIMEOUT", "5"))
+
+
+def build_client_timeout() -> aiohttp.ClientTimeout:
+    """
+    Timeouts for upstream streaming calls.
+
+    There is no total timeout because completions stream for as long as the
+    model generates; instead each socket read must make progress in time.
+    """
+    return aiohttp.ClientTimeout(
+        total=None,
+        connect=CONNECT_TIMEOUT_SECONDS,
+        sock_connect=CONNECT_TIMEOUT_SECONDS,
+        sock_read=READ_TIMEOUT_SECONDS,
+    )
+
+
+async def _on_request_start(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+    context.sampled = is_sampled()
+    context.started = context.connected = time.perf_counter()
+
+
+def _connected(context: SimpleNamespace, reused: bool) -> None:
+    if context.sampled:
+        context.connected = time.perf_counter()
+        record_span("upstream_connect", context.started, context.connected, reused=reused)
+
+
+async def _on_connection_reused(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+    _connected(context, reused=True)
+
+
+async def _on_connection_created(session: aiohttp.ClientSession, context: SimpleNamespace, params: object) -> None:
+    _connected(context, reused=False)
+
+
+async def _on_request_end(
+    session: aiohttp.ClientSession, context: SimpleNamespace, params: aiohttp.TraceRequestEndParams
+) -> None:
+    if context.sampled:
+        # From a connection in hand to the response headers: sending the body plus upstream think time
+        record_span(
+            "upstream_ttfb", context.connected, time.perf_counter(),
+            host=params.url.host, status=params.response.status,
+        )
+
+
+def build_trace_config() -> aiohttp.TraceConfig:
+    """
+    Report upstream connect and time-to-first-byte as stages of the current request trace.
+
+    Only requests made while a sampled trace is current are timed.
+    """
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_connection_reuseconn.append(_on_connection_reused)
+    trace_config.on_connection_create_end.append(_on_connection_created)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
+
+
+class HttpClientPool:
+    """
+    Application-lifespan aiohttp client shared by every provider.
+
+    One connector keeps TLS connections to each provider alive between
+    requests and caches DNS lookups, so only startup pays for the handshake.
+    """
+
+    def __init__(self) -> None:
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Create the pooled session if it does not exist yet."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL_SECONDS,
+                use_dns_cache=True,
+                keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=build_client_timeout(),
+                trace_configs=[build_trace_config()],
+            )
+        return self.session
+
+    async def warm_up(self, urls: Iterable[str]) -> None:
+        """
+        Pre-connect to each upstream origin so the first user request reuses
+        an established, resolved and TLS-negotiated connection.
+
+        Failures are ignored: warm-up is an optimization, never a requirement.
+        """
+        session = await self.start()
+        origins = {str(URL(url).origin()) for url in urls}
+
+        async def _touch(origin: str) -> None:
+            try:
+                async with session.head(
+                    origin,
+                    allow_redirects=False,
+                    timeout=aiohttp.ClientTimeout(total=WARMUP_TIMEOUT_SECONDS),
+                ) as resp:
+                    await resp.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Warm-up of %s failed: %s", origin, e)
+
+        await asyncio.gather(*(_touch(origin) for origin in origins))
+
+    async def close(self) -> None:
+        """Close the pooled session and every connection it holds."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
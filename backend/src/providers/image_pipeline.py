@@ -0,0 +1,270 @@
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Protocol, Tuple, Union
+
+from fastapi import UploadFile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are only encoded
+    Image = ImageOps = None
+
+IMAGE_WORKERS: int = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_JPEG_QUALITY: int = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Larger images are refused before any pixel is decoded (a 40 MP RGBA frame is 160 MB)
+IMAGE_MAX_PIXELS: int = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+
+# Output format used when re-compressing each accepted input type
+_PIL_FORMATS: Dict[str, str] = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+_EXIF_ORIENTATION: int = 0x0112
+
+
+class MemoryReader(io.RawIOBase):
+    """A seekable read-only file over a buffer; unlike BytesIO it does not copy the buffer."""
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        super().__init__()
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = max(0, min(len(buffer), len(self._view) - self._position))
+        memoryview(buffer)[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def readall(self) -> bytes:
+        data = bytes(self._view[self._position:])
+        self._position = len(self._view)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class EncodedImage:
+    """Provider-ready image payload."""
+
+    __slots__ = ("mime_type", "data", "original_bytes", "encoded_bytes")
+
+    def __init__(self, mime_type: str, data: str, original_bytes: int, encoded_bytes: int) -> None:
+        self.mime_type = mime_type
+        self.data = data  # base64 text
+        self.original_bytes = original_bytes
+        self.encoded_bytes = encoded_bytes  # size before base64
+
+    @property
+    def bytes_saved(self) -> int:
+        return max(0, self.original_bytes - self.encoded_bytes)
+
+
+def exceeds_pixel_limit(raw: Union[bytes, memoryview], max_pixels: int = IMAGE_MAX_PIXELS) -> bool:
+    """Whether an image declares more than `max_pixels`, read from its header alone.
+
+    Undecodable input (or no Pillow) is not judged here; it is passed on as is.
+    """
+    if Image is None:
+        return False
+    try:
+        with Image.open(MemoryReader(raw)) as img:
+            width, height = img.size
+    except Image.DecompressionBombError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return width * height > max_pixels
+
+
+def _transcode(
+    raw: Union[bytes, memoryview], mime_type: str, max_dimension: int
+) -> Tuple[Union[bytes, memoryview], str]:
+    """Upright, downscale to `max_dimension` and re-compress, keeping the smaller result."""
+    pil_format = _PIL_FORMATS.get(mime_type)
+    if Image is None or pil_format is None:
+        return raw, mime_type
+    try:
+        with Image.open(MemoryReader(raw)) as img:
+            if img.size[0] * img.size[1] > IMAGE_MAX_PIXELS:
+                # Refused at ingest; never decode one that got here anyway
+                return raw, mime_type
+            orientation = img.getexif().get(_EXIF_ORIENTATION, 1)
+            if max(img.size) <= max_dimension and pil_format != "JPEG" and orientation == 1:
+                # PNG/WebP within limits: nothing to gain from a lossless re-save
+                return raw, mime_type
+            if pil_format == "JPEG":
+                # Let the decoder scale down by up to 8x instead of decoding full size
+                img.draft("RGB", (max_dimension, max_dimension))
+            if orientation != 1:
+                # Providers get pixels without EXIF, so bake the rotation in
+                img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_dimension, max_dimension))
+            if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            options = {"optimize": True}
+            if pil_format in ("JPEG", "WEBP"):
+                options["quality"] = IMAGE_JPEG_QUALITY
+            img.save(out, format=pil_format, **options)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Undecodable input is passed through and left to the provider to reject
+        return raw, mime_type
+    encoded = out.getvalue()
+    return (encoded, mime_type) if len(encoded) < len(raw) else (raw, mime_type)
+
+
+class EncodedImageStore(Protocol):
+    """Persistent second-level cache of provider payloads, keyed like the memory cache."""
+
+    def load_encoded(self, digest: str, max_dimension: int) -> Optional[EncodedImage]: ...
+
+    def save_encoded(self, digest: str, max_dimension: int, encoded: EncodedImage) -> None: ...
+
+
+class ImagePipeline:
+    """
+    Off-event-loop image preprocessing shared by providers.
+
+    Decoding, downscaling, re-compression and base64 encoding run in a
+    worker pool. Results are cached by content hash and target resolution,
+    so an image re-sent on a later turn is not processed again. An attached
+    store keeps results beyond the memory cache and across restarts.
+    """
+
+    def __init__(self, workers: int = IMAGE_WORKERS, cache_max_bytes: int = IMAGE_CACHE_MAX_BYTES) -> None:
+        self.workers = workers
+        self.cache_max_bytes = cache_max_bytes
+        self.store: Optional[EncodedImageStore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cache: "OrderedDict[Tuple[str, int], EncodedImage]" = OrderedDict()
+        self._cache_bytes: int = 0
+        self._lock = threading.Lock()
+        self.images_processed: int = 0
+        self.cache_hits: int = 0
+        self.store_hits: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image")
+        return self._executor
+
+    def attach_store(self, store: EncodedImageStore) -> None:
+        self.store = store
+
+    async def encode_upload(self, upload: UploadFile, max_dimension: int) -> EncodedImage:
+        """Read an upload and return its provider-ready encoding."""
+        mime_type = upload.content_type or "image/jpeg"
+        digest = getattr(upload, "digest", None)
+        if digest is not None:
+            # Stored images: the caches are checked before the bytes are read at all
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._pool(), self._encode_stored, upload, mime_type, max_dimension, digest
+            )
+        # Rewind in case a previous provider attempt already read it
+        await upload.seek(0)
+        raw = await upload.read()
+        return await self.encode(raw, mime_type, max_dimension)
+
+    async def encode(
+        self, raw: bytes, mime_type: str, max_dimension: int, digest: Optional[str] = None
+    ) -> EncodedImage:
+        """Process raw image bytes in the worker pool; `digest` is their SHA-256 when already known."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), self._encode_sync, raw, mime_type, max_dimension, digest)
+
+    def _encode_stored(self, upload: UploadFile, mime_type: str, max_dimension: int, digest: str) -> EncodedImage:
+        cached = self._lookup((digest, max_dimension))
+        if cached is not None:
+            return cached
+        # An immutable snapshot: both providers of a hedged request may read it at once
+        return self._encode_sync(upload.data, mime_type, max_dimension, digest)
+
+    def _lookup(self, key: Tuple[str, int]) -> Optional[EncodedImage]:
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                self.bytes_in += cached.original_bytes
+                self.bytes_out += cached.encoded_bytes
+            return cached
+
+    def _encode_sync(
+        self, raw: Union[bytes, memoryview], mime_type: str, max_dimension: int, digest: Optional[str] = None
+    ) -> EncodedImage:
+        key = (digest or hashlib.sha256(raw).hexdigest(), max_dimension)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        result = self.store.load_encoded(*key) if self.store is not None else None
+        processed = result is None
+        if result is None:
+            payload, out_mime = _transcode(raw, mime_type, max_dimension)
+            # Base64 only once the final payload is known
+            result = EncodedImage(
+                mime_type=out_mime,
+                data=base64.b64encode(payload).decode("ascii"),
+                original_bytes=len(raw),
+                encoded_bytes=len(payload),
+            )
+            if self.store is not None:
+                self.store.save_encoded(key[0], max_dimension, result)
+
+        with self._lock:
+            if processed:
+                self.images_processed += 1
+            else:
+                self.store_hits += 1
+            self.bytes_in += result.original_bytes
+            self.bytes_out += result.encoded_bytes
+            if key not in self._cache and len(result.data) <= self.cache_max_bytes:
+                self._cache[key] = result
+                self._cache_bytes += len(result.data)
+                while self._cache_bytes > self.cache_max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_bytes -= len(evicted.data)
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "images_processed": self.images_processed,
+                "cache_hits": self.cache_hits,
+                "store_hits": self.store_hits,
+                "cache_entries": len(self._cache),
+                "cache_bytes": self._cache_bytes,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": max(0, self.bytes_in - self.bytes_out),
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool; it is recreated on next use."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared by every provider so the cache and worker pool are process-wide
+image_pipeline: ImagePipeline = ImagePipeline()
@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+DONE_SENTINEL: bytes = b"[DONE]"
+
+
+class SSEDecoder:
+    """
+    Incremental, bytes-level Server-Sent Events decoder shared by providers.
+
+    Network chunks are appended to a single bytearray and scanned once, so
+    long responses parse in linear time. Payloads are decoded to str only
+    when an event is complete, which keeps UTF-8 sequences that are split
+    across chunk boundaries intact.
+    """
+
+    def __init__(self) -> None:
+        self._buffer: bytearray = bytearray()
+        self._data_lines: List[bytes] = []
+        self._pending_cr: bool = False
+        self.last_event_id: Optional[str] = None
+        self.done: bool = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        Consume a raw network chunk.
+
+        Args:
+            chunk (bytes): Bytes as received from the upstream response.
+
+        Returns:
+            List[str]: Data payloads of every event completed by this chunk.
+                The terminating "[DONE]" event is not returned; it sets
+                `done` instead.
+        """
+        if self.done or not chunk:
+            return []
+
+        # Normalize CRLF and lone CR line endings to LF. A CR at the very end
+        # of a chunk may be the first half of a CRLF pair, so remember it.
+        if self._pending_cr:
+            self._pending_cr = False
+            if chunk[:1] == b"\n":
+                chunk = chunk[1:]
+        if b"\r" in chunk:
+            if chunk[-1:] == b"\r":
+                self._pending_cr = True
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        buffer = self._buffer
+        scan_from = max(len(buffer) - 1, 0)
+        buffer += chunk
+        # Only the region up to the last blank line holds complete events;
+        # everything after it stays buffered for the next chunk.
+        cut = buffer.rfind(b"\n\n", scan_from)
+        if cut == -1:
+            return []
+        block = bytes(buffer[:cut + 1])
+        del buffer[:cut + 2]
+
+        events: List[str] = []
+        for raw_event in block.split(b"\n\n"):
+            for line in raw_event.split(b"\n"):
+                if line:
+                    self._process_line(line)
+            payload = self._dispatch()
+            if payload is not None:
+                events.append(payload)
+            if self.done:
+                break
+        return events
+
+    def flush(self) -> List[str]:
+        """Dispatch an event left unterminated when the stream closed."""
+        if self.done:
+            return []
+        for line in bytes(self._buffer).split(b"\n"):
+            if line:
+                self._process_line(line)
+        self._buffer.clear()
+        payload = self._dispatch()
+        return [payload] if payload is not None else []
+
+    def _process_line(self, line: bytes) -> None:
+        """Apply a single non-empty SSE line to the pending event."""
+        if line.startswith(b"data:"):
+            value = line[5:]
+            self._data_lines.append(value[1:] if value[:1] == b" " else value)
+            return
+        if line[:1] == b":":  # comment / keep-alive line
+            return
+        field, _, value = line.partition(b":")
+        if value[:1] == b" ":
+            value = value[1:]
+        if field == b"data":
+            self._data_lines.append(value)
+        elif field == b"id" and b"\0" not in value:
+            self.last_event_id = value.decode("utf-8", errors="replace")
+
+    def _dispatch(self) -> Optional[str]:
+        """Complete the pending event and return its data, if any."""
+        if not self._data_lines:
+            return None
+        lines = self._data_lines
+        self._data_lines = []
+        data = lines[0] if len(lines) == 1 else b"\n".join(lines)
+        if data.strip() == DONE_SENTINEL:
+            self.done = True
+            return None
+        return data.decode("utf-8", errors="replace")
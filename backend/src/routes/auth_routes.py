@@ -1,22 +1,17 @@
 import os
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from src.services.auth_service import AuthService
-
-from dotenv import load_dotenv
-load_dotenv()
-
-# Load secret from environment variable
-JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-if not JWT_SECRET_KEY:
-    raise RuntimeError("JWT_SECRET_KEY not set in environment")
-
-auth_service: AuthService = AuthService(secret_key=JWT_SECRET_KEY)
+# Share the middleware's AuthService so both see the same refresh tokens
+from src.middlewares.auth_middleware import auth_service
+from src.services.auth_service import OPERATOR_ROLE
 
 # Admin credentials (in-memory, for this task only)
 ADMIN_USER_ID = "admin-user"
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "adminpass"
+# Rate-limit tier of the admin, carried in its tokens (see RATE_LIMITS); the admin is also an operator
+ADMIN_TIER = os.getenv("ADMIN_TIER", "default")
 
 auth_router: APIRouter = APIRouter(prefix="/api/v1/auth")
 
@@ -61,8 +56,9 @@ async def login_user(payload: LoginRequest) -> TokenResponse:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # Generate tokens
-    access_token = auth_service.create_access_token(ADMIN_USER_ID)
-    refresh_token = auth_service.create_refresh_token(ADMIN_USER_ID)
+    claims = {"tier": ADMIN_TIER, "role": OPERATOR_ROLE}
+    access_token = auth_service.create_access_token(ADMIN_USER_ID, claims)
+    refresh_token = auth_service.create_refresh_token(ADMIN_USER_ID, claims)
 
     return TokenResponse(access_token=access_token, refresh_token=refresh_token)
 
@@ -1,94 +1,667 @@
-from typing import AsyncIterator, Dict, List, Optional, Literal
+import asyncio
 import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Deque, Dict, List, Optional, Literal, Tuple
 from fastapi import (
     APIRouter,
     Depends,
-    File,
-    Form,
-    UploadFile,
+    HTTPException,
     Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
 )
 from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
-from src.controllers.chat_controller import handle_chat_completion
-from src.middlewares.auth_middleware import get_current_user
-from src.middlewares.file_validation_middleware import validate_image_files
+from src.controllers.chat_controller import (
+    blob_store_service,
+    check_admission,
+    conversation_service,
+    get_chat_service,
+    handle_batch_completion,
+    handle_chat_completion,
+    response_cache_service,
+    semantic_cache_service,
+    single_flight_service,
+    stream_registry_service,
+)
+from src.middlewares.auth_middleware import auth_service, get_current_tier, get_current_user, require_operator
 from src.middlewares.rate_limit_middleware import enforce_rate_limit
+from src.middlewares.upload_limit_middleware import MAX_IMAGES_PER_REQUEST
+from src.providers.image_pipeline import image_pipeline
+from src.services.batch_service import BATCH_MAX_ITEMS
+from src.services.blob_store_service import BlobImage
+from src.services.conversation_service import Conversation, StoredImage
+from src.services.metrics_service import metrics
+from src.services.rate_limit_service import DEFAULT_TIER
+from src.services.sse_output_service import (
+    DONE_FRAME,
+    SSEOutput,
+    encode_event,
+    socket_message,
+    socket_prefix,
+)
+from src.services.stream_registry_service import StreamHandle
+from src.services.trace_service import accumulate, is_sampled, mark_first_token, span
+from src.services.upload_ingest_service import ingest_chat_form, ingest_encoded_image
 
 chat_router: APIRouter = APIRouter(prefix="/api/v1/chats")
+# Coalesces provider tokens into fewer, larger SSE frames
+sse_output: SSEOutput = SSEOutput()
+
+MODEL_PROVIDERS: Tuple[str, ...] = ("gemini", "groq")
+HEDGE_MODES: Tuple[str, ...] = ("off", "delay", "race")
+
+# WebSocket transport
+WS_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+WS_MAX_STREAMS: int = int(os.getenv("WS_MAX_STREAMS", "8"))
+# Messages buffered for a slow client before its streams are held back; replies to
+# its own messages are never held back, and the connection closes if that many pile up
+WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_POLICY_VIOLATION: int = 1008
+
 
-@chat_router.post("/completion")
+class BatchItem(BaseModel):
+    """One conversation of a batch; the provider is picked if omitted."""
+    model_config = ConfigDict(protected_namespaces=())
+
+    id: Optional[str] = None
+    model_provider: Optional[Literal["gemini", "groq"]] = None
+    messages: List[Dict[str, str]] = Field(min_length=1)
+
+
+class BatchRequest(BaseModel):
+    """Text-only conversations to complete independently."""
+    items: List[BatchItem] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
+
+@chat_router.post("/completion", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["model_provider", "messages_json"],
+                    "properties": {
+                        "model_provider": {"type": "string", "enum": list(MODEL_PROVIDERS)},
+                        "messages_json": {"type": "string"},
+                        "image_files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                        "image_refs": {"type": "string", "description": "JSON list of sha256: references"},
+                        "hedge_mode": {"type": "string", "enum": list(HEDGE_MODES), "default": "off"},
+                        "conversation_id": {"type": "string"},
+                        "store": {"type": "boolean", "default": False},
+                    },
+                },
+            },
+        },
+    },
+})
 async def create_chat_completion(
     request: Request,
-    # 1. Enforce that only 'gemini' or 'groq' are accepted as providers
-    model_provider: Literal["gemini", "groq"] = Form(...),
-    messages_json: str = Form(...),
-    # 2. Specifically typed for image uploads
-    image_files: Optional[List[UploadFile]] = File(default=None),
     user_id: str = Depends(get_current_user),
+    tier: str = Depends(get_current_tier),
 ) -> StreamingResponse:
     """
     Stream a multimodal chat completion restricted to Gemini and Groq providers.
+
+    Form fields: `model_provider` (gemini or groq), `messages_json`, optional
+    `image_files`, `image_refs` (a JSON list of references returned by the
+    image upload endpoint), `hedge_mode` (off, delay or race; start the
+    other provider if the primary is slow to answer), `conversation_id` and
+    `store`.
+
+    By default nothing is kept: `messages_json` is the full history and the
+    turn is answered statelessly. With `store=true` a new conversation is
+    kept server-side; its id is returned in the first SSE event and the
+    `X-Conversation-Id` header. With `conversation_id`, `messages_json`
+    holds only the new message(s) and `image_files` only new images, which
+    are kept in the blob store and cited by digest. The first event also
+    carries the `stream_id` accepted by the stop endpoint.
+
+    The form is parsed as it streams in, after authentication and the rate
+    limit, so rejected requests never have their uploads read.
     """
-    enforce_rate_limit(user_id)
-    messages = _parse_messages(messages_json)
-    
-    # Process the UploadFile list for images
-    files_list = image_files or []
+    enforce_rate_limit(user_id, tier=tier)
+    # Receiving the body includes sniffing and size-checking its images
+    with span("ingest"):
+        form = await ingest_chat_form(request)
+    model_provider = _choice_field(form.fields, "model_provider", MODEL_PROVIDERS)
+    hedge_mode = _choice_field(form.fields, "hedge_mode", HEDGE_MODES, default="off")
+    if "messages_json" not in form.fields:
+        raise HTTPException(status_code=422, detail="Field 'messages_json' is required")
+    conversation_id = form.fields.get("conversation_id") or None
+    # Reject with a real 503 while the response status can still be set
+    check_admission(model_provider)
+    with span("parse"):
+        messages = _parse_messages(form.fields["messages_json"])
 
-    if files_list:
-        validate_image_files(files_list)
+    with span("image_refs"):
+        cited = _resolve_image_refs(user_id, _parse_image_refs(form.fields.get("image_refs")), len(form.images))
+
+    # Images were size-checked and type-sniffed while they were received
+    if form.images:
+        metrics.image_upload_bytes.inc(form.image_bytes)
+
+    conversation, messages, files_list = await _prepare_turn(
+        user_id, conversation_id, _wants_store(form.fields.get("store")), messages, form.images, cited
+    )
 
     async def event_stream() -> AsyncIterator[bytes]:
-        try:
-            async for chunk in handle_chat_completion(
+        # Registered here so it is unregistered however the stream ends
+        handle = stream_registry_service.open(user_id)
+        async with aclosing(_turn_frames(
+            handle, conversation, messages, files_list, model_provider, hedge_mode,
+            # Clients can bypass the response cache per request
+            request.headers.get("cache-control"),
+        )) as frames:
+            if not is_sampled():
+                async for frame in frames:
+                    yield frame
+                return
+            async for frame in frames:
+                # The generator resumes once the server has written the frame
+                written = time.perf_counter()
+                yield frame
+                accumulate("sse_write", time.perf_counter() - written)
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no", # Critical for real-time delivery in Docker
+    }
+    if conversation is not None:
+        headers["X-Conversation-Id"] = conversation.id
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+
+@chat_router.post("/images", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["image_files"],
+                    "properties": {
+                        "image_files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                    },
+                },
+            },
+        },
+    },
+})
+async def upload_images(
+    request: Request,
+    user_id: str = Depends(get_current_user),
+    tier: str = Depends(get_current_tier),
+) -> Dict[str, List[Dict[str, object]]]:
+    """
+    Store images once and return references that chat turns can cite.
+
+    Pass the returned `ref`s as `image_refs` to the completion endpoint (or
+    the WebSocket `start` message) instead of uploading the images again.
+    Identical images are stored once; references stay valid until the
+    store evicts them (least recently used first).
+    """
+    enforce_rate_limit(user_id, route="images", tier=tier)
+    form = await ingest_chat_form(request)
+    if not form.images:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    metrics.image_upload_bytes.inc(form.image_bytes)
+    records = [await asyncio.to_thread(blob_store_service.put, user_id, image) for image in form.images]
+    return {
+        "images": [
+            {"ref": record.ref, "content_type": record.content_type, "size": record.size}
+            for record in records
+        ],
+    }
+
+
+async def _prepare_turn(
+    user_id: str,
+    conversation_id: Optional[str],
+    store: bool,
+    messages: List[Dict[str, str]],
+    images: List[StoredImage],
+    cited: List[BlobImage],
+) -> Tuple[Optional[Conversation], List[Dict[str, str]], List[UploadFile]]:
+    """
+    The conversation (if kept), prompt messages and images of a turn.
+
+    Turns are stateless unless the client continues a conversation or asks
+    to store a new one. Kept conversations hold only text and digests: new
+    images go to the blob store once and are read back from there, but only
+    those of turns that still fit the providers' context, and at most
+    MAX_IMAGES_PER_REQUEST of them, the most recent.
+    """
+    if not conversation_id and not store:
+        return None, messages, [image.as_upload() for image in images] + [blob.as_upload() for blob in cited]
+    if conversation_id:
+        conversation = conversation_service.get(user_id, conversation_id)
+    else:
+        conversation = conversation_service.start(user_id)
+    records = [await asyncio.to_thread(blob_store_service.put, user_id, image) for image in images]
+    conversation_service.add_turn(
+        conversation, messages, [record.digest for record in records] + [blob.digest for blob in cited]
+    )
+    digests = conversation.images_since(
+        get_chat_service().context_start(conversation.messages), MAX_IMAGES_PER_REQUEST
+    )
+    stored = blob_store_service.resolve(user_id, digests)
+    return conversation, list(conversation.messages), [blob.as_upload() for blob in stored]
+
+
+def _wants_store(value: object) -> bool:
+    """Whether a `store` field (form string or JSON boolean) asks to keep the conversation."""
+    return value is True or (isinstance(value, str) and value.lower() in ("1", "true", "yes"))
+
+
+async def _turn_frames(
+    handle: StreamHandle,
+    conversation: Optional[Conversation],
+    messages: List[Dict[str, str]],
+    files_list: List[UploadFile],
+    model_provider: str,
+    hedge_mode: str,
+    cache_control: Optional[str],
+) -> AsyncIterator[bytes]:
+    """SSE frames of one turn, from the conversation event to [DONE], for either transport."""
+    reply: List[str] = []
+
+    def on_text(text: str) -> None:
+        if not reply:
+            mark_first_token()
+        reply.append(text)
+
+    try:
+        yield encode_event({
+            "type": "meta", "event": "conversation",
+            "conversation_id": conversation.id if conversation is not None else None, "stream_id": handle.id,
+        })
+        # Closing this generator (client gone) cancels the upstream request,
+        # so there is no need to poll for disconnects per chunk
+        async for frame in sse_output.frames(
+            handle_chat_completion(
                 model_provider=model_provider,
                 messages=messages,
                 image_files=files_list or None,
-            ):
-                if await request.is_disconnected():
-                    break
-                
-                # Check if chunk is already SSE formatted (e.g., from fallback info)
-                if chunk.startswith("data:"):
-                    yield chunk.encode("utf-8")
-                else:
-                    # Normalize raw text into standard JSON chunk format
-                    payload = {"type": "chunk", "content": chunk}
-                    yield f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+                hedge_mode=hedge_mode,
+                cache_control=cache_control,
+            ),
+            on_text=on_text,
+            handle=handle,
+        ):
+            yield frame
 
-            if not await request.is_disconnected():
-                yield b"data: [DONE]\n\n"
+        if handle.cancelled:
+            yield encode_event({"type": "meta", "event": "stopped", "stream_id": handle.id})
+        yield DONE_FRAME
 
-        except Exception as e:
-            # Graceful error reporting via SSE
-            error_payload = {"type": "error", "content": f"Streaming failed: {str(e)}"}
-            yield f"data: {json.dumps(error_payload)}\n\n".encode("utf-8")
+    except Exception as e:
+        # Graceful error reporting via SSE
+        yield encode_event({"type": "error", "content": f"Streaming failed: {str(e)}"})
+    finally:
+        stream_registry_service.close(handle)
+        # Whatever the user saw becomes the assistant turn of a kept history
+        if conversation is not None:
+            conversation_service.add_reply(conversation, "".join(reply))
 
+
+@chat_router.post("/batch")
+async def create_batch_completion(
+    payload: BatchRequest,
+    user_id: str = Depends(get_current_user),
+    tier: str = Depends(get_current_tier),
+) -> StreamingResponse:
+    """
+    Complete many conversations with bounded per-provider concurrency.
+
+    One JSON object per line is streamed as each item finishes (completion
+    order, not request order) with its `index`, `id`, `status`, `content` or
+    `error`, and timings. The whole batch counts once against the `batch`
+    rate limit.
+    """
+    enforce_rate_limit(user_id, route="batch", tier=tier)
+    items = [item.model_dump() for item in payload.items]
     return StreamingResponse(
-        event_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no", # Critical for real-time delivery in Docker
-        },
+        handle_batch_completion(items),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
     )
 
 @chat_router.delete("/completion/stop")
-async def stop_chat_completion() -> Dict[str, str]:
+async def stop_chat_completion(
+    stream_id: Optional[str] = None,
+    user_id: str = Depends(get_current_user),
+) -> Dict[str, object]:
     """
-    Endpoint for explicit cancellation. 
-    The stream itself is managed by the request.is_disconnected() check.
+    Stop one of the caller's in-flight streams, or all of them without `stream_id`.
+
+    The upstream provider request is cancelled and its connection
+    released, at once on this worker or within a poll interval on another
+    (with a shared state store); the stopped stream ends with a `stopped`
+    meta event. Stopping is idempotent: a stream that already finished, or
+    is unknown, is reported with an empty `stream_ids`.
     """
-    return {"status": "stopped"}
+    stopped = stream_registry_service.cancel(user_id, stream_id)
+    return {"status": "stopped", "stream_ids": stopped}
+
+
+@chat_router.websocket("/ws")
+async def chat_socket(websocket: WebSocket) -> None:
+    """
+    Chat over one persistent connection with several turns in flight.
+
+    The token is checked once, from the Authorization header or a first
+    `{"type": "auth", "token": ...}` message (sent again to refresh it).
+    Client messages:
+
+    - `{"type": "start", "model_provider", "messages", "conversation_id"?,
+      "store"?, "hedge_mode"?, "cache_control"?, "images"?: [{"data": base64, "filename"?}],
+      "image_refs"?, "ref"?}` starts a turn;
+    - `{"type": "cancel", "stream_id"?}` stops one stream of this connection,
+      or all of them.
+
+    Every server message is `{"stream_id", "ref"?, "data"}` where `data` is
+    exactly what the SSE endpoint sends for the same turn (the conversation
+    meta event first, then chunk, info, error and meta events, then
+    "[DONE]"). Requests that fail before a stream starts get an error event
+    without `stream_id`. Each turn still counts against the rate limit.
+    """
+    await websocket.accept()
+    try:
+        user_id, tier, expires_at = await _authenticate_socket(websocket)
+    except HTTPException as e:
+        await websocket.close(code=WS_POLICY_VIOLATION, reason=str(e.detail))
+        return
+    except WebSocketDisconnect:
+        return
+
+    # One writer owns the socket; a full outbox holds back the streams feeding it,
+    # never this loop, so a cancel is handled however far behind the client is
+    outbox = _SocketOutbox(WS_SEND_QUEUE_SIZE)
+    writer = asyncio.create_task(_socket_writer(websocket, outbox))
+    streams: Dict[str, Tuple[asyncio.Task, StreamHandle]] = {}
+    try:
+        while True:
+            message = await _receive_socket_message(websocket, outbox)
+            if message is None:
+                continue
+            kind = message.get("type")
+            ref = message.get("ref")
+            if kind == "start":
+                if time.time() >= expires_at:
+                    await websocket.close(code=WS_POLICY_VIOLATION, reason="Token has expired")
+                    return
+                try:
+                    handle, frames = await _start_socket_turn(user_id, tier, message, len(streams))
+                except HTTPException as e:
+                    outbox.reply(_socket_error(e.detail, e.status_code, ref=ref))
+                    continue
+                task = asyncio.create_task(_forward_frames(handle.id, ref, frames, outbox))
+                streams[handle.id] = (task, handle)
+                task.add_done_callback(lambda _, stream_id=handle.id: streams.pop(stream_id, None))
+            elif kind == "cancel":
+                stream_id = message.get("stream_id")
+                if stream_id is None:
+                    for open_id in list(streams):
+                        stream_registry_service.cancel(user_id, open_id)
+                elif stream_id in streams:
+                    stream_registry_service.cancel(user_id, stream_id)
+                else:
+                    outbox.reply(_socket_error("Stream not found or already finished", 404, ref=ref))
+            elif kind == "auth":
+                try:
+                    refreshed_user, tier, expires_at = _verify_socket_token(message.get("token"))
+                except HTTPException as e:
+                    await websocket.close(code=WS_POLICY_VIOLATION, reason=str(e.detail))
+                    return
+                if refreshed_user != user_id:
+                    await websocket.close(code=WS_POLICY_VIOLATION, reason="Token belongs to another user")
+                    return
+            else:
+                outbox.reply(_socket_error(f"Unknown message type: {kind!r}", 400, ref=ref))
+    except WebSocketDisconnect:
+        pass
+    except _OutboxOverflow:
+        await websocket.close(code=WS_POLICY_VIOLATION, reason="Client is not reading its messages")
+    finally:
+        # The client is gone: stop its generations and their upstream requests
+        open_streams = list(streams.values())
+        writer.cancel()
+        for task, _ in open_streams:
+            task.cancel()
+        await asyncio.gather(writer, *(task for task, _ in open_streams), return_exceptions=True)
+        for _, handle in open_streams:
+            # A task cancelled before it started never ran its cleanup
+            stream_registry_service.close(handle)
+
+
+async def _authenticate_socket(websocket: WebSocket) -> Tuple[str, str, float]:
+    """Identify the socket's user from its Authorization header or first message."""
+    authorization = websocket.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return _verify_socket_token(token)
+    try:
+        message = json.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT_SECONDS))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=401, detail="Authentication timed out")
+    except (ValueError, KeyError):
+        raise HTTPException(status_code=401, detail="Expected an auth message")
+    if not isinstance(message, dict) or message.get("type") != "auth":
+        raise HTTPException(status_code=401, detail="Expected an auth message")
+    return _verify_socket_token(message.get("token"))
+
+
+def _verify_socket_token(token: object) -> Tuple[str, str, float]:
+    """User id, rate-limit tier and expiry (epoch seconds) of an access token; 401 if invalid."""
+    if not isinstance(token, str) or not token:
+        raise HTTPException(status_code=401, detail="Missing token")
+    payload = auth_service.verify_token(token)
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    expires_at = payload.get("exp")
+    tier = payload.get("tier") or DEFAULT_TIER
+    return user_id, tier, float(expires_at) if isinstance(expires_at, (int, float)) else math.inf
+
+
+async def _receive_socket_message(websocket: WebSocket, outbox: "_SocketOutbox") -> Optional[Dict[str, object]]:
+    """Next client message as a dict; malformed ones are answered with an error and skipped."""
+    try:
+        message = json.loads(await websocket.receive_text())
+    except (ValueError, KeyError):
+        message = None
+    if not isinstance(message, dict):
+        outbox.reply(_socket_error("Messages must be JSON objects", 400))
+        return None
+    return message
+
+
+async def _start_socket_turn(
+    user_id: str, tier: str, message: Dict[str, object], open_streams: int
+) -> Tuple[StreamHandle, AsyncIterator[bytes]]:
+    """
+    Validate a `start` message and record the turn, as the completion endpoint does.
+
+    Raises:
+        HTTPException: With the status the HTTP endpoint would have answered.
+    """
+    if open_streams >= WS_MAX_STREAMS:
+        raise HTTPException(status_code=429, detail=f"At most {WS_MAX_STREAMS} streams per connection")
+    enforce_rate_limit(user_id, tier=tier)
+    fields = {key: value for key, value in message.items() if isinstance(value, str)}
+    model_provider = _choice_field(fields, "model_provider", MODEL_PROVIDERS)
+    hedge_mode = _choice_field(fields, "hedge_mode", HEDGE_MODES, default="off")
+    messages = message.get("messages")
+    if not isinstance(messages, list) or not messages or not all(isinstance(m, dict) for m in messages):
+        raise HTTPException(status_code=422, detail="Field 'messages' must be a non-empty list of messages")
+    raw_images = message.get("images") or []
+    if not isinstance(raw_images, list) or len(raw_images) > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+    refs = message.get("image_refs") or []
+    if not isinstance(refs, list) or not all(isinstance(ref, str) for ref in refs):
+        raise HTTPException(status_code=422, detail="Field 'image_refs' must be a list of references")
+    check_admission(model_provider)
+    cited = _resolve_image_refs(user_id, refs, len(raw_images))
+    images = [
+        ingest_encoded_image(item.get("data"), str(item.get("filename") or ""))
+        for item in raw_images if isinstance(item, dict)
+    ]
+    if images:
+        metrics.image_upload_bytes.inc(sum(len(image.data) for image in images))
+
+    conversation, messages, files_list = await _prepare_turn(
+        user_id, fields.get("conversation_id"), _wants_store(message.get("store")), messages, images, cited
+    )
+    handle = stream_registry_service.open(user_id)
+    frames = _turn_frames(
+        handle, conversation, messages, files_list, model_provider, hedge_mode, fields.get("cache_control"),
+    )
+    return handle, frames
+
+
+async def _forward_frames(
+    stream_id: str, ref: object, frames: AsyncIterator[bytes], outbox: "_SocketOutbox"
+) -> None:
+    """Queue one turn's frames as WebSocket messages tagged with its stream id."""
+    prefix = socket_prefix({"stream_id": stream_id, "ref": ref} if ref is not None else {"stream_id": stream_id})
+    async with aclosing(frames) as stream:
+        async for frame in stream:
+            await outbox.put(socket_message(prefix, frame))
+
+
+class _OutboxOverflow(Exception):
+    """The client stopped reading while still sending messages."""
+
+
+class _SocketOutbox:
+    """
+    Messages waiting for one socket's writer.
+
+    Stream frames go through a bounded queue, so a slow client holds back
+    its streams. Replies to the client's own messages come from the receive
+    loop, which must never wait: they skip the queue and are sent first.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._frames: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self._replies: Deque[str] = deque()
+        self._size = size
+        self._ready = asyncio.Event()
+
+    async def put(self, message: str) -> None:
+        """Queue a stream frame, waiting while the outbox is full."""
+        await self._frames.put(message)
+        self._ready.set()
+
+    def reply(self, message: str) -> None:
+        """
+        Queue a reply without waiting.
+
+        Raises:
+            _OutboxOverflow: If `size` replies are already waiting.
+        """
+        if len(self._replies) >= self._size:
+            raise _OutboxOverflow()
+        self._replies.append(message)
+        self._ready.set()
+
+    async def get(self) -> str:
+        while True:
+            if self._replies:
+                return self._replies.popleft()
+            if not self._frames.empty():
+                return self._frames.get_nowait()
+            self._ready.clear()
+            await self._ready.wait()
+
+
+async def _socket_writer(websocket: WebSocket, outbox: _SocketOutbox) -> None:
+    while True:
+        await websocket.send_text(await outbox.get())
+
+
+def _socket_error(detail: object, status_code: int, ref: object = None) -> str:
+    fields: Dict[str, object] = {"ref": ref} if ref is not None else {}
+    event = encode_event({"type": "error", "content": str(detail), "status_code": status_code})
+    return socket_message(socket_prefix(fields), event)
+
+
+@chat_router.get("/cache/stats")
+async def get_cache_stats(user_id: str = Depends(require_operator)) -> Dict[str, Dict[str, object]]:
+    """Response and near-duplicate cache counters, coalesced requests, image pipeline bytes saved and blob store use."""
+    return {
+        "responses": response_cache_service.stats(),
+        "semantic": semantic_cache_service.stats(),
+        "single_flight": single_flight_service.stats(),
+        "images": image_pipeline.stats(),
+        "blobs": blob_store_service.stats(),
+    }
+
+
+
+@chat_router.get("/admission/stats")
+async def get_admission_stats(user_id: str = Depends(require_operator)) -> Dict[str, Dict[str, object]]:
+    """Per-provider stream slots in use, queue depth, rejections and queue wait times."""
+    return get_chat_service().admission.stats()
+
+
+@chat_router.get("/router/stats")
+async def get_router_stats(user_id: str = Depends(require_operator)) -> Dict[str, Dict[str, object]]:
+    """Per-provider routing health: circuit state, success rate and EWMA latency and throughput."""
+    return get_chat_service().router.snapshot()
+
+
+@chat_router.get("/quota/stats")
+async def get_quota_stats(user_id: str = Depends(require_operator)) -> Dict[str, Dict[str, object]]:
+    """Per-provider upstream quota use, what providers reported, and paced, refused and retried requests."""
+    return get_chat_service().quota.stats()
+
+
+def _choice_field(
+    fields: Dict[str, str], name: str, choices: Tuple[str, ...], default: Optional[str] = None
+) -> str:
+    """Read a form field restricted to `choices`; 422 if it is missing or invalid."""
+    value = fields.get(name) or default
+    if value is None:
+        raise HTTPException(status_code=422, detail=f"Field '{name}' is required")
+    if value not in choices:
+        raise HTTPException(status_code=422, detail=f"Field '{name}' must be one of: {', '.join(choices)}")
+    return value
+
+
+def _parse_image_refs(image_refs: Optional[str]) -> List[str]:
+    """Parse the image_refs form field: a JSON list, or comma-separated references."""
+    if not image_refs:
+        return []
+    try:
+        refs = json.loads(image_refs)
+    except ValueError:
+        refs = image_refs.split(",")
+    if isinstance(refs, str):
+        refs = [refs]
+    if not isinstance(refs, list) or not all(isinstance(ref, str) for ref in refs):
+        raise HTTPException(status_code=422, detail="Field 'image_refs' must be a list of references")
+    return [ref.strip() for ref in refs if ref.strip()]
+
 
+def _resolve_image_refs(user_id: str, refs: List[str], uploaded: int) -> List[BlobImage]:
+    """Blob store images for cited references, within the per-request image limit."""
+    if uploaded + len(refs) > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMAGES_PER_REQUEST} images per request")
+    return blob_store_service.resolve(user_id, refs) if refs else []
 
 
 def _parse_messages(messages_json: str) -> List[Dict[str, str]]:
     """Helper to parse the messages_json Form field into a list of dicts."""
     try:
-        import json
         return json.loads(messages_json)
     except Exception:
-        return [{"role": "user", "content": messages_json}]
\ No newline at end of file
+        return [{"role": "user", "content": messages_json}]
@@ -0,0 +1,36 @@
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from src.middlewares.auth_middleware import require_operator
+from src.services.metrics_service import metrics
+from src.services.trace_service import trace_service
+
+metrics_router: APIRouter = APIRouter()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """Prometheus text exposition of request, latency and throughput metrics."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@metrics_router.get("/traces/slow")
+async def get_slow_traces(
+    limit: Optional[int] = Query(None, ge=1),
+    min_ms: float = Query(0.0, ge=0),
+    user_id: str = Depends(require_operator),
+) -> Dict[str, object]:
+    """
+    Recent slow requests, newest first, with their stage timings.
+
+    A streamed request is slow when its first token took TRACE_SLOW_MS,
+    any other when its response did; `min_ms` filters on the same measure.
+
+    Each trace lists its spans (auth, ingest, parse, image_encode,
+    admission, quota, upstream_connect, upstream_ttfb, first_token, ...)
+    with their start offset and duration, and totals for repeated stages
+    such as sse_write. Unsampled requests have only their total duration.
+    """
+    return {"stats": trace_service.stats(), "traces": trace_service.slow_requests(limit, min_ms)}
@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from src.services.config_service import parse_provider_limits
+
+ADMISSION_MAX_STREAMS: int = int(os.getenv("ADMISSION_MAX_STREAMS", "32"))
+ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+# How long a caller may wait for a slot before it is turned away
+ADMISSION_INTERACTIVE_DEADLINE_SECONDS: float = float(os.getenv("ADMISSION_INTERACTIVE_DEADLINE_SECONDS", "5"))
+ADMISSION_BATCH_DEADLINE_SECONDS: float = float(os.getenv("ADMISSION_BATCH_DEADLINE_SECONDS", "60"))
+EWMA_ALPHA: float = 0.2
+# Assumed stream duration until one has been observed
+DEFAULT_HOLD_SECONDS: float = 5.0
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Lower sorts first in the wait queue
+PRIORITIES: Dict[str, int] = {INTERACTIVE: 0, BATCH: 1}
+
+
+ADMISSION_PROVIDER_MAX_STREAMS: Dict[str, int] = parse_provider_limits(os.getenv("ADMISSION_PROVIDER_MAX_STREAMS", ""))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a provider is saturated and its wait queue cannot take the caller."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"Provider '{provider}' is overloaded ({reason})")
+        self.retry_after = retry_after
+
+
+class ProviderGate:
+    """Open upstream streams and waiting callers for one provider."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active: int = 0
+        # Entries are [priority, sequence, future]; finished futures are skipped lazily
+        self.waiters: List[list] = []
+        self.queued: int = 0
+        self.admitted: int = 0
+        self.rejected: int = 0
+        self.timed_out: int = 0
+        self.waited: int = 0
+        self.wait_seconds_total: float = 0.0
+        self.wait_seconds_max: float = 0.0
+        self.hold_seconds: float = DEFAULT_HOLD_SECONDS
+
+    def retry_after(self) -> float:
+        """Time until the current queue should have drained through the slots."""
+        return max(1.0, self.hold_seconds * (self.queued + 1) / self.limit)
+
+
+class AdmissionService:
+    """
+    Bounds concurrent upstream streams per provider.
+
+    Callers beyond a provider's limit wait in a bounded priority queue,
+    interactive before batch and FIFO within a class. A full queue rejects
+    new callers at once, except that an interactive caller displaces the
+    newest waiting batch caller. Waiters give up after a per-class deadline.
+    """
+
+    def __init__(
+        self,
+        provider_names: Iterable[str],
+        max_streams: int = ADMISSION_MAX_STREAMS,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        provider_limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        limits = ADMISSION_PROVIDER_MAX_STREAMS if provider_limits is None else provider_limits
+        self.queue_size = queue_size
+        self.deadlines: Dict[str, float] = {
+            INTERACTIVE: ADMISSION_INTERACTIVE_DEADLINE_SECONDS,
+            BATCH: ADMISSION_BATCH_DEADLINE_SECONDS,
+        }
+        self._gates: Dict[str, ProviderGate] = {
+            name: ProviderGate(limits.get(name, max_streams)) for name in provider_names
+        }
+        self._sequence = itertools.count()
+
+    def check(self, name: str, priority: str = INTERACTIVE) -> None:
+        """
+        Reject early, before a response is started, if `name` could not queue the caller.
+
+        A full queue still admits a caller that `acquire` would let
+        displace a lower-priority waiter.
+
+        Raises:
+            AdmissionRejected: When every slot is taken and the queue is full.
+        """
+        gate = self._gates.get(name)
+        if gate is None or gate.active < gate.limit or gate.queued < self.queue_size:
+            return
+        rank = PRIORITIES.get(priority, PRIORITIES[BATCH])
+        if any(entry[0] > rank and not entry[2].done() for entry in gate.waiters):
+            return
+        gate.rejected += 1
+        raise AdmissionRejected(name, "queue full", gate.retry_after())
+
+    async def acquire(self, name: str, priority: str = INTERACTIVE) -> None:
+        """
+        Take a stream slot of `name`, waiting in its queue if necessary.
+
+        Raises:
+            AdmissionRejected: When the queue is full or the deadline passes.
+        """
+        gate = self._gates.get(name)
+        if gate is None:
+            return
+        if gate.active < gate.limit and gate.queued == 0:
+            gate.active += 1
+            gate.admitted += 1
+            return
+
+        rank = PRIORITIES.get(priority, PRIORITIES[BATCH])
+        if gate.queued >= self.queue_size and not self._displace(name, gate, rank):
+            gate.rejected += 1
+            raise AdmissionRejected(name, "queue full", gate.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(gate.waiters, [rank, next(self._sequence), waiter])
+        gate.queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=self.deadlines.get(priority, ADMISSION_BATCH_DEADLINE_SECONDS))
+        except asyncio.TimeoutError:
+            gate.queued -= 1
+            gate.timed_out += 1
+            raise AdmissionRejected(name, "queue deadline exceeded", gate.retry_after()) from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # The slot was handed over just as the caller gave up
+                self.release(name)
+            elif not waiter.done() or waiter.cancelled():
+                gate.queued -= 1
+            raise
+        # Granted: release() already moved the caller from the queue to a slot
+        wait = time.monotonic() - started
+        gate.waited += 1
+        gate.wait_seconds_total += wait
+        gate.wait_seconds_max = max(gate.wait_seconds_max, wait)
+
+    def release(self, name: str, held: Optional[float] = None) -> None:
+        """Free a slot of `name` and hand it to the first live waiter."""
+        gate = self._gates.get(name)
+        if gate is None:
+            return
+        if held is not None:
+            gate.hold_seconds += EWMA_ALPHA * (held - gate.hold_seconds)
+        gate.active -= 1
+        while gate.waiters and gate.active < gate.limit:
+            _, _, waiter = heapq.heappop(gate.waiters)
+            if waiter.done():
+                continue
+            gate.queued -= 1
+            gate.active += 1
+            gate.admitted += 1
+            waiter.set_result(None)
+
+    def _displace(self, name: str, gate: ProviderGate, rank: int) -> bool:
+        """Reject the newest waiter of a lower priority than `rank` to make room."""
+        victim = max(
+            (entry for entry in gate.waiters if entry[0] > rank and not entry[2].done()),
+            default=None,
+        )
+        if victim is None:
+            return False
+        gate.queued -= 1
+        gate.rejected += 1
+        victim[2].set_exception(AdmissionRejected(name, "displaced by interactive traffic", gate.retry_after()))
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            name: {
+                "limit": gate.limit,
+                "active": gate.active,
+                "queued": gate.queued,
+                "admitted": gate.admitted,
+                "rejected": gate.rejected,
+                "timed_out": gate.timed_out,
+                "wait_ms_avg": round(gate.wait_seconds_total / gate.waited * 1000, 1) if gate.waited else 0.0,
+                "wait_ms_max": round(gate.wait_seconds_max * 1000, 1),
+            }
+            for name, gate in self._gates.items()
+        }
@@ -1,40 +1,89 @@
+import time
 import jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from uuid import uuid4
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from fastapi import HTTPException
 
+from src.services.state_store_service import InMemoryStateStore, StateStore
+
 # Token lifetimes
 ACCESS_TOKEN_LIFETIME_MINUTES = 15
 REFRESH_TOKEN_LIFETIME_DAYS = 7
 
+# Verified-token cache size and how many expired refresh entries to purge per call
+VERIFIED_TOKEN_CACHE_SIZE = 10_000
+REFRESH_PURGE_BATCH = 100
+
+# Claims copied from the user's record into both tokens and kept across rotation
+TOKEN_CLAIMS: Tuple[str, ...] = ("tier", "role")
+# Role allowed to read operational endpoints (stats, slow traces)
+OPERATOR_ROLE = "operator"
+
+
+class RefreshTokenStore:
+    """
+    Refresh token ids indexed by expiry, kept in a StateStore.
+
+    Expired entries are purged a batch at a time on every write instead of
+    leaking, and a shared store lets any worker rotate any token exactly once.
+    """
+
+    NAMESPACE = "refresh_tokens"
+
+    def __init__(self, store: Optional[StateStore] = None) -> None:
+        self.store: StateStore = store if store is not None else InMemoryStateStore()
+
+    def add(self, token_id: str, user_id: str, expires_at: float) -> None:
+        self.purge_expired()
+        self.store.set(self.NAMESPACE, token_id, user_id, expires_at)
+
+    def pop(self, token_id: str) -> Optional[str]:
+        """Remove a live token and return its user id (None if unknown/expired)."""
+        return self.store.pop(self.NAMESPACE, token_id)
+
+    def __len__(self) -> int:
+        return self.store.count(self.NAMESPACE)
+
+    def purge_expired(self, limit: int = REFRESH_PURGE_BATCH) -> int:
+        return self.store.purge_expired(limit)
+
+
 class AuthService:
     """Service for handling authentication, JWTs, and refresh token rotation."""
 
-    # In-memory refresh token store: {token_id: user_id}
-    _refresh_token_store: Dict[str, str] = {}
-
-    def __init__(self, secret_key: str, algorithm: str = "HS256"):
+    def __init__(
+        self,
+        secret_key: str,
+        algorithm: str = "HS256",
+        refresh_store: Optional[RefreshTokenStore] = None,
+    ):
         self.secret_key = secret_key
         self.algorithm = algorithm
+        # Refresh token store: {token_id: user_id}, per-process unless a shared one is given
+        self._refresh_token_store = refresh_store if refresh_store is not None else RefreshTokenStore()
+        # Verified payloads by raw token, valid until each token's own `exp`
+        self._verified_tokens: "OrderedDict[str, Tuple[Dict[str, str], float]]" = OrderedDict()
 
     # ------------------ Access Token ------------------
-    def create_access_token(self, user_id: str) -> str:
-        """Create a JWT access token for the given user ID."""
+    def create_access_token(self, user_id: str, claims: Optional[Dict[str, str]] = None) -> str:
+        """Create a JWT access token for the given user ID, carrying its TOKEN_CLAIMS."""
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_LIFETIME_MINUTES)
-        payload = {"sub": user_id, "exp": expire}
+        payload = {**self._claims(claims), "sub": user_id, "exp": expire}
         # PyJWT v2+ returns string, no need to decode
         return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
 
     # ------------------ Refresh Token ------------------
-    def create_refresh_token(self, user_id: str) -> str:
+    def create_refresh_token(self, user_id: str, claims: Optional[Dict[str, str]] = None) -> str:
         """Create a JWT refresh token and store it for rotation."""
         expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_LIFETIME_DAYS)
         token_id = str(uuid4())  # unique ID for rotation
-        payload = {"sub": user_id, "jti": token_id, "exp": expire}
+        # Claims ride along so rotation can reissue them without a user lookup
+        payload = {**self._claims(claims), "sub": user_id, "jti": token_id, "exp": expire}
 
         # Store the token_id for rotation tracking
-        self._refresh_token_store[token_id] = user_id
+        self._refresh_token_store.add(token_id, user_id, expire.timestamp())
 
         # PyJWT v2+ returns string
         return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
@@ -42,14 +91,30 @@ class AuthService:
     # ------------------ Verify Token ------------------
     def verify_token(self, token: str) -> Dict[str, str]:
         """Verify a JWT token and return its payload."""
+        cached = self._verified_tokens.get(token)
+        if cached is not None:
+            payload, expires_at = cached
+            if expires_at > time.time():
+                self._verified_tokens.move_to_end(token)
+                return payload
+            del self._verified_tokens[token]
+            raise HTTPException(status_code=401, detail="Token has expired")
+
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
         except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token has expired")
         except jwt.InvalidTokenError:
             raise HTTPException(status_code=401, detail="Invalid token")
 
+        # Only tokens with an expiry can be cached safely
+        expires_at = payload.get("exp")
+        if isinstance(expires_at, (int, float)):
+            self._verified_tokens[token] = (payload, float(expires_at))
+            if len(self._verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+                self._verified_tokens.popitem(last=False)
+        return payload
+
     # ------------------ Rotate Refresh Token ------------------
     def rotate_refresh_token(self, refresh_token: str) -> Dict[str, str]:
         """
@@ -60,22 +125,25 @@ class AuthService:
         token_id = payload.get("jti")
         user_id = payload.get("sub")
 
-        if not token_id or token_id not in self._refresh_token_store:
+        # Revoke old token; only a live, unused token can be rotated
+        if not token_id or self._refresh_token_store.pop(token_id) is None:
             raise HTTPException(status_code=401, detail="Refresh token invalid or already used")
 
-        # Revoke old token
-        del self._refresh_token_store[token_id]
-
         # Issue new tokens
-        new_access_token = self.create_access_token(user_id)
-        new_refresh_token = self.create_refresh_token(user_id)
+        claims = self._claims(payload)
+        new_access_token = self.create_access_token(user_id, claims)
+        new_refresh_token = self.create_refresh_token(user_id, claims)
 
         return {"access_token": new_access_token, "refresh_token": new_refresh_token}
 
+    @staticmethod
+    def _claims(source: Optional[Dict[str, str]]) -> Dict[str, str]:
+        return {name: source[name] for name in TOKEN_CLAIMS if source and source.get(name)}
+
     # ------------------ Revoke Refresh Token ------------------
     def revoke_refresh_token(self, refresh_token: str):
         """Manually revoke a refresh token (e.g., logout)."""
         payload = self.verify_token(refresh_token)
         token_id = payload.get("jti")
-        if token_id in self._refresh_token_store:
-            del self._refresh_token_store[token_id]
+        if token_id:
+            self._refresh_token_store.pop(token_id)
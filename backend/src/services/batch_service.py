@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from src.services.admission_service import BATCH
+from src.services.chat_service import ChatService
+from src.services.config_service import parse_provider_limits
+
+BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_DEFAULT_CONCURRENCY: int = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+
+
+# Upstream streams per provider shared by all running batches, e.g. `gemini=8,groq=4`
+BATCH_PROVIDER_CONCURRENCY: Dict[str, int] = parse_provider_limits(os.getenv("BATCH_PROVIDER_CONCURRENCY", ""))
+
+
+class BatchService:
+    """
+    Runs many independent completions with bounded per-provider fan-out.
+
+    Every item becomes a task that waits for a slot of its provider; the
+    slots are shared by all batches so concurrent jobs cannot multiply the
+    upstream load. Items without a provider go to the best provider with a
+    free slot. Results are yielded as NDJSON lines in completion order.
+    """
+
+    def __init__(
+        self,
+        default_concurrency: int = BATCH_DEFAULT_CONCURRENCY,
+        concurrency: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.default_concurrency = default_concurrency
+        self.concurrency: Dict[str, int] = dict(BATCH_PROVIDER_CONCURRENCY if concurrency is None else concurrency)
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, provider_key: str) -> asyncio.Semaphore:
+        semaphore = self._slots.get(provider_key)
+        if semaphore is None:
+            limit = self.concurrency.get(provider_key, self.default_concurrency)
+            semaphore = self._slots[provider_key] = asyncio.Semaphore(limit)
+        return semaphore
+
+    def _pick_provider(self, chat_service: ChatService) -> Optional[str]:
+        """Best admissible provider, preferring ones with a free slot."""
+        busy = [key for key in chat_service.providers if self._semaphore(key).locked()]
+        return chat_service.router.choose(exclude=busy) or chat_service.available_provider()
+
+    async def run(self, chat_service: ChatService, items: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Execute `items` concurrently and yield one JSON line per finished item."""
+        tasks = [
+            asyncio.create_task(self._run_item(chat_service, index, item))
+            for index, item in enumerate(items)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            # The client went away: stop items that have not finished
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run_item(self, chat_service: ChatService, index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.monotonic()
+        requested = item.get("model_provider")
+        result: Dict[str, Any] = {"index": index, "id": item.get("id")}
+        provider_key = requested.lower() if requested else self._pick_provider(chat_service)
+        attempts: List[str] = []
+        try:
+            while True:
+                if provider_key is None:
+                    raise HTTPException(status_code=503, detail="No provider is currently available.")
+                attempts.append(provider_key)
+                try:
+                    timings = await self._complete(chat_service, provider_key, item["messages"], result)
+                    break
+                except Exception:
+                    # Retry an answer that never started on the other provider, once
+                    fallback = chat_service.fallback_provider(provider_key)
+                    if "content" in result or len(attempts) > 1 or fallback is None:
+                        raise
+                    provider_key = fallback
+            result.update(status="ok", provider=provider_key, **timings)
+        except Exception as e:
+            result.pop("content", None)
+            result.update(
+                status="error",
+                provider=provider_key,
+                error=e.detail if isinstance(e, HTTPException) else str(e),
+                status_code=e.status_code if isinstance(e, HTTPException) else 500,
+            )
+        result["attempts"] = attempts
+        result["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return result
+
+    async def _complete(
+        self,
+        chat_service: ChatService,
+        provider_key: str,
+        messages: List[Dict[str, str]],
+        result: Dict[str, Any],
+    ) -> Dict[str, float]:
+        waited = time.monotonic()
+        async with self._semaphore(provider_key):
+            started = time.monotonic()
+            ttft: Optional[float] = None
+            chunks: List[str] = []
+            async for chunk in chat_service.generate_streaming_response(
+                messages=messages,
+                requested_provider=provider_key,
+                # Interactive requests are admitted ahead of batch items
+                priority=BATCH,
+            ):
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                    result["content"] = ""
+                chunks.append(chunk)
+            result["content"] = "".join(chunks)
+        return {
+            "queued_ms": round((started - waited) * 1000, 1),
+            "ttft_ms": round((ttft or 0.0) * 1000, 1),
+            "stream_ms": round((time.monotonic() - started) * 1000, 1),
+        }
@@ -0,0 +1,390 @@
+import asyncio
+import mmap
+import os
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from src.providers.image_pipeline import EncodedImage
+from src.services.conversation_service import StoredImage, StoredUpload
+from src.services.state_store_service import InMemoryStateStore, StateStore
+
+BLOB_STORE_DIR: str = os.getenv("BLOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "chat-image-blobs"))
+# Images and their cached provider payloads; least recently used blobs go first
+BLOB_STORE_MAX_BYTES: int = int(os.getenv("BLOB_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Serve blobs from memory-mapped files instead of reading them into a buffer
+BLOB_STORE_MMAP: bool = os.getenv("BLOB_STORE_MMAP", "true").lower() in ("1", "true", "yes")
+# References not used for this long expire, and their blobs are deleted
+BLOB_STORE_TTL_SECONDS: float = float(os.getenv("BLOB_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Files touched more recently than this are never deleted: in-flight writes, and
+# blobs another worker may just have stored or cited
+BLOB_STORE_GRACE_SECONDS: float = float(os.getenv("BLOB_STORE_GRACE_SECONDS", "600"))
+BLOB_STORE_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("BLOB_STORE_SWEEP_INTERVAL", "300"))
+IMAGE_REF_PREFIX: str = "sha256:"
+
+# Suffix of the cached provider payload for one target resolution
+_ENCODED_SUFFIX = ".{}.b64"
+# Names of this store's in-flight writes
+_TEMP_PREFIX, _TEMP_SUFFIX = ".blob-", ".tmp"
+
+
+def _is_digest(name: str) -> bool:
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+def parse_image_ref(ref: str) -> str:
+    """The SHA-256 hex digest named by `sha256:<hex>` (or a bare digest).
+
+    Raises:
+        HTTPException: 400 if `ref` is not a SHA-256 reference.
+    """
+    digest = ref[len(IMAGE_REF_PREFIX):] if ref.startswith(IMAGE_REF_PREFIX) else ref
+    digest = digest.strip().lower()
+    if not _is_digest(digest):
+        raise HTTPException(status_code=400, detail=f"Invalid image reference: {ref!r}")
+    return digest
+
+
+class BlobRecord:
+    """A stored image: its type and size on disk."""
+
+    __slots__ = ("digest", "content_type", "size")
+
+    def __init__(self, digest: str, content_type: str, size: int) -> None:
+        self.digest = digest
+        self.content_type = content_type
+        self.size = size
+
+    @property
+    def ref(self) -> str:
+        return IMAGE_REF_PREFIX + self.digest
+
+
+class BlobImage:
+    """A cited image held in the blob store rather than in memory."""
+
+    __slots__ = ("digest", "content_type", "filename", "blob_size", "_store")
+
+    def __init__(self, store: "BlobStoreService", record: BlobRecord) -> None:
+        self.digest = record.digest
+        self.content_type = record.content_type
+        self.filename = record.digest
+        self.blob_size = record.size
+        self._store = store
+
+    def as_upload(self) -> UploadFile:
+        """
+        An upload view for providers.
+
+        Raises:
+            HTTPException: 404 if the blob has been deleted since it was cited.
+        """
+        file = self._store.open(self.digest)
+        if file is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Image {IMAGE_REF_PREFIX}{self.digest} is no longer stored; upload it again",
+            )
+        return StoredUpload(
+            file=file,
+            size=self.blob_size,
+            filename=self.filename,
+            headers=Headers({"content-type": self.content_type}),
+            digest=self.digest,
+            # A read-only mapping can be shared by concurrent readers as is
+            data=memoryview(file) if isinstance(file, mmap.mmap) else None,
+        )
+
+
+class BlobStoreService:
+    """
+    Content-addressed local store for uploaded images.
+
+    Images are written once under their SHA-256 and cited by reference in
+    later turns, so they are neither uploaded nor read into a request again.
+    Each blob also keeps the provider-ready payload per target resolution
+    (the image pipeline's second-level cache), so a cited image is not
+    re-encoded either. A user may only cite blobs they uploaded.
+
+    The index of blobs and of who may cite them lives in the state store,
+    so with a shared one (STATE_STORE=sqlite) every worker on the host sees
+    the same blobs. Sizes and recency come from the files themselves: using
+    a blob refreshes its mtime. A periodic sweep deletes blobs whose
+    references expired and, over BLOB_STORE_MAX_BYTES, the least recently
+    used ones. Nothing touched within BLOB_STORE_GRACE_SECONDS is deleted,
+    and a blob deleted anyway fails its turn with a 404 rather than being
+    left out of the prompt.
+    """
+
+    INDEX_NAMESPACE = "blobs"
+    OWNER_NAMESPACE = "blob_owners"
+
+    def __init__(
+        self,
+        root: str = BLOB_STORE_DIR,
+        max_bytes: int = BLOB_STORE_MAX_BYTES,
+        use_mmap: bool = BLOB_STORE_MMAP,
+        store: Optional[StateStore] = None,
+        ttl_seconds: float = BLOB_STORE_TTL_SECONDS,
+        grace_seconds: float = BLOB_STORE_GRACE_SECONDS,
+    ) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.use_mmap = use_mmap
+        # Per-process by default; pass a shared store to share blobs across workers
+        self.store: StateStore = store if store is not None else InMemoryStateStore()
+        self.ttl_seconds = ttl_seconds
+        self.grace_seconds = grace_seconds
+        # Disk use as of the last sweep, plus this process's writes since
+        self._bytes: int = 0
+        # Counters are updated from request, pipeline and sweep threads
+        self._lock = threading.Lock()
+        self._sweeping = threading.Lock()
+        self._sweep_task: Optional[asyncio.Task] = None
+        self.stored: int = 0
+        self.deduplicated: int = 0
+        self.evicted: int = 0
+        self.expired: int = 0
+        self.missing: int = 0
+
+    def put(self, user_id: str, image: StoredImage) -> BlobRecord:
+        """Store `image` (once per content) and let `user_id` cite it. Blocking I/O."""
+        path = self._path(image.digest)
+        if self._touch(path):
+            with self._lock:
+                self.deduplicated += 1
+        else:
+            self._write(path, image.data)
+            with self._lock:
+                self.stored += 1
+                self._bytes += len(image.data)
+        record = BlobRecord(image.digest, image.content_type, len(image.data))
+        self._cite(user_id, record)
+        if self._bytes > self.max_bytes:
+            self.sweep()
+        return record
+
+    def resolve(self, user_id: str, refs: List[str]) -> List[BlobImage]:
+        """
+        Conversation images for the references a user cites.
+
+        Raises:
+            HTTPException: 400 for a malformed reference, 404 for one the
+                user did not upload, that expired or that has been evicted.
+        """
+        images: List[BlobImage] = []
+        for ref in refs:
+            digest = parse_image_ref(ref)
+            entry = self.store.get(self.INDEX_NAMESPACE, digest)
+            if entry is None or self.store.get(self.OWNER_NAMESPACE, self._owner_key(user_id, digest)) is None:
+                raise HTTPException(status_code=404, detail=f"Image reference not found: {ref}")
+            if not self._touch(self._path(digest)):
+                # Indexed but gone from disk: say so rather than answer without the image
+                self.store.pop(self.INDEX_NAMESPACE, digest)
+                with self._lock:
+                    self.missing += 1
+                raise HTTPException(status_code=404, detail=f"Image {ref} is no longer stored; upload it again")
+            content_type, _, size = str(entry).partition(" ")
+            record = BlobRecord(digest, content_type, int(size))
+            self._cite(user_id, record)
+            images.append(BlobImage(self, record))
+        return images
+
+    def open(self, digest: str) -> Optional[BinaryIO]:
+        """A readable file over the blob, memory-mapped if enabled; None if evicted."""
+        try:
+            file = open(self._path(digest), "rb")
+        except FileNotFoundError:
+            return None
+        if not self.use_mmap:
+            return file
+        with file:
+            # The mapping stays valid after the descriptor is closed
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def load_encoded(self, digest: str, max_dimension: int) -> Optional[EncodedImage]:
+        """The cached provider payload of a blob, if one was saved for this resolution."""
+        try:
+            with open(self._path(digest) + _ENCODED_SUFFIX.format(max_dimension), "rb") as file:
+                header = file.readline().split()
+                data = file.read().decode("ascii")
+            mime_type, original_bytes, encoded_bytes = header[0].decode("ascii"), int(header[1]), int(header[2])
+        except (OSError, ValueError, IndexError):
+            return None
+        return EncodedImage(mime_type, data, original_bytes, encoded_bytes)
+
+    def save_encoded(self, digest: str, max_dimension: int, encoded: EncodedImage) -> None:
+        """Keep a provider payload next to its blob; ignored for images not in the store."""
+        path = self._path(digest) + _ENCODED_SUFFIX.format(max_dimension)
+        if self.store.get(self.INDEX_NAMESPACE, digest) is None or os.path.exists(path):
+            return
+        header = f"{encoded.mime_type} {encoded.original_bytes} {encoded.encoded_bytes}\n".encode("ascii")
+        body = header + encoded.data.encode("ascii")
+        try:
+            self._write(path, body)
+        except OSError:
+            return
+        with self._lock:
+            self._bytes += len(body)
+
+    def sweep(self) -> int:
+        """
+        Delete expired and, over the size cap, least recently used blobs. Blocking I/O.
+
+        Only this store's own files are considered: blobs, their payloads
+        and its interrupted writes. Anything else in the directory is left
+        alone. Returns how many blobs were deleted.
+        """
+        if not self._sweeping.acquire(blocking=False):
+            # Another thread of this process is already at it
+            return 0
+        try:
+            return self._sweep()
+        finally:
+            self._sweeping.release()
+
+    def start_sweeping(self, interval_seconds: float = BLOB_STORE_SWEEP_INTERVAL_SECONDS) -> None:
+        """Start periodic background sweeps on the running event loop."""
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.create_task(self._sweep_forever(interval_seconds))
+
+    async def stop_sweeping(self) -> None:
+        """Stop the background sweep task."""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+    def stats(self) -> Dict[str, int]:
+        blobs = self.store.count(self.INDEX_NAMESPACE)
+        with self._lock:
+            return {
+                "blobs": blobs,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "missing": self.missing,
+            }
+
+    async def _sweep_forever(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await asyncio.to_thread(self.sweep)
+
+    def _sweep(self) -> int:
+        now = time.time()
+        self.store.purge_expired()
+        # digest -> [blob mtime (None without a blob file), newest mtime, bytes, paths]
+        groups: Dict[str, list] = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Removed meanwhile by another worker
+                    continue
+                if name.startswith(_TEMP_PREFIX) and name.endswith(_TEMP_SUFFIX):
+                    if now - stat.st_mtime > self.grace_seconds:
+                        # Left over from an interrupted write
+                        self._unlink([path])
+                    continue
+                digest, _, suffix = name.partition(".")
+                if not _is_digest(digest) or (suffix and not self._is_encoded_suffix(suffix)):
+                    continue
+                group = groups.setdefault(digest, [None, 0.0, 0, []])
+                if not suffix:
+                    group[0] = stat.st_mtime
+                group[1] = max(group[1], stat.st_mtime)
+                group[2] += stat.st_size
+                group[3].append(path)
+
+        deleted = 0
+        live: List[Tuple[float, str, int, List[str]]] = []
+        for digest, (mtime, newest, size, paths) in groups.items():
+            if now - newest <= self.grace_seconds:
+                live.append((mtime if mtime is not None else newest, digest, size, paths))
+            elif mtime is None:
+                # Payloads whose blob is gone
+                self._unlink(paths)
+            elif self.store.get(self.INDEX_NAMESPACE, digest) is None:
+                # Nobody can cite it any more
+                self._unlink(paths)
+                deleted += 1
+                with self._lock:
+                    self.expired += 1
+            else:
+                live.append((mtime, digest, size, paths))
+
+        total = sum(size for _, _, size, _ in live)
+        for mtime, digest, size, paths in sorted(live):
+            if total <= self.max_bytes or now - mtime <= self.grace_seconds:
+                break
+            # Unindex first, so a concurrent citation gets a clean 404
+            self.store.pop(self.INDEX_NAMESPACE, digest)
+            self._unlink(paths)
+            total -= size
+            deleted += 1
+            with self._lock:
+                self.evicted += 1
+        with self._lock:
+            self._bytes = total
+        return deleted
+
+    def _cite(self, user_id: str, record: BlobRecord) -> None:
+        """Index the blob and let `user_id` cite it, both for another BLOB_STORE_TTL_SECONDS."""
+        expires_at = time.time() + self.ttl_seconds
+        self.store.set(self.INDEX_NAMESPACE, record.digest, f"{record.content_type} {record.size}", expires_at)
+        self.store.set(self.OWNER_NAMESPACE, self._owner_key(user_id, record.digest), "1", expires_at)
+
+    @staticmethod
+    def _owner_key(user_id: str, digest: str) -> str:
+        return f"{digest}:{user_id}"
+
+    @staticmethod
+    def _is_encoded_suffix(suffix: str) -> bool:
+        dimension, _, extension = suffix.partition(".")
+        return dimension.isdigit() and extension == "b64"
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        """Mark a blob recently used; False if it is not on disk."""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    @staticmethod
+    def _unlink(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        """Write atomically, so readers never see a partial blob."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=_TEMP_PREFIX, suffix=_TEMP_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -1,12 +1,41 @@
+import functools
+import math
 import os 
+import time
+import asyncio
+from contextlib import aclosing
 from typing import Optional, List, Dict, AsyncIterator
+import aiohttp
 from fastapi import UploadFile, HTTPException
 
+from src.providers.base import BaseProvider
 from src.providers.gemini import GeminiProvider
 from src.providers.groq import GroqProvider
+from src.providers.image_pipeline import image_pipeline
+from src.services.admission_service import INTERACTIVE, AdmissionRejected, AdmissionService
+from src.services.context_service import ContextWindowService
+from src.services.metrics_service import metrics
+from src.services.provider_router_service import EXPECTED_ANSWER_TOKENS, ProviderRouterService
+from src.services.quota_service import QuotaExceeded, QuotaService, QuotaUsage
+from src.services.trace_service import record_span, span
+
+# Rough characters-per-token ratio used for throughput accounting
+CHARS_PER_TOKEN: int = 4
+
+
+def _is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error says the provider is unhealthy: 5xx, timeouts, connection errors.
+
+    Client errors (4xx, including 429, which the quota service paces) and
+    local errors such as a rejected image say nothing about the provider.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
 
 class ChatService:
-    def __init__(self) -> None:
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None) -> None:
         # We store all successfully initialized providers in a dictionary
         self.providers = {}
         
@@ -24,23 +53,62 @@ class ChatService:
             except Exception as e:
                 print(f"Failed to init Groq: {e}")
 
+        # Share the application-wide connection pool when one is provided
+        if session is not None:
+            for provider in self.providers.values():
+                provider.attach_session(session)
+
+        # Health/latency tracking and circuit breakers for provider selection
+        self.router = ProviderRouterService(self.providers.keys())
+        # Bounds concurrent upstream streams per provider
+        self.admission = AdmissionService(self.providers.keys())
+        # Paces outbound requests to the providers' RPM/TPM quotas
+        self.quota = QuotaService(self.providers.keys())
+        for name, provider in self.providers.items():
+            provider.response_observer = functools.partial(self.quota.observe, name)
+
+        # Keeps long histories within each provider's prompt budget
+        self.context = ContextWindowService()
+
     def available_provider(self) -> Optional[str]:
-        """Returns the first available provider name for default use."""
-        if "gemini" in self.providers:
-            return "gemini"
-        if "groq" in self.providers:
-            return "groq"
-        return None
+        """Returns the healthiest, fastest provider whose circuit is not open."""
+        return self.router.choose()
+
+    def fallback_provider(self, primary: str) -> Optional[str]:
+        """Returns the best admissible provider other than `primary`."""
+        return self.router.choose(exclude=[primary])
+
+    def context_start(self, messages: List[Dict[str, str]]) -> int:
+        """Index of the oldest message every provider keeps within its context budget."""
+        budgets = [provider.context_token_budget for provider in self.providers.values()]
+        return self.context.fit(messages, min(budgets)).first_kept if budgets else 0
+
+    def warmup_urls(self) -> List[str]:
+        """Base URLs of every initialized provider, for connection warm-up."""
+        return [provider.base_url for provider in self.providers.values()]
+
+    async def close(self) -> None:
+        """Release provider sessions (shared sessions are closed by their owner)."""
+        for provider in self.providers.values():
+            await provider.close_session()
+        image_pipeline.shutdown()
 
     async def generate_streaming_response(
         self,
         messages: List[Dict[str, str]],
         image_files: Optional[List[UploadFile]] = None,
         requested_provider: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None,
+        priority: str = INTERACTIVE,
     ) -> AsyncIterator[str]:
         """
         Routes the request to the specific provider requested.
         This allows the Controller to implement fallback logic.
+
+        Older turns are trimmed to the provider's context budget first; when
+        `usage` is given it receives the prompt tokens sent and saved. The
+        stream waits for an admission slot of the provider, queued by
+        `priority`; a saturated provider raises 503 with Retry-After.
         """
         # Determine which provider to use
         provider_key = requested_provider.lower() if requested_provider else self.available_provider()
@@ -53,6 +121,147 @@ class ChatService:
                 detail=f"Provider '{provider_key}' is not initialized or available."
             )
 
+        # Fail fast instead of queueing for a provider known to be down
+        if not self.router.is_available(provider_key):
+            raise HTTPException(
+                status_code=503,
+                detail=f"Provider '{provider_key}' is temporarily unavailable (circuit open)."
+            )
+        try:
+            with span("admission", provider=provider_key):
+                await self.admission.acquire(provider_key, priority)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            ) from e
+        admitted = time.monotonic()
+        try:
+            # Close the inner stream now so its verdict is recorded before the slot frees
+            async with aclosing(self._stream(provider, provider_key, messages, image_files, usage)) as stream:
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            self.admission.release(provider_key, held=time.monotonic() - admitted)
+
+    async def _stream(
+        self,
+        provider: BaseProvider,
+        provider_key: str,
+        messages: List[Dict[str, str]],
+        image_files: Optional[List[UploadFile]],
+        usage: Optional[Dict[str, int]],
+    ) -> AsyncIterator[str]:
+        fit = self.context.fit(messages, provider.context_token_budget)
+        if fit.tokens_saved:
+            metrics.prompt_tokens_saved.labels(provider_key).inc(fit.tokens_saved)
+        if usage is not None:
+            usage.update(
+                prompt_tokens=fit.prompt_tokens,
+                prompt_tokens_saved=fit.tokens_saved,
+                messages_dropped=fit.messages_dropped,
+            )
+
+        # Wait for upstream quota before claiming the circuit's probe slot
+        estimated_tokens = fit.prompt_tokens + EXPECTED_ANSWER_TOKENS
+        quota_usage = await self._reserve_quota(provider_key, estimated_tokens)
+
+        # The circuit may have opened while this request was queued
+        if not self.router.acquire(provider_key):
+            raise HTTPException(
+                status_code=503,
+                detail=f"Provider '{provider_key}' is temporarily unavailable (circuit open)."
+            )
+
+        # Metric children resolved once per stream keep per-chunk recording cheap
+        chunk_gap = metrics.chunk_gap.labels(provider_key)
+        in_flight = metrics.in_flight.labels(provider_key)
+        in_flight.value += 1
+
         # Stream the response from the chosen provider
-        async for chunk in provider.stream_completion(messages, image_files):
-            yield chunk
\ No newline at end of file
+        started = time.monotonic()
+        # Trace spans use the performance counter
+        traced_from = time.perf_counter()
+        ttft: Optional[float] = None
+        chars = 0
+        outcome = "failure"
+        attempt = 0
+        try:
+            last = started
+            while True:
+                try:
+                    async for chunk in provider.stream_completion(fit.messages, image_files):
+                        now = time.monotonic()
+                        if ttft is None:
+                            ttft = now - started
+                            metrics.ttft.labels(provider_key).observe(ttft)
+                            record_span("first_token", traced_from, time.perf_counter(), provider=provider_key)
+                        else:
+                            chunk_gap.observe(now - last)
+                        last = now
+                        chars += len(chunk)
+                        yield chunk
+                    break
+                except aiohttp.ClientResponseError as e:
+                    # Nothing has reached the client yet, so the request can be repeated
+                    delay = None if ttft is not None else self.quota.retry_delay(
+                        provider_key, e.status, e.headers or {}, attempt
+                    )
+                    if delay is None:
+                        raise
+                    self.quota.settle(quota_usage, 0)
+                    metrics.upstream_retries.labels(provider_key, str(e.status)).value += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    quota_usage = await self._reserve_quota(provider_key, estimated_tokens)
+        except (asyncio.CancelledError, GeneratorExit):
+            # Abandoned by the caller (client gone, hedge lost): no verdict
+            outcome = "cancelled"
+            if ttft is None:
+                self.router.release(provider_key)
+            else:
+                self._record_success(provider_key, ttft, chars, started)
+            raise
+        except Exception as e:
+            if _is_upstream_failure(e):
+                self.router.record_failure(provider_key)
+            elif ttft is None:
+                # Not the provider's fault: free the probe slot without a verdict
+                self.router.release(provider_key)
+            else:
+                self._record_success(provider_key, ttft, chars, started)
+            raise
+        else:
+            if ttft is None:
+                # An empty answer is treated as a failure of the provider
+                self.router.record_failure(provider_key)
+            else:
+                outcome = "success"
+                self._record_success(provider_key, ttft, chars, started)
+        finally:
+            self.quota.settle(quota_usage, fit.prompt_tokens + chars / CHARS_PER_TOKEN)
+            in_flight.value -= 1
+            metrics.requests.labels(provider_key, outcome).value += 1
+            metrics.output_tokens.labels(provider_key).value += chars / CHARS_PER_TOKEN
+            metrics.stream_duration.labels(provider_key).observe(time.monotonic() - started)
+
+    async def _reserve_quota(self, provider_key: str, tokens: float) -> Optional[QuotaUsage]:
+        """Pace a request to the provider's quota; 503 with Retry-After if it is exhausted."""
+        try:
+            with span("quota", provider=provider_key):
+                return await self.quota.reserve(provider_key, tokens)
+        except QuotaExceeded as e:
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            ) from e
+
+    def _record_success(self, provider_key: str, ttft: float, chars: int, started: float) -> None:
+        self.router.record_success(
+            provider_key,
+            ttft=ttft,
+            tokens=chars / CHARS_PER_TOKEN,
+            duration=time.monotonic() - started,
+        )
\ No newline at end of file
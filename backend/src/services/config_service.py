@@ -0,0 +1,10 @@
+from typing import Dict
+
+
+def parse_provider_limits(spec: str) -> Dict[str, int]:
+    """Parse `provider=limit` pairs, e.g. `gemini=64,groq=16`; limits below 1 become 1."""
+    limits: Dict[str, int] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        provider, _, limit = item.partition("=")
+        limits[provider.strip().lower()] = max(1, int(limit))
+    return limits
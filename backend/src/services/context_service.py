@@ -0,0 +1,155 @@
+import math
+import os
+from collections import OrderedDict
+from typing import Dict, List
+
+# Per-message overhead of role markers and separators in provider prompts
+MESSAGE_OVERHEAD_TOKENS: int = 4
+TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Shorter contents are cheaper to count than to look up
+TOKEN_CACHE_MIN_CHARS: int = 256
+TRUNCATION_MARKER: str = "\n[...]\n"
+
+
+class ContextFit:
+    """Messages trimmed to a budget, with what the trimming saved."""
+
+    __slots__ = ("messages", "prompt_tokens", "original_tokens", "messages_dropped", "first_kept")
+
+    def __init__(
+        self,
+        messages: List[Dict[str, str]],
+        prompt_tokens: int,
+        original_tokens: int,
+        messages_dropped: int,
+        first_kept: int = 0,
+    ) -> None:
+        self.messages = messages
+        self.prompt_tokens = prompt_tokens
+        self.original_tokens = original_tokens
+        self.messages_dropped = messages_dropped
+        # Index of the oldest non-system message kept; everything after it is kept too
+        self.first_kept = first_kept
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.prompt_tokens
+
+
+class ContextWindowService:
+    """
+    Keeps prompts within a provider's token budget.
+
+    Token counts come from a fast local approximation (no tokenizer
+    download) and are cached per message content, since each turn resends
+    the same history. The oldest turns are dropped first; system messages
+    and the latest user turn (with any assistant prefill after it) are
+    always kept. If those alone exceed the budget, the user turn and then
+    system messages are truncated in the middle before the prefill is cut.
+    """
+
+    def __init__(self, cache_size: int = TOKEN_CACHE_SIZE) -> None:
+        self.cache_size = cache_size
+        self._token_cache: "OrderedDict[str, int]" = OrderedDict()
+
+    def count_tokens(self, text: str) -> int:
+        """Approximate token count: ~4 characters or ~3/4 of a word per token."""
+        if len(text) < TOKEN_CACHE_MIN_CHARS:
+            return self._estimate(text)
+        cached = self._token_cache.get(text)
+        if cached is not None:
+            self._token_cache.move_to_end(text)
+            return cached
+        tokens = self._estimate(text)
+        self._token_cache[text] = tokens
+        if len(self._token_cache) > self.cache_size:
+            self._token_cache.popitem(last=False)
+        return tokens
+
+    @staticmethod
+    def _estimate(text: str) -> int:
+        return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count_tokens(str(message.get("content") or "")) + MESSAGE_OVERHEAD_TOKENS
+
+    def fit(self, messages: List[Dict[str, str]], budget: int) -> ContextFit:
+        """Trim `messages` to at most `budget` prompt tokens."""
+        counts = [self.message_tokens(message) for message in messages]
+        original = sum(counts)
+        if original <= budget or not messages:
+            return ContextFit(messages, original, original, 0)
+
+        # The latest user turn is pinned together with anything after it: an
+        # assistant prefill left by a mid-stream fallback continues that turn
+        current = next(
+            (index for index in range(len(messages) - 1, -1, -1) if messages[index].get("role") == "user"),
+            len(messages) - 1,
+        )
+        keep = [message.get("role") == "system" or index >= current for index, message in enumerate(messages)]
+        total = sum(count for count, kept in zip(counts, keep) if kept)
+
+        # Re-admit the newest droppable turns while they still fit
+        for index in range(current - 1, -1, -1):
+            if keep[index]:
+                continue
+            if total + counts[index] > budget:
+                break
+            keep[index] = True
+            total += counts[index]
+
+        kept_indices = [index for index in range(len(messages)) if keep[index]]
+        # Conversations must resume on a user turn after the dropped prefix
+        first = next(
+            (position for position, index in enumerate(kept_indices) if messages[index].get("role") != "system"),
+            len(kept_indices),
+        )
+        while (
+            first < len(kept_indices)
+            and kept_indices[first] < current
+            and messages[kept_indices[first]].get("role") == "assistant"
+        ):
+            total -= counts[kept_indices.pop(first)]
+
+        first_kept = kept_indices[first] if first < len(kept_indices) else len(messages)
+        fitted = [messages[index] for index in kept_indices]
+        if total > budget:
+            # Shrink the user turn, then system messages; the prefill only as a last resort
+            position_of = {index: position for position, index in enumerate(kept_indices)}
+            order = [position_of[current]] if current in position_of else []
+            order += [position_of[index] for index in kept_indices if index < current]
+            order += [position_of[index] for index in kept_indices if index > current]
+            for position in order:
+                # The estimate is not linear in characters, so shrink until it fits
+                while total > budget:
+                    tokens = self.message_tokens(fitted[position])
+                    truncated = self._truncate(
+                        fitted[position], tokens - (total - budget), keep_head=kept_indices[position] <= current
+                    )
+                    shrunk = tokens - self.message_tokens(truncated)
+                    if shrunk <= 0:
+                        break
+                    fitted[position] = truncated
+                    total -= shrunk
+
+        return ContextFit(fitted, total, original, len(messages) - len(fitted), first_kept)
+
+    def _truncate(self, message: Dict[str, str], budget: int, keep_head: bool = True) -> Dict[str, str]:
+        """
+        Shorten an oversized message to about `budget` tokens.
+
+        The head and tail are kept around a marker; a prefill keeps only its
+        tail (`keep_head=False`), which is where the continuation picks up.
+        """
+        content = str(message.get("content") or "")
+        # Scale by this content's own characters per token, leaving room for overhead and marker
+        available = max(0, budget - MESSAGE_OVERHEAD_TOKENS - 2)
+        keep_chars = len(content) * available // max(1, self.count_tokens(content))
+        if keep_chars >= len(content):
+            return message
+        if not keep_head:
+            return {**message, "content": content[len(content) - keep_chars:]}
+        head = keep_chars // 2
+        tail = keep_chars - head
+        truncated = content[:head] + TRUNCATION_MARKER + (content[-tail:] if tail else "")
+        return {**message, "content": truncated}
@@ -0,0 +1,192 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from src.providers.image_pipeline import MemoryReader
+from src.services.state_store_service import InMemoryStateStore, StateStore
+
+# History characters kept per conversation; older messages are dropped first
+MAX_CONVERSATION_CHARS: int = int(os.getenv("MAX_CONVERSATION_CHARS", str(1024 * 1024)))
+# Image citations kept per conversation; the oldest go first
+MAX_CONVERSATION_IMAGES: int = int(os.getenv("MAX_CONVERSATION_IMAGES", "64"))
+CONVERSATION_IDLE_TTL_SECONDS: float = float(os.getenv("CONVERSATION_IDLE_TTL_SECONDS", "3600"))
+CONVERSATION_PURGE_BATCH: int = 100
+
+
+class StoredUpload(UploadFile):
+    """
+    UploadFile over a stored image, carrying the hash computed at ingestion.
+
+    `data` is an immutable view of the whole image. A hedged request encodes
+    the same upload for both providers at once, so the image workers read
+    it instead of seeking and reading the shared file.
+    """
+
+    def __init__(
+        self,
+        *args,
+        digest: str,
+        data: Optional[Union[bytes, memoryview]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.digest = digest
+        self._data = data
+
+    @property
+    def data(self) -> Union[bytes, memoryview]:
+        """The image bytes; for a plain file, read once by position, leaving its cursor alone."""
+        if self._data is None:
+            self._data = os.pread(self.file.fileno(), self.size or 0, 0)
+        return self._data
+
+
+class StoredImage:
+    """An image received with a request, sniffed and hashed, ready for providers or the blob store."""
+
+    __slots__ = ("digest", "content_type", "filename", "data")
+
+    def __init__(self, digest: str, content_type: str, filename: str, data: Union[bytes, memoryview]) -> None:
+        self.digest = digest
+        self.content_type = content_type
+        self.filename = filename
+        # The received buffer itself (read-only), never a copy of it
+        self.data = data
+
+    def as_upload(self) -> UploadFile:
+        """A fresh UploadFile view for providers, which read and rewind uploads."""
+        return StoredUpload(
+            file=MemoryReader(self.data),
+            size=len(self.data),
+            filename=self.filename,
+            headers=Headers({"content-type": self.content_type}),
+            digest=self.digest,
+            data=self.data,
+        )
+
+
+class Conversation:
+    """Server-side chat history and the blob store digests of the images its turns cite."""
+
+    __slots__ = ("id", "user_id", "messages", "images")
+
+    def __init__(
+        self,
+        conversation_id: str,
+        user_id: str,
+        messages: Optional[List[Dict[str, str]]] = None,
+        images: Optional[List[Tuple[str, int]]] = None,
+    ) -> None:
+        self.id = conversation_id
+        self.user_id = user_id
+        self.messages: List[Dict[str, str]] = messages or []
+        # (digest, index of the message it was sent with), oldest first
+        self.images: List[Tuple[str, int]] = images or []
+
+    def images_since(self, index: int, limit: int) -> List[str]:
+        """Digests cited by messages from `index` on, at most the `limit` most recent."""
+        digests = [digest for digest, position in self.images if position >= index]
+        return digests[-limit:] if limit > 0 else []
+
+    def to_json(self) -> str:
+        return json.dumps({"user_id": self.user_id, "messages": self.messages, "images": self.images})
+
+    @classmethod
+    def from_json(cls, conversation_id: str, raw: str) -> "Conversation":
+        data = json.loads(raw)
+        images = [(digest, position) for digest, position in data["images"]]
+        return cls(conversation_id, data["user_id"], data["messages"], images)
+
+
+class ConversationService:
+    """
+    Conversations kept in the state store, for clients that opt in.
+
+    Only text and image digests are stored; the images themselves live
+    once in the blob store. With a shared store (STATE_STORE=sqlite) any
+    worker can continue any conversation; the in-memory store keeps them
+    per process, which only suits a single worker. A conversation expires
+    CONVERSATION_IDLE_TTL_SECONDS after its last turn. Its oldest messages
+    are dropped beyond MAX_CONVERSATION_CHARS, together with the images
+    they cited, and at most MAX_CONVERSATION_IMAGES citations are kept.
+    """
+
+    NAMESPACE = "conversations"
+
+    def __init__(
+        self,
+        store: Optional[StateStore] = None,
+        max_chars: int = MAX_CONVERSATION_CHARS,
+        max_images: int = MAX_CONVERSATION_IMAGES,
+        idle_ttl_seconds: float = CONVERSATION_IDLE_TTL_SECONDS,
+    ) -> None:
+        self.store: StateStore = store if store is not None else InMemoryStateStore()
+        self.max_chars = max_chars
+        self.max_images = max_images
+        self.idle_ttl_seconds = idle_ttl_seconds
+
+    def start(self, user_id: str) -> Conversation:
+        """Create an empty conversation owned by `user_id`; it is stored with its first turn."""
+        self.store.purge_expired(CONVERSATION_PURGE_BATCH)
+        return Conversation(uuid4().hex, user_id)
+
+    def get(self, user_id: str, conversation_id: str) -> Conversation:
+        """Return a conversation of `user_id`.
+
+        Raises:
+            HTTPException: 404 if it does not exist, expired, or belongs to someone else.
+        """
+        raw = self.store.get(self.NAMESPACE, conversation_id)
+        conversation = Conversation.from_json(conversation_id, raw) if raw is not None else None
+        if conversation is None or conversation.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Conversation not found or expired")
+        return conversation
+
+    def add_turn(
+        self,
+        conversation: Conversation,
+        messages: List[Dict[str, str]],
+        image_digests: Optional[List[str]] = None,
+    ) -> None:
+        """Append the client's new message(s) and the images sent with them.
+
+        An image cited again moves to this turn, so it lives as long as its latest citation.
+        """
+        conversation.messages.extend(messages)
+        position = max(0, len(conversation.messages) - 1)
+        cited = list(dict.fromkeys(image_digests or []))
+        if cited:
+            conversation.images = [entry for entry in conversation.images if entry[0] not in cited]
+            conversation.images.extend((digest, position) for digest in cited)
+        self._save(conversation)
+
+    def add_reply(self, conversation: Conversation, content: str) -> None:
+        """Record the assistant's answer so the next turn continues from it."""
+        if content:
+            conversation.messages.append({"role": "assistant", "content": content})
+            self._save(conversation)
+
+    def _save(self, conversation: Conversation) -> None:
+        sizes = [len(str(message.get("content", ""))) for message in conversation.messages]
+        total = sum(sizes)
+        dropped = 0
+        # The newest message is kept whatever its size
+        while total > self.max_chars and dropped < len(sizes) - 1:
+            total -= sizes[dropped]
+            dropped += 1
+        if dropped:
+            del conversation.messages[:dropped]
+            # Images go with the messages that cited them
+            conversation.images = [
+                (digest, position - dropped) for digest, position in conversation.images if position >= dropped
+            ]
+        if len(conversation.images) > self.max_images:
+            del conversation.images[:len(conversation.images) - self.max_images]
+        self.store.set(
+            self.NAMESPACE, conversation.id, conversation.to_json(), time.time() + self.idle_ttl_seconds
+        )
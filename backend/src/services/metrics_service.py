@@ -0,0 +1,208 @@
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; TTFT and stream durations of chat completions
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Seconds between consecutive chunks of one stream
+GAP_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count; `value` may also be incremented directly on hot paths."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """Value that goes up and down, e.g. streams in flight."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value: float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram.
+
+    Observations only bump one per-bucket count and the sum; cumulative
+    bucket counts are computed when scraped.
+    """
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # One extra slot for the +Inf bucket
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class MetricFamily:
+    """
+    A named metric and its children, one per label-value combination.
+
+    Resolve a child with `labels(...)` once per request or stream and keep
+    it; recording on the child is a single attribute update.
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str] = (), **options) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.options = options
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.label_names:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        if self.kind == "counter":
+            return Counter()
+        if self.kind == "gauge":
+            return Gauge()
+        return Histogram(self.options["buckets"])
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def inc(self, amount: float = 1) -> None:
+        self._unlabelled.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._unlabelled.dec(amount)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled.observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            if isinstance(child, Histogram):
+                cumulative = 0
+                for bound, count in zip((*child.bounds, float("inf")), child.counts):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.label_names, values, le)} {cumulative}")
+                labels = _format_labels(self.label_names, values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metric families rendered together in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._families: List[MetricFamily] = []
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._add(MetricFamily(name, help_text, "counter", label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._add(MetricFamily(name, help_text, "gauge", label_names))
+
+    def histogram(
+        self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> MetricFamily:
+        return self._add(MetricFamily(name, help_text, "histogram", label_names, buckets=buckets))
+
+    def _add(self, family: MetricFamily) -> MetricFamily:
+        self._families.append(family)
+        return family
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+class ChatMetrics:
+    """The chat backend's metrics, shared process-wide."""
+
+    def __init__(self) -> None:
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter(
+            "chat_requests_total", "Upstream completion streams by provider and outcome.", ("provider", "outcome")
+        )
+        self.ttft = self.registry.histogram(
+            "chat_time_to_first_token_seconds", "Time from upstream request to first chunk.", ("provider",)
+        )
+        self.stream_duration = self.registry.histogram(
+            "chat_stream_duration_seconds", "Time from upstream request to end of stream.", ("provider",)
+        )
+        self.chunk_gap = self.registry.histogram(
+            "chat_inter_chunk_gap_seconds", "Time between consecutive chunks of a stream.", ("provider",),
+            buckets=GAP_BUCKETS,
+        )
+        self.output_tokens = self.registry.counter(
+            "chat_output_tokens_total", "Estimated tokens streamed back; rate() gives throughput.", ("provider",)
+        )
+        self.in_flight = self.registry.gauge(
+            "chat_streams_in_flight", "Upstream streams currently open.", ("provider",)
+        )
+        self.fallbacks = self.registry.counter(
+            "chat_fallbacks_total", "Requests moved to another provider after a failure.", ("provider", "fallback")
+        )
+        self.upstream_retries = self.registry.counter(
+            "chat_upstream_retries_total", "Upstream requests retried before the first token, by status.",
+            ("provider", "status"),
+        )
+        self.prompt_tokens_saved = self.registry.counter(
+            "chat_prompt_tokens_saved_total", "Estimated prompt tokens trimmed from long histories.", ("provider",)
+        )
+        self.rate_limit_rejections = self.registry.counter(
+            "rate_limit_rejections_total", "Requests rejected by the per-user rate limiter.", ("route",)
+        )
+        self.image_upload_bytes = self.registry.counter(
+            "image_upload_bytes_total", "Bytes of images uploaded with chat requests."
+        )
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+metrics: ChatMetrics = ChatMetrics()
@@ -0,0 +1,160 @@
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+# Circuit breaker and scoring settings
+FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+RESET_TIMEOUT_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+HEALTH_WINDOW: int = int(os.getenv("PROVIDER_HEALTH_WINDOW", "20"))
+# Outcomes older than this stop counting, so a recovered provider is retried
+HEALTH_WINDOW_SECONDS: float = float(os.getenv("PROVIDER_HEALTH_WINDOW_SECONDS", "120"))
+EWMA_ALPHA: float = 0.3
+
+# Assumptions for providers that have not been measured yet
+DEFAULT_TTFT_SECONDS: float = 1.0
+DEFAULT_TOKENS_PER_SECOND: float = 50.0
+# Answer length used to weigh throughput against time-to-first-token
+EXPECTED_ANSWER_TOKENS: int = 200
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderStats:
+    """Rolling health, latency and circuit-breaker state of one provider."""
+
+    def __init__(self) -> None:
+        # (monotonic timestamp, succeeded) of the most recent requests
+        self.outcomes: Deque[Tuple[float, bool]] = deque(maxlen=HEALTH_WINDOW)
+        self.ewma_ttft: Optional[float] = None
+        self.ewma_tokens_per_second: Optional[float] = None
+        self.state: str = CLOSED
+        self.consecutive_failures: int = 0
+        self.opened_at: float = 0.0
+        self.probe_in_flight: bool = False
+
+    @property
+    def success_rate(self) -> float:
+        """Recent success ratio, smoothed so one failure does not zero it."""
+        horizon = time.monotonic() - HEALTH_WINDOW_SECONDS
+        while self.outcomes and self.outcomes[0][0] < horizon:
+            self.outcomes.popleft()
+        successes = sum(1 for _, ok in self.outcomes if ok)
+        return (successes + 1) / (len(self.outcomes) + 1)
+
+    def expected_latency(self) -> float:
+        """Estimated seconds to stream a typical answer."""
+        ttft = self.ewma_ttft if self.ewma_ttft is not None else DEFAULT_TTFT_SECONDS
+        tps = self.ewma_tokens_per_second or DEFAULT_TOKENS_PER_SECOND
+        return ttft + EXPECTED_ANSWER_TOKENS / tps
+
+    def score(self) -> float:
+        """Higher is better: reliable providers that finish answers sooner."""
+        return self.success_rate / self.expected_latency()
+
+
+def _ewma(previous: Optional[float], sample: float) -> float:
+    if previous is None:
+        return sample
+    return EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * previous
+
+
+class ProviderRouterService:
+    """
+    Health- and latency-aware provider selection with circuit breakers.
+
+    After FAILURE_THRESHOLD consecutive failures a provider's circuit opens
+    and requests to it fail fast. Once RESET_TIMEOUT_SECONDS have passed a
+    single half-open probe is let through; its outcome closes or re-opens
+    the circuit.
+    """
+
+    def __init__(self, provider_names: Iterable[str]) -> None:
+        # Insertion order is the tie-break preference (gemini before groq)
+        self.stats: Dict[str, ProviderStats] = {name: ProviderStats() for name in provider_names}
+
+    def _refresh(self, stats: ProviderStats) -> None:
+        if stats.state == OPEN and time.monotonic() - stats.opened_at >= RESET_TIMEOUT_SECONDS:
+            stats.state = HALF_OPEN
+            stats.probe_in_flight = False
+
+    def is_available(self, name: str) -> bool:
+        """Whether a request to `name` would currently be admitted."""
+        stats = self.stats.get(name)
+        if stats is None:
+            return False
+        self._refresh(stats)
+        if stats.state == OPEN:
+            return False
+        return not (stats.state == HALF_OPEN and stats.probe_in_flight)
+
+    def acquire(self, name: str) -> bool:
+        """Admit a request to `name`, claiming the probe slot when half-open."""
+        if not self.is_available(name):
+            return False
+        stats = self.stats[name]
+        if stats.state == HALF_OPEN:
+            stats.probe_in_flight = True
+        return True
+
+    def release(self, name: str) -> None:
+        """Give back a probe slot for a request that ended without a verdict."""
+        stats = self.stats.get(name)
+        if stats is not None:
+            stats.probe_in_flight = False
+
+    def record_success(self, name: str, ttft: float, tokens: float, duration: float) -> None:
+        """Record a successful stream and close the provider's circuit."""
+        stats = self.stats[name]
+        stats.outcomes.append((time.monotonic(), True))
+        stats.consecutive_failures = 0
+        stats.state = CLOSED
+        stats.probe_in_flight = False
+        stats.ewma_ttft = _ewma(stats.ewma_ttft, ttft)
+        generation_time = duration - ttft
+        if tokens > 0 and generation_time > 0:
+            stats.ewma_tokens_per_second = _ewma(stats.ewma_tokens_per_second, tokens / generation_time)
+
+    def record_failure(self, name: str) -> None:
+        """Record a failed request, opening the circuit when warranted."""
+        stats = self.stats[name]
+        stats.outcomes.append((time.monotonic(), False))
+        stats.consecutive_failures += 1
+        stats.probe_in_flight = False
+        if stats.state == HALF_OPEN or stats.consecutive_failures >= FAILURE_THRESHOLD:
+            stats.state = OPEN
+            stats.opened_at = time.monotonic()
+
+    def choose(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """Return the healthiest, fastest admissible provider, if any."""
+        excluded = set(exclude)
+        candidates: List[str] = [
+            name for name in self.stats if name not in excluded and self.is_available(name)
+        ]
+        if not candidates:
+            return None
+        # max() keeps the first of equal scores, preserving preference order
+        return max(candidates, key=lambda name: self.stats[name].score())
+
+    def expected_ttft(self, name: str) -> Optional[float]:
+        """Smoothed time-to-first-token of `name`, if it has been measured."""
+        stats = self.stats.get(name)
+        return stats.ewma_ttft if stats else None
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Current per-provider health, for diagnostics."""
+        for stats in self.stats.values():
+            self._refresh(stats)
+        return {
+            name: {
+                "state": stats.state,
+                "success_rate": round(stats.success_rate, 3),
+                "ewma_ttft_ms": round(stats.ewma_ttft * 1000, 1) if stats.ewma_ttft is not None else None,
+                "ewma_tokens_per_second": (
+                    round(stats.ewma_tokens_per_second, 1) if stats.ewma_tokens_per_second else None
+                ),
+            }
+            for name, stats in self.stats.items()
+        }
@@ -0,0 +1,280 @@
+import asyncio
+import os
+import random
+import re
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Deque, Dict, Iterable, Mapping, Optional
+
+from src.services.config_service import parse_provider_limits
+
+# Upstream quotas per provider, e.g. `gemini=15,groq=30`; unset means unlimited
+QUOTA_PROVIDER_RPM: Dict[str, int] = parse_provider_limits(os.getenv("QUOTA_PROVIDER_RPM", ""))
+QUOTA_PROVIDER_TPM: Dict[str, int] = parse_provider_limits(os.getenv("QUOTA_PROVIDER_TPM", ""))
+# A request that would have to wait longer than this for quota is refused instead
+QUOTA_MAX_WAIT_SECONDS: float = float(os.getenv("QUOTA_MAX_WAIT_SECONDS", "10"))
+# Retries of a 429/5xx answer, only ever before the first token
+QUOTA_MAX_RETRIES: int = int(os.getenv("QUOTA_MAX_RETRIES", "2"))
+QUOTA_RETRY_BASE_SECONDS: float = float(os.getenv("QUOTA_RETRY_BASE_SECONDS", "0.5"))
+# A Retry-After beyond this is not waited out; the caller falls back instead
+QUOTA_MAX_RETRY_WAIT_SECONDS: float = float(os.getenv("QUOTA_MAX_RETRY_WAIT_SECONDS", "10"))
+
+WINDOW_SECONDS: float = 60.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Pause applied to a provider after a 429 that did not say how long to wait
+DEFAULT_BLOCK_SECONDS: float = 1.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS: Dict[str, float] = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds from an `x-ratelimit-reset-*` header such as `7.66s` or `2m59.5s`."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(float(headers[name]))
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+class QuotaExceeded(Exception):
+    """Raised when a provider's quota would not allow a request soon enough."""
+
+    def __init__(self, provider: str, retry_after: float) -> None:
+        super().__init__(f"Provider '{provider}' quota exhausted")
+        self.retry_after = retry_after
+
+
+class QuotaUsage:
+    """A request counted against a provider's per-minute window."""
+
+    __slots__ = ("sent", "tokens")
+
+    def __init__(self, sent: float, tokens: float) -> None:
+        self.sent = sent
+        self.tokens = tokens
+
+
+class ProviderQuota:
+    """Requests and tokens of the last minute for one provider, plus what upstream reported."""
+
+    def __init__(self, rpm: Optional[int], tpm: Optional[int]) -> None:
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window: Deque[QuotaUsage] = deque()
+        # Learned from rate-limit headers; None until a provider reports them
+        self.remaining_requests: Optional[int] = None
+        self.requests_reset_at: float = 0.0
+        self.remaining_tokens: Optional[int] = None
+        self.tokens_reset_at: float = 0.0
+        self.blocked_until: float = 0.0
+        self.sent: int = 0
+        self.paced: int = 0
+        self.refused: int = 0
+        self.throttled: int = 0
+        self.retried: int = 0
+        self.wait_seconds_total: float = 0.0
+
+    def prune(self, now: float) -> None:
+        """Drop usage older than the window and reported allowances past their reset."""
+        horizon = now - WINDOW_SECONDS
+        while self.window and self.window[0].sent <= horizon:
+            self.window.popleft()
+        if self.remaining_requests is not None and now >= self.requests_reset_at:
+            self.remaining_requests = None
+        if self.remaining_tokens is not None and now >= self.tokens_reset_at:
+            self.remaining_tokens = None
+
+    def wait_time(self, tokens: float, now: float) -> float:
+        """Seconds until a request of `tokens` fits every known limit."""
+        wait = self.blocked_until - now
+        if self.rpm is not None and len(self.window) >= self.rpm:
+            wait = max(wait, self.window[len(self.window) - self.rpm].sent + WINDOW_SECONDS - now)
+        if self.tpm is not None and self.window:
+            excess = sum(usage.tokens for usage in self.window) + tokens - self.tpm
+            # Wait for enough of the oldest usage to leave the window
+            for usage in self.window:
+                if excess <= 0:
+                    break
+                excess -= usage.tokens
+                wait = max(wait, usage.sent + WINDOW_SECONDS - now)
+        if self.remaining_requests is not None and self.remaining_requests <= 0:
+            wait = max(wait, self.requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens < tokens:
+            wait = max(wait, self.tokens_reset_at - now)
+        return wait
+
+    def record(self, tokens: float, now: float) -> QuotaUsage:
+        usage = QuotaUsage(now, tokens)
+        self.window.append(usage)
+        self.sent += 1
+        # Spend the reported allowance locally until the next headers arrive
+        if self.remaining_requests is not None:
+            self.remaining_requests -= 1
+        if self.remaining_tokens is not None:
+            self.remaining_tokens -= int(tokens)
+        return usage
+
+    def learn(self, headers: Mapping[str, str], now: float) -> None:
+        """Adopt the OpenAI-style `x-ratelimit-*` headers (Groq sends them)."""
+        remaining = _header_int(headers, "x-ratelimit-remaining-requests")
+        if remaining is not None:
+            self.remaining_requests = remaining
+            self.requests_reset_at = now + (parse_reset(headers.get("x-ratelimit-reset-requests")) or WINDOW_SECONDS)
+        remaining = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if remaining is not None:
+            self.remaining_tokens = remaining
+            self.tokens_reset_at = now + (parse_reset(headers.get("x-ratelimit-reset-tokens")) or WINDOW_SECONDS)
+
+
+class QuotaService:
+    """
+    Client-side shaping of outbound requests to each provider's quota.
+
+    Requests are counted, with their estimated tokens, in a one-minute
+    sliding window against the configured RPM/TPM, and against the
+    allowance providers report in rate-limit headers. A request that does
+    not fit waits until it does, or is refused when that would take more
+    than QUOTA_MAX_WAIT_SECONDS. A 429 pauses the provider for its
+    Retry-After, so concurrent requests back off together instead of each
+    hitting the limit again.
+    """
+
+    def __init__(
+        self,
+        provider_names: Iterable[str],
+        rpm: Optional[Dict[str, int]] = None,
+        tpm: Optional[Dict[str, int]] = None,
+        max_wait_seconds: float = QUOTA_MAX_WAIT_SECONDS,
+        max_retries: int = QUOTA_MAX_RETRIES,
+    ) -> None:
+        rpm = QUOTA_PROVIDER_RPM if rpm is None else rpm
+        tpm = QUOTA_PROVIDER_TPM if tpm is None else tpm
+        self.max_wait_seconds = max_wait_seconds
+        self.max_retries = max_retries
+        self._quotas: Dict[str, ProviderQuota] = {
+            name: ProviderQuota(rpm.get(name), tpm.get(name)) for name in provider_names
+        }
+
+    async def reserve(self, name: str, tokens: float) -> Optional[QuotaUsage]:
+        """
+        Wait until `name` has quota for a request of `tokens`, then count it.
+
+        Returns:
+            Optional[QuotaUsage]: The counted usage, to be settled with the
+            actual tokens once known; None for an unknown provider.
+
+        Raises:
+            QuotaExceeded: If the quota would not allow it within the maximum wait.
+        """
+        quota = self._quotas.get(name)
+        if quota is None:
+            return None
+        started = now = time.monotonic()
+        paced = False
+        while True:
+            quota.prune(now)
+            wait = quota.wait_time(tokens, now)
+            if wait <= 0:
+                break
+            if now - started + wait > self.max_wait_seconds:
+                quota.refused += 1
+                raise QuotaExceeded(name, wait)
+            # Waiters re-check on waking since another may have taken the room
+            await asyncio.sleep(wait)
+            paced = True
+            now = time.monotonic()
+        if paced:
+            quota.paced += 1
+            quota.wait_seconds_total += now - started
+        return quota.record(tokens, now)
+
+    @staticmethod
+    def settle(usage: Optional[QuotaUsage], tokens: float) -> None:
+        """Replace a request's estimated tokens with the actual count."""
+        if usage is not None:
+            usage.tokens = tokens
+
+    def observe(self, name: str, status: int, headers: Mapping[str, str]) -> None:
+        """Learn from an upstream response's status and rate-limit headers."""
+        quota = self._quotas.get(name)
+        if quota is None:
+            return
+        now = time.monotonic()
+        quota.learn(headers, now)
+        if status == 429:
+            quota.throttled += 1
+            pause = parse_retry_after(headers.get("retry-after"))
+            quota.blocked_until = max(quota.blocked_until, now + (pause if pause is not None else DEFAULT_BLOCK_SECONDS))
+
+    def retry_delay(self, name: str, status: int, headers: Mapping[str, str], attempt: int) -> Optional[float]:
+        """
+        Backoff before retrying a failed request, or None if it should not be retried.
+
+        Only 429 and 5xx answers are retried. Retry-After is honoured (with
+        a little jitter so waiters do not return in lockstep); otherwise the
+        delay is exponential with jitter.
+        """
+        quota = self._quotas.get(name)
+        if quota is None or status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return None
+        retry_after = parse_retry_after(headers.get("retry-after"))
+        if retry_after is not None:
+            delay = retry_after * (1 + random.uniform(0, 0.1))
+        else:
+            ceiling = QUOTA_RETRY_BASE_SECONDS * 2 ** attempt
+            delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+        if delay > QUOTA_MAX_RETRY_WAIT_SECONDS:
+            return None
+        quota.retried += 1
+        return delay
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        stats: Dict[str, Dict[str, object]] = {}
+        for name, quota in self._quotas.items():
+            quota.prune(now)
+            stats[name] = {
+                "rpm_limit": quota.rpm,
+                "tpm_limit": quota.tpm,
+                "requests_last_minute": len(quota.window),
+                "tokens_last_minute": round(sum(usage.tokens for usage in quota.window)),
+                "remaining_requests": quota.remaining_requests,
+                "remaining_tokens": quota.remaining_tokens,
+                "blocked_seconds": round(max(0.0, quota.blocked_until - now), 2),
+                "sent": quota.sent,
+                "paced": quota.paced,
+                "refused": quota.refused,
+                "throttled": quota.throttled,
+                "retried": quota.retried,
+                "wait_ms_avg": round(quota.wait_seconds_total / quota.paced * 1000, 1) if quota.paced else 0.0,
+            }
+        return stats
@@ -1,39 +1,125 @@
-from collections import deque
-from datetime import datetime, timedelta
-from typing import Deque, Dict
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+from src.services.state_store_service import InMemoryStateStore, StateStore
 
 REQUEST_LIMIT: int = 10
 WINDOW_SECONDS: int = 60
+EVICTION_INTERVAL_SECONDS: float = float(os.getenv("RATE_LIMIT_EVICTION_INTERVAL", "60"))
+
+DEFAULT_ROUTE: str = "chat"
+DEFAULT_TIER: str = "default"
+NAMESPACE_PREFIX: str = "rate_limit:"
+
+
+class RateLimit:
+    """`requests` allowed per `period_seconds`, as a GCRA emission interval."""
+
+    __slots__ = ("requests", "period_seconds", "interval", "tolerance")
+
+    def __init__(self, requests: int, period_seconds: float) -> None:
+        self.requests = requests
+        self.period_seconds = period_seconds
+        # One request "costs" `interval`; a full burst may run `tolerance` ahead
+        self.interval = period_seconds / requests
+        self.tolerance = period_seconds - self.interval
+
+
+def _parse_limits(spec: str) -> Dict[Tuple[str, str], RateLimit]:
+    """Parse `route:tier=requests/seconds` pairs, e.g. `chat:premium=60/60`."""
+    limits: Dict[Tuple[str, str], RateLimit] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        scope, _, rate = item.partition("=")
+        route, _, tier = scope.partition(":")
+        requests, _, seconds = rate.partition("/")
+        limits[(route.strip(), tier.strip() or DEFAULT_TIER)] = RateLimit(int(requests), float(seconds))
+    return limits
+
+
+# Per-route / per-tier overrides; anything unlisted gets REQUEST_LIMIT per WINDOW_SECONDS
+RATE_LIMITS: Dict[Tuple[str, str], RateLimit] = _parse_limits(os.getenv("RATE_LIMITS", ""))
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a key has no capacity left."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
 
 
 class RateLimitService:
-    """Simple in-memory rate limiter."""
+    """
+    GCRA (generic cell rate algorithm) rate limiter.
+
+    Each (route, user) keeps a single float in the state store: its
+    theoretical arrival time. Once that time has passed the key holds a full
+    burst again and carries no information, so idle keys are evicted.
+    """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        limits: Optional[Dict[Tuple[str, str], RateLimit]] = None,
+        store: Optional[StateStore] = None,
+    ) -> None:
         """Initialize rate limiter storage."""
-        self.user_requests: Dict[str, Deque[datetime]] = {}
+        self.limits: Dict[Tuple[str, str], RateLimit] = dict(RATE_LIMITS if limits is None else limits)
+        self.default_limit: RateLimit = RateLimit(REQUEST_LIMIT, WINDOW_SECONDS)
+        # Per-process by default; pass a shared store to limit across workers
+        self.store: StateStore = store if store is not None else InMemoryStateStore()
+        self._eviction_task: Optional[asyncio.Task] = None
 
-    def check_rate_limit(self, user_id: str) -> None:
+    def limit_for(self, route: str, tier: str) -> RateLimit:
+        """Resolve the limit for a route and tier, most specific first."""
+        return (
+            self.limits.get((route, tier))
+            or self.limits.get((route, DEFAULT_TIER))
+            or self.default_limit
+        )
+
+    def check_rate_limit(self, user_id: str, route: str = DEFAULT_ROUTE, tier: str = DEFAULT_TIER) -> None:
         """Check and enforce rate limit for user.
 
         Args:
             user_id: Identifier of requesting user.
+            route: Name of the limited route.
+            tier: Plan of the user, selecting its limit.
 
         Raises:
-            Exception: When user exceeded rate limit.
+            RateLimitExceeded: When user exceeded rate limit.
         """
-        now: datetime = datetime.utcnow()
-        window_start: datetime = now - timedelta(seconds=WINDOW_SECONDS)
+        limit = self.limit_for(route, tier)
+        retry_after = self.store.throttle(
+            f"{NAMESPACE_PREFIX}{route}", user_id, limit.interval, limit.tolerance
+        )
+        if retry_after is not None:
+            raise RateLimitExceeded(retry_after=retry_after)
 
-        if user_id not in self.user_requests:
-            self.user_requests[user_id] = deque()
+    def evict_idle(self) -> int:
+        """Drop keys whose burst capacity has fully recovered.
 
-        request_queue: Deque[datetime] = self.user_requests[user_id]
+        Returns:
+            int: Number of evicted keys.
+        """
+        return self.store.evict_idle()
 
-        while request_queue and request_queue[0] < window_start:
-            request_queue.popleft()
+    def start_eviction(self, interval_seconds: float = EVICTION_INTERVAL_SECONDS) -> None:
+        """Start periodic background eviction on the running event loop."""
+        if self._eviction_task is None or self._eviction_task.done():
+            self._eviction_task = asyncio.create_task(self._evict_forever(interval_seconds))
 
-        if len(request_queue) >= REQUEST_LIMIT:
-            raise Exception("Rate limit exceeded")
+    async def stop_eviction(self) -> None:
+        """Stop the background eviction task."""
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+            self._eviction_task = None
 
-        request_queue.append(now)
+    async def _evict_forever(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            self.evict_idle()
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+# Replay hits with the original inter-chunk delays instead of all at once
+RESPONSE_CACHE_REPLAY_TIMING: bool = os.getenv("RESPONSE_CACHE_REPLAY_TIMING", "false").lower() in ("1", "true", "yes")
+
+
+class CachedResponse:
+    """A completed answer: text chunks with their offsets from the first chunk."""
+
+    __slots__ = ("chunks", "offsets", "size", "expires_at")
+
+    def __init__(self, chunks: List[str], offsets: List[float], expires_at: float) -> None:
+        self.chunks = chunks
+        self.offsets = offsets
+        self.size = sum(len(chunk.encode("utf-8")) for chunk in chunks)
+        self.expires_at = expires_at
+
+
+class ResponseCacheService:
+    """
+    Exact-match cache of streamed chat completions.
+
+    Entries are kept in LRU order, expire after a TTL, and the cache is
+    bounded both by entry count and by the total size of cached text.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        enabled: bool = RESPONSE_CACHE_ENABLED,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.expirations: int = 0
+
+    @staticmethod
+    def build_key(provider: str, messages: List[Dict[str, str]], image_digests: Sequence[str] = ()) -> str:
+        """Canonical hash of the provider, normalized messages and image contents."""
+        normalized = [
+            [str(message.get("role", "")).strip().lower(), str(message.get("content", "")).strip()]
+            for message in messages
+        ]
+        canonical = json.dumps(
+            {"provider": provider, "messages": normalized, "images": list(image_digests)},
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return a live entry and mark it recently used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, chunks: List[str], offsets: List[float]) -> None:
+        """Store a completed answer, evicting least recently used entries."""
+        entry = CachedResponse(chunks, offsets, time.monotonic() + self.ttl_seconds)
+        if not chunks or entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def replay(self, entry: CachedResponse, timing: bool = RESPONSE_CACHE_REPLAY_TIMING) -> AsyncIterator[str]:
+        """Yield a cached answer's chunks, optionally at their original pace."""
+        started = time.monotonic()
+        for chunk, offset in zip(entry.chunks, entry.offsets):
+            if timing:
+                delay = offset - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield chunk
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+
+def parse_cache_control(header: Optional[str]) -> Tuple[bool, bool]:
+    """
+    Interpret a request `Cache-Control` header.
+
+    Returns:
+        Tuple[bool, bool]: (may read from cache, may write to cache).
+            `no-cache` skips lookup but refreshes the entry; `no-store`
+            bypasses the cache entirely.
+    """
+    if not header:
+        return True, True
+    directives = {part.strip().lower() for part in header.split(",")}
+    if "no-store" in directives:
+        return False, False
+    if "no-cache" in directives or "max-age=0" in directives:
+        return False, True
+    return True, True
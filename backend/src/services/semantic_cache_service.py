@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.services.response_cache_service import CachedResponse
+
+try:
+    import numpy as np
+except ImportError:  # optional (requirements-semantic.txt): only the semantic cache needs it
+    np = None
+
+SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Cosine similarity a cached prompt needs to be served for a new one
+SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+# Per provider namespace
+SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+SEMANTIC_CACHE_DIMENSIONS: int = int(os.getenv("SEMANTIC_CACHE_DIMENSIONS", "512"))
+SEMANTIC_CACHE_TTL_SECONDS: float = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "600"))
+
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Feature weights: whole words and word pairs carry meaning, trigrams absorb typos and inflection
+_WORD_WEIGHT, _PAIR_WEIGHT, _TRIGRAM_WEIGHT = 1.0, 1.0, 0.5
+
+
+def embed(text: str, dimensions: int = SEMANTIC_CACHE_DIMENSIONS) -> "np.ndarray":
+    """
+    Unit-length hashing-trick vector of `text`: words, word pairs and character trigrams.
+
+    Features are hashed with CRC-32 into `dimensions` buckets with a hash-
+    derived sign, so no vocabulary or model is needed and the vector is
+    the same in every process.
+    """
+    words = _WORD.findall(text.lower())
+    features: List[str] = list(words)
+    weights: List[float] = [_WORD_WEIGHT] * len(words)
+    features.extend(f"{first} {second}" for first, second in zip(words, words[1:]))
+    weights.extend([_PAIR_WEIGHT] * (len(features) - len(weights)))
+    for word in words:
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    weights.extend([_TRIGRAM_WEIGHT] * (len(features) - len(weights)))
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32,
+                         count=len(features))
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0) * np.asarray(weights)
+    vector += np.bincount(hashes % dimensions, weights=signs, minlength=dimensions).astype(np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _normalize(message: Dict[str, str]) -> List[str]:
+    return [str(message.get("role", "")).strip().lower(), str(message.get("content", "")).strip()]
+
+
+def context_id(messages: Sequence[Dict[str, str]], image_digests: Sequence[str] = ()) -> Tuple[int, str]:
+    """
+    Split a conversation into (exact-context id, prompt to embed).
+
+    Only the last message is compared by similarity. Everything before it,
+    the images and the numbers in the prompt must match exactly: "2 + 2"
+    and "2 + 3" embed almost identically but must not share an answer.
+    """
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    canonical = json.dumps(
+        {
+            "history": [_normalize(message) for message in messages[:-1]],
+            "role": _normalize(messages[-1])[0] if messages else "",
+            "images": list(image_digests),
+            "numbers": _NUMBER.findall(prompt),
+        },
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest()
+    # 0 marks an empty slot
+    return int.from_bytes(digest, "little", signed=True) or 1, prompt
+
+
+class SemanticIndex:
+    """
+    Fixed-capacity matrix of prompt vectors for one provider.
+
+    Rows are unit vectors, so one matrix-vector product scores the query
+    against every cached prompt. Slots are reused least recently used first.
+    """
+
+    def __init__(self, capacity: int, dimensions: int) -> None:
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.contexts = np.zeros(capacity, dtype=np.int64)
+        self.entries: List[Optional[CachedResponse]] = [None] * capacity
+        # Slots in LRU order
+        self.order: "OrderedDict[int, None]" = OrderedDict()
+        # Rows below this have been used; only they are scored
+        self.high_water: int = 0
+        self.free: List[int] = []
+
+    def nearest(self, vector: "np.ndarray", context: int) -> Tuple[int, float]:
+        """Best (slot, similarity) among entries with the same context; (-1, 0.0) if none."""
+        rows = self.high_water
+        if rows == 0:
+            return -1, 0.0
+        scores = self.vectors[:rows] @ vector
+        scores[self.contexts[:rows] != context] = -1.0
+        slot = int(np.argmax(scores))
+        score = float(scores[slot])
+        return (slot, score) if score > -1.0 else (-1, 0.0)
+
+    def insert(self, vector: "np.ndarray", context: int, entry: CachedResponse) -> int:
+        if self.free:
+            slot = self.free.pop()
+        elif self.high_water < self.capacity:
+            slot = self.high_water
+            self.high_water += 1
+        else:
+            slot, _ = self.order.popitem(last=False)
+        self.vectors[slot] = vector
+        self.contexts[slot] = context
+        self.entries[slot] = entry
+        self.order[slot] = None
+        self.order.move_to_end(slot)
+        return slot
+
+    def remove(self, slot: int) -> None:
+        self.contexts[slot] = 0
+        self.entries[slot] = None
+        self.order.pop(slot, None)
+        self.free.append(slot)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+
+class SemanticCacheService:
+    """
+    Near-duplicate cache of completed answers, in front of the providers.
+
+    Prompts that differ only in whitespace, casing or small rewording map
+    to nearby hashing-vectorizer embeddings. A lookup scores the prompt
+    against every cached one of the same provider and exact context in a
+    single NumPy product and serves the best match above the threshold.
+    A scan of a large index takes milliseconds, so callers run `get` and
+    `put` in a worker thread (NumPy releases the GIL for the product).
+    Needs NumPy (requirements-semantic.txt); enabling it without NumPy
+    fails at startup rather than silently leaving the cache off.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        dimensions: int = SEMANTIC_CACHE_DIMENSIONS,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+    ) -> None:
+        if enabled and np is None:
+            raise RuntimeError(
+                "SEMANTIC_CACHE_ENABLED is set but NumPy is not installed; "
+                "install requirements-semantic.txt or disable the semantic cache"
+            )
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.dimensions = dimensions
+        self.ttl_seconds = ttl_seconds
+        self._indexes: Dict[str, SemanticIndex] = {}
+        # Lookups and inserts run in worker threads
+        self._lock = threading.Lock()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.expirations: int = 0
+
+    def get(
+        self, namespace: str, messages: Sequence[Dict[str, str]], image_digests: Sequence[str] = ()
+    ) -> Optional[Tuple[CachedResponse, float]]:
+        """The cached answer to the most similar prompt and its similarity, if above the threshold. Blocking."""
+        if not messages:
+            return None
+        context, prompt = context_id(messages, image_digests)
+        vector = embed(prompt, self.dimensions)
+        with self._lock:
+            index = self._indexes.get(namespace)
+            slot, score = index.nearest(vector, context) if index is not None else (-1, 0.0)
+            if slot < 0 or score < self.threshold:
+                self.misses += 1
+                return None
+            entry = index.entries[slot]
+            if entry is None or entry.expires_at <= time.monotonic():
+                index.remove(slot)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            index.order.move_to_end(slot)
+            self.hits += 1
+            return entry, score
+
+    def put(
+        self,
+        namespace: str,
+        messages: Sequence[Dict[str, str]],
+        chunks: List[str],
+        offsets: List[float],
+        image_digests: Sequence[str] = (),
+    ) -> None:
+        """Cache a completed answer under its prompt's embedding. Blocking."""
+        if not chunks or not messages:
+            return
+        context, prompt = context_id(messages, image_digests)
+        vector = embed(prompt, self.dimensions)
+        entry = CachedResponse(chunks, offsets, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = SemanticIndex(self.max_entries, self.dimensions)
+            # A near-identical prompt already cached is refreshed rather than duplicated
+            slot, score = index.nearest(vector, context)
+            if slot >= 0 and score >= self.threshold:
+                index.remove(slot)
+            index.insert(vector, context, entry)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = sum(len(index) for index in self._indexes.values())
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class Flight:
+    """One shared upstream stream and the chunks it produced so far."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.chunks: List[str] = []
+        self.done: bool = False
+        self.error: Optional[BaseException] = None
+        self.subscribers: int = 0
+        self.task: Optional[asyncio.Task] = None
+        # Replaced after every publish; waiters hold the one current when they slept
+        self._changed: asyncio.Event = asyncio.Event()
+
+    def publish(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class SingleFlightService:
+    """
+    Coalesces identical in-flight completions into one upstream stream.
+
+    The first request for a key starts the stream in a background task that
+    buffers every chunk; identical requests arriving while it runs replay
+    the buffered prefix and then follow it live. A subscriber leaving does
+    not affect the others; the upstream is cancelled only when the last one
+    leaves. Finished flights are forgotten, later requests start anew.
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED) -> None:
+        self.enabled = enabled
+        self._flights: Dict[str, Flight] = {}
+        self.started: int = 0
+        self.coalesced: int = 0
+
+    def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """
+        Follow the flight for `key`, starting it with `factory()` if none is running.
+
+        Returns:
+            Tuple[AsyncIterator[str], bool]: The chunk stream and whether it
+            joined a flight started by another request.
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = self._flights[key] = Flight(key)
+            flight.task = asyncio.create_task(self._run(flight, factory))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        flight.subscribers += 1
+        return self._follow(flight), shared
+
+    async def _run(self, flight: Flight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async with aclosing(factory()) as stream:
+                async for chunk in stream:
+                    flight.chunks.append(chunk)
+                    flight.publish()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(flight)
+            flight.publish()
+
+    async def _follow(self, flight: Flight) -> AsyncIterator[str]:
+        position = 0
+        try:
+            while True:
+                if position < len(flight.chunks):
+                    chunk = flight.chunks[position]
+                    position += 1
+                    yield chunk
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more: stop paying for the upstream
+                self._forget(flight)
+                flight.task.cancel()
+
+    def _forget(self, flight: Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+from contextlib import aclosing
+from json.encoder import encode_basestring_ascii
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from src.services.stream_registry_service import StreamHandle
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+# Text arriving within this window after a flush shares one frame (0 = a frame per chunk)
+SSE_COALESCE_WINDOW_SECONDS: float = float(os.getenv("SSE_COALESCE_WINDOW_MS", "20")) / 1000
+# A frame is sent as soon as this much text is pending
+SSE_COALESCE_MAX_BYTES: int = int(os.getenv("SSE_COALESCE_MAX_BYTES", "2048"))
+
+DONE_FRAME: bytes = b"data: [DONE]\n\n"
+# Chunk frames are the hot path: only the content string is encoded per frame
+_CHUNK_PREFIX: bytes = b'data: {"type":"chunk","content":'
+_CHUNK_SUFFIX: bytes = b"}\n\n"
+
+# Markers placed on the output queue alongside text chunks
+_FLUSH = object()
+_END = object()
+_STOP = object()
+
+
+if orjson is not None:
+    def _encode_json(value: object) -> bytes:
+        return orjson.dumps(value)
+else:
+    def _encode_json(value: object) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def encode_event(payload: Dict[str, object]) -> bytes:
+    """Frame a JSON event for the SSE stream."""
+    return b"data: " + _encode_json(payload) + b"\n\n"
+
+
+def encode_chunk(text: str) -> bytes:
+    """Frame answer text as a `chunk` event."""
+    if orjson is not None:
+        return _CHUNK_PREFIX + orjson.dumps(text) + _CHUNK_SUFFIX
+    return _CHUNK_PREFIX + encode_basestring_ascii(text).encode("ascii") + _CHUNK_SUFFIX
+
+
+def socket_prefix(fields: Dict[str, object]) -> bytes:
+    """Start of a WebSocket message carrying `fields` and, as `data`, one SSE event."""
+    if not fields:
+        return b'{"data":'
+    return _encode_json(fields)[:-1] + b',"data":'
+
+
+def socket_message(prefix: bytes, frame: bytes) -> str:
+    """Re-wrap an SSE frame as a WebSocket text message without re-encoding the event."""
+    data = b'"[DONE]"' if frame == DONE_FRAME else frame[6:-2]
+    return (prefix + data + b"}").decode("utf-8")
+
+
+class SSEOutput:
+    """
+    Turns a completion stream into SSE frames, coalescing small chunks.
+
+    The first text chunk is framed at once so time-to-first-token is not
+    delayed. Later chunks are buffered until the window since the buffer
+    was started elapses or enough text is pending, then sent as a single
+    `chunk` event. Pre-framed events (meta, info) flush pending text and
+    pass through in order. Cancelling the stream's handle ends the output
+    after pending text and closes the upstream at once, even mid-wait.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = SSE_COALESCE_WINDOW_SECONDS,
+        max_bytes: int = SSE_COALESCE_MAX_BYTES,
+    ) -> None:
+        self.window_seconds = window_seconds
+        self.max_bytes = max_bytes
+
+    async def frames(
+        self,
+        source: AsyncIterator[str],
+        on_text: Optional[Callable[[str], None]] = None,
+        handle: Optional[StreamHandle] = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield encoded frames for `source`; `on_text` sees every text chunk."""
+        if self.window_seconds <= 0 and handle is None:
+            async with aclosing(source) as stream:
+                async for chunk in stream:
+                    if chunk.startswith("data:"):
+                        yield chunk.encode("utf-8")
+                    else:
+                        if on_text is not None:
+                            on_text(chunk)
+                        yield encode_chunk(chunk)
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        pump = asyncio.create_task(self._pump(source, queue))
+        if handle is not None:
+            handle.on_cancel(lambda: queue.put_nowait(_STOP))
+        pending: List[str] = []
+        pending_size = 0
+        timer: Optional[asyncio.TimerHandle] = None
+        first = True
+        try:
+            while True:
+                item = await queue.get()
+                if item is _FLUSH:
+                    timer = None
+                    if pending:
+                        yield encode_chunk("".join(pending))
+                        pending.clear()
+                        pending_size = 0
+                    continue
+                if item is _END or item is _STOP or isinstance(item, Exception) or item.startswith("data:"):
+                    if pending:
+                        yield encode_chunk("".join(pending))
+                        pending.clear()
+                        pending_size = 0
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    if item is _END or item is _STOP:
+                        # On stop, leaving cancels the pump and with it the upstream request
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item.encode("utf-8")
+                    continue
+
+                if on_text is not None:
+                    on_text(item)
+                pending.append(item)
+                pending_size += len(item)
+                if first or pending_size >= self.max_bytes or self.window_seconds <= 0:
+                    first = False
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    yield encode_chunk("".join(pending))
+                    pending.clear()
+                    pending_size = 0
+                elif timer is None:
+                    timer = loop.call_later(self.window_seconds, queue.put_nowait, _FLUSH)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            pump.cancel()
+            try:
+                await pump
+            except asyncio.CancelledError:
+                pass
+
+    @staticmethod
+    async def _pump(source: AsyncIterator[str], queue: asyncio.Queue) -> None:
+        """Forward `source` into `queue`, ending with a marker or the error."""
+        try:
+            async with aclosing(source) as stream:
+                async for chunk in stream:
+                    queue.put_nowait(chunk)
+            queue.put_nowait(_END)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            queue.put_nowait(e)
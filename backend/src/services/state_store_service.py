@@ -0,0 +1,266 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# "memory" keeps state per process; "sqlite" shares it across uvicorn workers
+STATE_STORE_BACKEND: str = os.getenv("STATE_STORE", "memory").lower()
+STATE_STORE_PATH: str = os.getenv("STATE_STORE_PATH", "/tmp/chatbot_state.sqlite3")
+# How long a SQLite call may wait on another worker's write lock; it blocks the event loop meanwhile
+STATE_STORE_BUSY_TIMEOUT_SECONDS: float = float(os.getenv("STATE_STORE_BUSY_TIMEOUT_MS", "100")) / 1000
+PURGE_BATCH: int = 1000
+
+
+class StateStore(ABC):
+    """
+    Namespaced state that must agree across workers.
+
+    Two primitives are offered: expiring key-value entries, whose wall-clock
+    `expires_at` (epoch seconds) marks them absent and purgeable, and an
+    atomic GCRA throttle that keeps one theoretical arrival time per key.
+    """
+
+    @abstractmethod
+    def throttle(self, namespace: str, key: str, interval: float, tolerance: float) -> Optional[float]:
+        """
+        Atomically admit one request under GCRA.
+
+        Args:
+            namespace (str): Limit scope, e.g. a route.
+            key (str): Limited identity, e.g. a user id.
+            interval (float): Seconds of capacity one request consumes.
+            tolerance (float): How far ahead of now the arrival time may run.
+
+        Returns:
+            Optional[float]: None when admitted, else seconds until it would be.
+        """
+
+    @abstractmethod
+    def evict_idle(self) -> int:
+        """Drop throttle keys whose capacity has fully recovered."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, expires_at: float) -> None:
+        """Create or replace an entry."""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return an entry's live value, if any."""
+
+    @abstractmethod
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        """Atomically remove an entry and return its live value, if any."""
+
+    @abstractmethod
+    def purge_expired(self, limit: int = PURGE_BATCH) -> int:
+        """Remove up to `limit` expired entries; returns how many were removed."""
+
+    @abstractmethod
+    def count(self, namespace: str) -> int:
+        """Number of stored (possibly expired, not yet purged) entries."""
+
+    def close(self) -> None:
+        """Release resources held by the store."""
+
+
+class InMemoryStateStore(StateStore):
+    """
+    Per-process store.
+
+    Throttle keys are a single float on the monotonic clock; expiring
+    entries are found through a min-heap.
+    """
+
+    def __init__(self) -> None:
+        self._arrivals: Dict[str, Dict[str, float]] = {}
+        self._values: Dict[str, Dict[str, Any]] = {}
+        self._expiry: Dict[str, Dict[str, float]] = {}
+        self._expiry_heap: List[Tuple[float, str, str]] = []
+
+    def throttle(self, namespace: str, key: str, interval: float, tolerance: float) -> Optional[float]:
+        now = time.monotonic()
+        arrivals = self._arrivals.get(namespace)
+        if arrivals is None:
+            arrivals = self._arrivals[namespace] = {}
+        arrival = arrivals.get(key, now)
+        if arrival < now:
+            arrival = now
+        if arrival - now > tolerance:
+            return arrival - now - tolerance
+        arrivals[key] = arrival + interval
+        return None
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        for namespace, arrivals in list(self._arrivals.items()):
+            idle = [key for key, arrival in arrivals.items() if arrival <= now]
+            for key in idle:
+                del arrivals[key]
+            evicted += len(idle)
+            if not arrivals:
+                del self._arrivals[namespace]
+        return evicted
+
+    def _namespace(self, namespace: str) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        values = self._values.get(namespace)
+        if values is None:
+            values = self._values[namespace] = {}
+            self._expiry[namespace] = {}
+        return values, self._expiry[namespace]
+
+    def set(self, namespace: str, key: str, value: Any, expires_at: float) -> None:
+        values, expiry = self._namespace(namespace)
+        values[key] = value
+        expiry[key] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, namespace, key))
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        values, expiry = self._namespace(namespace)
+        if expiry.get(key, 0.0) <= time.time():
+            return None
+        return values.get(key)
+
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        values, expiry = self._namespace(namespace)
+        value = values.pop(key, None)
+        expires_at = expiry.pop(key, 0.0)
+        if value is None or expires_at <= time.time():
+            return None
+        return value
+
+    def purge_expired(self, limit: int = PURGE_BATCH) -> int:
+        now = time.time()
+        heap = self._expiry_heap
+        purged = 0
+        while heap and heap[0][0] <= now and purged < limit:
+            indexed_at, namespace, key = heapq.heappop(heap)
+            values, expiry = self._namespace(namespace)
+            # Skip entries already removed or replaced since they were indexed
+            if expiry.get(key) != indexed_at:
+                continue
+            del values[key]
+            del expiry[key]
+            purged += 1
+        return purged
+
+    def count(self, namespace: str) -> int:
+        return len(self._values.get(namespace, ())) + len(self._arrivals.get(namespace, ()))
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Store shared by every process on the host through one SQLite file.
+
+    WAL mode lets readers and the single writer proceed concurrently; each
+    read-modify-write runs in a `BEGIN IMMEDIATE` transaction so concurrent
+    workers serialize on it. Operations are sub-millisecond, so they run
+    inline rather than in a thread pool; in exchange the busy timeout is
+    kept short, so a wedged writer raises `sqlite3.OperationalError`
+    instead of stalling every request on the event loop.
+    """
+
+    def __init__(self, path: str = STATE_STORE_PATH, busy_timeout: float = STATE_STORE_BUSY_TIMEOUT_SECONDS) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # Workers starting together contend for the schema setup, which may wait longer
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)")
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    def throttle(self, namespace: str, key: str, interval: float, tolerance: float) -> Optional[float]:
+        # Wall clock: comparable across processes and across restarts. The
+        # arrival time doubles as the row's expiry, when the key goes idle.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT expires_at FROM state WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                arrival = max(row[0], now) if row is not None else now
+                if arrival - now > tolerance:
+                    retry_after: Optional[float] = arrival - now - tolerance
+                else:
+                    retry_after = None
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, NULL, ?)",
+                        (namespace, key, arrival + interval),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return retry_after
+
+    def evict_idle(self) -> int:
+        evicted = 0
+        while True:
+            purged = self.purge_expired()
+            evicted += purged
+            if purged < PURGE_BATCH:
+                return evicted
+
+    def set(self, namespace: str, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, expires_at),
+            )
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def pop(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key = ? RETURNING value, expires_at",
+                (namespace, key),
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    def purge_expired(self, limit: int = PURGE_BATCH) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM state WHERE (namespace, key) IN"
+                " (SELECT namespace, key FROM state WHERE expires_at <= ? LIMIT ?)",
+                (time.time(), limit),
+            )
+        return cursor.rowcount
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM state WHERE namespace = ?", (namespace,)
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=1)
+def get_state_store() -> StateStore:
+    """The process-wide store selected by STATE_STORE."""
+    if STATE_STORE_BACKEND == "sqlite":
+        return SQLiteStateStore(STATE_STORE_PATH)
+    return InMemoryStateStore()
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional
+from uuid import uuid4
+
+from src.services.state_store_service import InMemoryStateStore, StateStore
+
+# How often each worker looks for stop requests received by another worker
+STREAM_CANCEL_POLL_SECONDS: float = float(os.getenv("STREAM_CANCEL_POLL_SECONDS", "0.5"))
+# Longest a stream is expected to run; its shared registration expires after this
+STREAM_REGISTRATION_TTL_SECONDS: float = float(os.getenv("STREAM_REGISTRATION_TTL_SECONDS", "3600"))
+# Stop requests outlive several polls, so a busy worker still sees them
+STREAM_CANCEL_TTL_SECONDS: float = 60.0
+
+
+class StreamHandle:
+    """An in-flight generation that another request may stop."""
+
+    __slots__ = ("id", "user_id", "started", "opened_at", "cancelled", "_callbacks")
+
+    def __init__(self, stream_id: str, user_id: str) -> None:
+        self.id = stream_id
+        self.user_id = user_id
+        self.started: float = time.monotonic()
+        # Wall clock, comparable with stop requests published by other workers
+        self.opened_at: float = time.time()
+        self.cancelled: bool = False
+        self._callbacks: List[Callable[[], None]] = []
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Run `callback` when the stream is cancelled (at once if it already is)."""
+        if self.cancelled:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class StreamRegistryService:
+    """
+    Per-user registry of in-flight streams.
+
+    Streams register when they start and unregister when they end for any
+    reason, so the registry only ever holds live generations. Cancelling a
+    handle makes its output stage stop the upstream request at once.
+
+    Each stream is also registered in the state store. A stop request that
+    reaches a worker not running the stream publishes a cancel flag there,
+    which the owning worker picks up within STREAM_CANCEL_POLL_SECONDS. With
+    the per-process default store this only reaches streams of the same
+    worker; pass a shared store (STATE_STORE=sqlite) to stop streams on any.
+    """
+
+    STREAM_NAMESPACE = "streams"
+    CANCEL_NAMESPACE = "stream_cancels"
+
+    def __init__(self, store: Optional[StateStore] = None) -> None:
+        self._streams: Dict[str, Dict[str, StreamHandle]] = {}
+        self.store: StateStore = store if store is not None else InMemoryStateStore()
+        self._poll_task: Optional[asyncio.Task] = None
+
+    def open(self, user_id: str) -> StreamHandle:
+        handle = StreamHandle(uuid4().hex, user_id)
+        self._streams.setdefault(user_id, {})[handle.id] = handle
+        self.store.set(
+            self.STREAM_NAMESPACE, handle.id, user_id, handle.opened_at + STREAM_REGISTRATION_TTL_SECONDS
+        )
+        return handle
+
+    def close(self, handle: StreamHandle) -> None:
+        streams = self._streams.get(handle.user_id)
+        if streams is not None and streams.pop(handle.id, None) is not None:
+            self.store.pop(self.STREAM_NAMESPACE, handle.id)
+            self.store.pop(self.CANCEL_NAMESPACE, handle.id)
+            if not streams:
+                del self._streams[handle.user_id]
+
+    def cancel(self, user_id: str, stream_id: Optional[str] = None) -> List[str]:
+        """
+        Cancel one stream of `user_id`, or all of them when `stream_id` is None.
+
+        Streams of this worker stop at once; those of other workers are
+        flagged and stop on their next poll.
+
+        Returns:
+            List[str]: Ids of the cancelled streams; empty if none matched.
+                Without `stream_id`, only this worker's streams are listed.
+        """
+        streams = self._streams.get(user_id, {})
+        expires_at = time.time() + STREAM_CANCEL_TTL_SECONDS
+        if stream_id is None:
+            # Every stream of the user opened before now, wherever it runs
+            self.store.set(self.CANCEL_NAMESPACE, self._user_key(user_id), repr(time.time()), expires_at)
+            handles = list(streams.values())
+        elif stream_id in streams:
+            handles = [streams[stream_id]]
+        elif self.store.get(self.STREAM_NAMESPACE, stream_id) == user_id:
+            self.store.set(self.CANCEL_NAMESPACE, stream_id, "1", expires_at)
+            return [stream_id]
+        else:
+            handles = []
+        for handle in handles:
+            handle.cancel()
+        return [handle.id for handle in handles]
+
+    def poll_cancellations(self) -> int:
+        """Cancel local streams that another worker was asked to stop; returns how many."""
+        cancelled = 0
+        for user_id, streams in list(self._streams.items()):
+            stop_all = self.store.get(self.CANCEL_NAMESPACE, self._user_key(user_id))
+            for handle in list(streams.values()):
+                if handle.cancelled:
+                    continue
+                stopped_all = stop_all is not None and float(stop_all) >= handle.opened_at
+                if stopped_all or self.store.get(self.CANCEL_NAMESPACE, handle.id) is not None:
+                    handle.cancel()
+                    cancelled += 1
+        return cancelled
+
+    def start_polling(self, interval_seconds: float = STREAM_CANCEL_POLL_SECONDS) -> None:
+        """Start polling for cross-worker stop requests on the running event loop."""
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll_forever(interval_seconds))
+
+    async def stop_polling(self) -> None:
+        """Stop the polling task."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+    async def _poll_forever(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            if self._streams:
+                self.poll_cancellations()
+
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"user:{user_id}"
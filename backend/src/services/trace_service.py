@@ -0,0 +1,223 @@
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+TRACE_ENABLED: bool = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Requests whose first token (or, for non-streamed ones, whose response) takes
+# at least this long are kept for the slow-request endpoint
+TRACE_SLOW_MS: float = float(os.getenv("TRACE_SLOW_MS", "3000"))
+TRACE_BUFFER_SIZE: int = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+# Fraction of requests whose stages are timed; the rest only have their total measured
+TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+
+class Trace:
+    """
+    Stage timings of one request.
+
+    Stages that happen once (auth, body parsing, upstream connect) are
+    spans with their start offset; stages repeated per chunk (SSE writes)
+    are summed into totals so a long stream does not grow the trace.
+    """
+
+    __slots__ = ("name", "sampled", "started", "started_at", "duration", "first_token", "status", "spans", "totals")
+
+    def __init__(self, name: str, sampled: bool) -> None:
+        self.name = name
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration: Optional[float] = None
+        # Seconds until the first generated token left the gateway, if any did
+        self.first_token: Optional[float] = None
+        self.status: Optional[int] = None
+        # (name, start, end, attributes); times from perf_counter
+        self.spans: List[Tuple[str, float, float, Optional[Dict[str, object]]]] = []
+        # name -> [count, seconds]
+        self.totals: Dict[str, List[float]] = {}
+
+    @property
+    def latency(self) -> float:
+        """What slowness is judged on: time to first token, else the whole response."""
+        return self.first_token if self.first_token is not None else (self.duration or 0.0)
+
+    def to_dict(self) -> Dict[str, object]:
+        spans = []
+        for name, start, end, attributes in self.spans:
+            span: Dict[str, object] = {
+                "name": name,
+                "start_ms": round((start - self.started) * 1000, 2),
+                "duration_ms": round((end - start) * 1000, 2),
+            }
+            if attributes:
+                span.update(attributes)
+            spans.append(span)
+        return {
+            "name": self.name,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0.0) * 1000, 2),
+            "first_token_ms": round(self.first_token * 1000, 2) if self.first_token is not None else None,
+            "sampled": self.sampled,
+            "spans": spans,
+            "totals": {
+                name: {"count": int(count), "duration_ms": round(seconds * 1000, 2)}
+                for name, (count, seconds) in self.totals.items()
+            },
+        }
+
+
+# The trace of the request being handled; tasks and worker threads inherit it
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attributes", "start")
+
+    def __init__(self, trace: Trace, name: str, attributes: Optional[Dict[str, object]]) -> None:
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.trace.spans.append((self.name, self.start, time.perf_counter(), self.attributes))
+
+
+class _NoSpan:
+    """Stands in for a span outside a sampled trace, at the cost of one lookup."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **attributes: object):
+    """Time the enclosed block as a stage of the current request, if it is sampled."""
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        return _NO_SPAN
+    return _Span(trace, name, attributes or None)
+
+
+def record_span(name: str, start: float, end: float, **attributes: object) -> None:
+    """Add a stage measured elsewhere (perf_counter times) to the current request."""
+    trace = current_trace.get()
+    if trace is not None and trace.sampled:
+        trace.spans.append((name, start, end, attributes or None))
+
+
+def accumulate(name: str, seconds: float) -> None:
+    """Add to a stage that repeats within the current request."""
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        return
+    total = trace.totals.get(name)
+    if total is None:
+        trace.totals[name] = [1, seconds]
+    else:
+        total[0] += 1
+        total[1] += seconds
+
+
+def mark_first_token() -> None:
+    """Note that the current request sent its first generated token; sampled or not."""
+    trace = current_trace.get()
+    if trace is not None and trace.first_token is None:
+        trace.first_token = time.perf_counter() - trace.started
+
+
+def is_sampled() -> bool:
+    """Whether the current request's stages are being timed."""
+    trace = current_trace.get()
+    return trace is not None and trace.sampled
+
+
+class TraceService:
+    """
+    Per-request stage traces and a ring buffer of the slow ones.
+
+    Every request gets a trace in a context variable, which spans anywhere
+    below it (dependencies, providers, the connection pool) add to. Only
+    a TRACE_SAMPLE_RATE fraction is timed stage by stage; for the rest a
+    span is a no-op, and only the total duration and time to first token
+    are measured. Streams last as long as the answer, so a streamed request
+    is slow when its first token takes TRACE_SLOW_MS; other requests when
+    the whole response does. Slow ones are kept, sampled or not, in a
+    buffer of the last TRACE_BUFFER_SIZE.
+    """
+
+    def __init__(
+        self,
+        slow_ms: float = TRACE_SLOW_MS,
+        capacity: int = TRACE_BUFFER_SIZE,
+        sample_rate: float = TRACE_SAMPLE_RATE,
+        enabled: bool = TRACE_ENABLED,
+    ) -> None:
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self._slow: Deque[Trace] = deque(maxlen=capacity)
+        self.traced: int = 0
+        self.sampled: int = 0
+        self.slow: int = 0
+
+    def start(self, name: str) -> Trace:
+        trace = Trace(name, self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+        self.traced += 1
+        if trace.sampled:
+            self.sampled += 1
+        return trace
+
+    def finish(self, trace: Trace) -> None:
+        trace.duration = time.perf_counter() - trace.started
+        if trace.latency * 1000 >= self.slow_ms:
+            self.slow += 1
+            self._slow.append(trace)
+
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Optional[Trace]]:
+        """Make a new trace current for the enclosed block; None while tracing is disabled."""
+        if not self.enabled:
+            yield None
+            return
+        trace = self.start(name)
+        token = current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            current_trace.reset(token)
+            self.finish(trace)
+
+    def slow_requests(self, limit: Optional[int] = None, min_ms: float = 0.0) -> List[Dict[str, object]]:
+        """The kept slow requests, newest first."""
+        traces = [trace.to_dict() for trace in reversed(self._slow) if trace.latency * 1000 >= min_ms]
+        return traces[:limit] if limit is not None else traces
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "slow_ms": self.slow_ms,
+            "sample_rate": self.sample_rate,
+            "traced": self.traced,
+            "sampled": self.sampled,
+            "slow": self.slow,
+            "kept": len(self._slow),
+        }
+
+
+trace_service: TraceService = TraceService()
@@ -0,0 +1,216 @@
+import base64
+import binascii
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+from src.middlewares.file_validation_middleware import (
+    MAX_IMAGE_SIZE_BYTES,
+    SNIFF_BYTES,
+    sniff_image_type,
+)
+from src.middlewares.upload_limit_middleware import MAX_IMAGES_PER_REQUEST
+from src.providers.image_pipeline import exceeds_pixel_limit
+from src.services.conversation_service import StoredImage
+
+# Text fields (messages_json and the like) larger than this are rejected
+MAX_FORM_FIELD_BYTES: int = int(os.getenv("MAX_FORM_FIELD_BYTES", str(1024 * 1024)))
+IMAGE_FIELD: str = "image_files"
+
+
+class ImageIngest:
+    """
+    Receives one uploaded image as it streams in.
+
+    The type is sniffed from the first bytes, so a file that is not an
+    allowed image is rejected before the rest of it is read; the size is
+    checked on every chunk and its dimensions, from the header, at the
+    end. Hashing happens alongside. Only the received bytes are held: the
+    stored image is a read-only view of them, and base64 is left to the
+    image pipeline, which encodes whatever it ends up sending.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = MAX_IMAGE_SIZE_BYTES) -> None:
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.content_type: Optional[str] = None
+        self.size: int = 0
+        self._data = bytearray()
+        self._sha256 = hashlib.sha256()
+
+    def feed(self, data: bytes) -> None:
+        """Add a chunk of the file.
+
+        Raises:
+            HTTPException: 400 once the file exceeds the size limit or is not an allowed image.
+        """
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise HTTPException(status_code=400, detail="Image size exceeds limit")
+        self._data += data
+        if self.content_type is None:
+            if len(self._data) < SNIFF_BYTES:
+                return
+            self._sniff()
+            # Bytes held back while sniffing are hashed now
+            data = self._data
+        self._sha256.update(data)
+
+    def finish(self) -> Optional[StoredImage]:
+        """The received image, or None for an empty file part.
+
+        Raises:
+            HTTPException: 400 if a short file is not an allowed image, or
+                if its dimensions exceed IMAGE_MAX_PIXELS.
+        """
+        if not self._data:
+            return None
+        if self.content_type is None:
+            self._sniff()
+            self._sha256.update(self._data)
+        data = memoryview(self._data).toreadonly()
+        if exceeds_pixel_limit(data):
+            raise HTTPException(status_code=400, detail="Image dimensions exceed limit")
+        digest = self._sha256.hexdigest()
+        return StoredImage(digest, self.content_type, self.filename or digest, data)
+
+    def _sniff(self) -> None:
+        content_type = sniff_image_type(bytes(self._data[:SNIFF_BYTES]))
+        if content_type is None:
+            raise HTTPException(status_code=400, detail="Unsupported image type")
+        self.content_type = content_type
+
+
+def ingest_encoded_image(data: str, filename: str = "") -> StoredImage:
+    """
+    Validate a base64 image sent inline (WebSocket turns) like an uploaded one.
+
+    Raises:
+        HTTPException: 400 for invalid base64, an empty or oversized file, or
+            one that is not an allowed image.
+    """
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Image is not valid base64")
+    ingest = ImageIngest(filename)
+    ingest.feed(raw)
+    image = ingest.finish()
+    if image is None:
+        raise HTTPException(status_code=400, detail="Image is empty")
+    return image
+
+
+class ChatForm:
+    """Text fields and images of a chat completion request."""
+
+    def __init__(self, fields: Dict[str, str], images: List[StoredImage]) -> None:
+        self.fields = fields
+        self.images = images
+
+    @property
+    def image_bytes(self) -> int:
+        return sum(len(image.data) for image in self.images)
+
+
+async def ingest_chat_form(
+    request: Request,
+    max_images: int = MAX_IMAGES_PER_REQUEST,
+    max_field_bytes: int = MAX_FORM_FIELD_BYTES,
+) -> ChatForm:
+    """
+    Parse a chat completion form while its body streams in.
+
+    Multipart bodies are parsed chunk by chunk: images go straight into an
+    ImageIngest instead of a spooled temporary file, so an oversized or
+    mislabelled image fails after its first bytes rather than after the
+    whole upload. URL-encoded bodies (no images) use the regular parser.
+
+    Raises:
+        HTTPException: 400 for a malformed body, a bad image or too many
+            images; 413 for an oversized text field.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data":
+        form = await request.form()
+        return ChatForm({key: value for key, value in form.items() if isinstance(value, str)}, [])
+
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+
+    fields: Dict[str, str] = {}
+    images: List[StoredImage] = []
+    header_field = bytearray()
+    header_value = bytearray()
+    part_headers: Dict[bytes, bytes] = {}
+    field_name = ""
+    text: Optional[bytearray] = None
+    image: Optional[ImageIngest] = None
+
+    def on_part_begin() -> None:
+        nonlocal text, image
+        part_headers.clear()
+        text = image = None
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        part_headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        nonlocal field_name, text, image
+        _, disposition = parse_options_header(part_headers.get(b"content-disposition", b""))
+        field_name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        filename = disposition.get(b"filename")
+        if filename is None:
+            text = bytearray()
+        elif field_name == IMAGE_FIELD:
+            if len(images) >= max_images:
+                raise HTTPException(status_code=400, detail=f"At most {max_images} images per request")
+            image = ImageIngest(filename.decode("utf-8", "replace"))
+        # Files under any other field name are skipped unread
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if image is not None:
+            image.feed(data[start:end])
+        elif text is not None:
+            text.extend(data[start:end])
+            if len(text) > max_field_bytes:
+                raise HTTPException(status_code=413, detail=f"Form field '{field_name}' too large")
+
+    def on_part_end() -> None:
+        if image is not None:
+            stored = image.finish()
+            if stored is not None:
+                images.append(stored)
+        elif text is not None:
+            fields[field_name] = text.decode("utf-8", "replace")
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError:
+        raise HTTPException(status_code=400, detail="Malformed multipart body")
+    return ChatForm(fields, images)
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+# Settings modules read at import time
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+
+class FakeClock:
+    """Stands in for the `time` module of a service under test."""
+
+    def __init__(self, start: float = 1000.0) -> None:
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
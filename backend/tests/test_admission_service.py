@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from src.services.admission_service import BATCH, INTERACTIVE, AdmissionRejected, AdmissionService
+
+
+def make_service(queue_size: int = 8) -> AdmissionService:
+    return AdmissionService(["groq"], max_streams=1, queue_size=queue_size, provider_limits={})
+
+
+async def wait_queued(service: AdmissionService, count: int) -> None:
+    while service.stats()["groq"]["queued"] < count:
+        await asyncio.sleep(0)
+
+
+def test_interactive_admitted_before_batch_and_fifo_within_class() -> None:
+    async def scenario() -> list:
+        service = make_service()
+        await service.acquire("groq")
+        order = []
+
+        async def waiter(label: str, priority: str) -> None:
+            await service.acquire("groq", priority)
+            order.append(label)
+
+        tasks = []
+        for label, priority in (("batch-1", BATCH), ("batch-2", BATCH), ("chat-1", INTERACTIVE), ("chat-2", INTERACTIVE)):
+            tasks.append(asyncio.create_task(waiter(label, priority)))
+            await wait_queued(service, len(tasks))
+        for _ in tasks:
+            service.release("groq")
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        service.release("groq")
+        assert service.stats()["groq"]["active"] == 0
+        return order
+
+    assert asyncio.run(scenario()) == ["chat-1", "chat-2", "batch-1", "batch-2"]
+
+
+def test_full_queue_rejects_and_interactive_displaces_batch() -> None:
+    async def scenario() -> None:
+        service = make_service(queue_size=1)
+        await service.acquire("groq")
+        batch = asyncio.create_task(service.acquire("groq", BATCH))
+        await wait_queued(service, 1)
+        with pytest.raises(AdmissionRejected):
+            service.check("groq", BATCH)
+        with pytest.raises(AdmissionRejected):
+            await service.acquire("groq", BATCH)
+
+        chat = asyncio.create_task(service.acquire("groq", INTERACTIVE))
+        with pytest.raises(AdmissionRejected):
+            await batch
+        service.release("groq")
+        await chat
+        stats = service.stats()["groq"]
+        assert (stats["active"], stats["queued"], stats["rejected"]) == (1, 0, 3)
+
+    asyncio.run(scenario())
+
+
+def test_deadline_and_cancellation_leave_the_queue() -> None:
+    async def scenario() -> None:
+        service = make_service()
+        service.deadlines[INTERACTIVE] = 0.01
+        await service.acquire("groq")
+        with pytest.raises(AdmissionRejected):
+            await service.acquire("groq")
+
+        cancelled = asyncio.create_task(service.acquire("groq", BATCH))
+        await wait_queued(service, 1)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert service.stats()["groq"]["queued"] == 0
+
+        # The released slot is free again, not handed to the cancelled waiter
+        service.release("groq")
+        await service.acquire("groq")
+        stats = service.stats()["groq"]
+        assert (stats["active"], stats["timed_out"]) == (1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_unknown_provider_is_not_limited() -> None:
+    service = make_service()
+    asyncio.run(service.acquire("gemini"))
+    service.release("gemini")
+    assert "gemini" not in service.stats()
+
+
+def test_full_queue_of_batch_waiters_passes_interactive_check() -> None:
+    async def scenario() -> None:
+        service = make_service(queue_size=2)
+        await service.acquire("groq")
+        batch = [asyncio.create_task(service.acquire("groq", BATCH)) for _ in range(2)]
+        await wait_queued(service, 2)
+        with pytest.raises(AdmissionRejected):
+            service.check("groq", BATCH)
+        service.check("groq", INTERACTIVE)
+
+        chat = asyncio.create_task(service.acquire("groq", INTERACTIVE))
+        displaced, _ = await asyncio.wait(batch, return_when=asyncio.FIRST_COMPLETED)
+        assert len(displaced) == 1 and isinstance(displaced.pop().exception(), AdmissionRejected)
+        service.release("groq")
+        await chat
+        service.release("groq")
+        await asyncio.gather(*batch, return_exceptions=True)
+
+    asyncio.run(scenario())
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.blob_store_service import BlobStoreService
+from src.services.conversation_service import StoredImage
+
+
+def image(fill: bytes, size: int = 100) -> StoredImage:
+    data = b"\x89PNG\r\n\x1a\n" + fill * (size - 8)
+    return StoredImage(hashlib.sha256(data).hexdigest(), "image/png", "a.png", data)
+
+
+def age(service: BlobStoreService, digest: str, seconds: float) -> None:
+    then = time.time() - seconds
+    os.utime(service._path(digest), (then, then))
+
+
+@pytest.fixture
+def service(tmp_path) -> BlobStoreService:
+    return BlobStoreService(root=str(tmp_path), max_bytes=10 ** 6, use_mmap=False, grace_seconds=0)
+
+
+def test_only_uploaders_can_cite(service) -> None:
+    record = service.put("alice", image(b"a"))
+    with pytest.raises(HTTPException) as missing:
+        service.resolve("bob", [record.ref])
+    assert missing.value.status_code == 404
+
+    [blob] = service.resolve("alice", [record.ref])
+    assert blob.as_upload().file.read() == image(b"a").data
+    # Uploading the same content lets another user cite it, stored once
+    service.put("bob", image(b"a"))
+    assert service.resolve("bob", [record.digest])[0].digest == record.digest
+    stats = service.stats()
+    assert (stats["blobs"], stats["stored"], stats["deduplicated"]) == (1, 1, 1)
+
+
+def test_malformed_reference(service) -> None:
+    with pytest.raises(HTTPException) as invalid:
+        service.resolve("alice", ["sha256:nope"])
+    assert invalid.value.status_code == 400
+
+
+def test_least_recently_used_evicted_over_cap(service) -> None:
+    first, second, third = (service.put("alice", image(fill)) for fill in (b"a", b"b", b"c"))
+    for seconds, record in ((300, first), (200, second), (100, third)):
+        age(service, record.digest, seconds)
+    # Citing the oldest makes it the most recently used
+    service.resolve("alice", [first.ref])
+    service.max_bytes = 250
+
+    assert service.sweep() == 1
+    with pytest.raises(HTTPException):
+        service.resolve("alice", [second.ref])
+    assert len(service.resolve("alice", [first.ref, third.ref])) == 2
+    assert service.stats()["evicted"] == 1
+
+
+def test_grace_period_protects_recent_blobs(tmp_path) -> None:
+    service = BlobStoreService(root=str(tmp_path), max_bytes=0, use_mmap=False, grace_seconds=600)
+    record = service.put("alice", image(b"a"))
+    assert service.sweep() == 0
+    assert service.resolve("alice", [record.ref])
+
+
+def test_expired_references_deleted(tmp_path) -> None:
+    service = BlobStoreService(root=str(tmp_path), use_mmap=False, ttl_seconds=-1, grace_seconds=0)
+    record = service.put("alice", image(b"a"))
+    age(service, record.digest, 10)
+    assert service.sweep() == 1
+    assert not os.path.exists(service._path(record.digest))
+    assert service.stats()["expired"] == 1
+
+
+def test_blob_deleted_from_disk_is_a_404(service) -> None:
+    record = service.put("alice", image(b"a"))
+    [blob] = service.resolve("alice", [record.ref])
+    os.unlink(service._path(record.digest))
+    with pytest.raises(HTTPException) as gone:
+        blob.as_upload()
+    assert gone.value.status_code == 404
+    with pytest.raises(HTTPException):
+        service.resolve("alice", [record.ref])
+    assert service.stats()["missing"] == 1
+
+
+def test_sweep_only_touches_its_own_files(service, tmp_path) -> None:
+    foreign = tmp_path / "notes.txt"
+    foreign.write_text("keep me")
+    stale = tmp_path / ".blob-interrupted.tmp"
+    stale.write_bytes(b"partial")
+    then = time.time() - 10
+    os.utime(foreign, (then, then))
+    os.utime(stale, (then, then))
+    service.sweep()
+    assert foreign.exists()
+    assert not stale.exists()
@@ -0,0 +1,55 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from src.providers.base import BaseProvider
+from src.services.admission_service import AdmissionService
+from src.services.chat_service import ChatService
+from src.services.provider_router_service import CLOSED, OPEN, ProviderRouterService
+from src.services.quota_service import QuotaService
+
+
+class FailingProvider(BaseProvider):
+    def __init__(self, error: Exception) -> None:
+        super().__init__("key", "http://upstream.test")
+        self.error = error
+
+    async def stream_completion(self, messages, image_files=None, **kwargs):
+        raise self.error
+        yield ""
+
+
+def make_service(provider: BaseProvider) -> ChatService:
+    service = ChatService()
+    service.providers = {"groq": provider}
+    service.router = ProviderRouterService(["groq"])
+    service.admission = AdmissionService(["groq"], provider_limits={})
+    service.quota = QuotaService(["groq"], rpm={}, tpm={}, max_retries=0)
+    return service
+
+
+async def run_turns(service: ChatService, turns: int) -> None:
+    for _ in range(turns):
+        with pytest.raises(Exception):
+            stream = service.generate_streaming_response([{"role": "user", "content": "hi"}], requested_provider="groq")
+            async for _ in stream:
+                pass
+
+
+def status_error(status: int) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(None, (), status=status)
+
+
+@pytest.mark.parametrize("error", [ValueError("bad image"), status_error(400), status_error(429)])
+def test_local_and_client_errors_leave_the_circuit_closed(error) -> None:
+    service = make_service(FailingProvider(error))
+    asyncio.run(run_turns(service, 5))
+    assert service.router.stats["groq"].state == CLOSED
+
+
+@pytest.mark.parametrize("error", [status_error(503), aiohttp.ClientConnectionError(), asyncio.TimeoutError()])
+def test_upstream_failures_open_the_circuit(error) -> None:
+    service = make_service(FailingProvider(error))
+    asyncio.run(run_turns(service, 5))
+    assert service.router.stats["groq"].state == OPEN
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import math
+
+from src.routes import chat_routes
+from src.services.sse_output_service import encode_event
+
+
+class StalledSocket:
+    """A client that sends messages but never reads any."""
+
+    def __init__(self) -> None:
+        self.headers = {}
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.closed = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def receive_text(self) -> str:
+        return await self.incoming.get()
+
+    async def send_text(self, text: str) -> None:
+        await asyncio.Event().wait()
+
+    async def close(self, code: int, reason: str = "") -> None:
+        self.closed = (code, reason)
+
+
+def stalled_client(monkeypatch, queue_size: int, cancelled=None) -> StalledSocket:
+    async def authenticate(websocket):
+        return "alice", "free", math.inf
+
+    async def start_turn(user_id, tier, message, open_streams):
+        handle = chat_routes.stream_registry_service.open(user_id)
+        stopped = asyncio.Event()
+        handle.on_cancel(stopped.set)
+        if cancelled is not None:
+            handle.on_cancel(lambda: cancelled.append(handle.id))
+
+        async def frames():
+            try:
+                while not stopped.is_set():
+                    yield encode_event({"type": "chunk", "content": "x"})
+            finally:
+                chat_routes.stream_registry_service.close(handle)
+
+        return handle, frames()
+
+    monkeypatch.setattr(chat_routes, "_authenticate_socket", authenticate)
+    monkeypatch.setattr(chat_routes, "_start_socket_turn", start_turn)
+    monkeypatch.setattr(chat_routes, "WS_SEND_QUEUE_SIZE", queue_size)
+    return StalledSocket()
+
+
+def test_cancel_is_handled_while_the_outbox_is_full(monkeypatch) -> None:
+    cancelled = []
+    websocket = stalled_client(monkeypatch, queue_size=4, cancelled=cancelled)
+    registry = chat_routes.stream_registry_service
+
+    async def scenario() -> None:
+        session = asyncio.create_task(chat_routes.chat_socket(websocket))
+        websocket.incoming.put_nowait(json.dumps({"type": "start"}))
+        await asyncio.sleep(0.05)
+        assert registry._streams.get("alice")
+        # The stream is held back, and an unanswerable message does not stall the loop
+        websocket.incoming.put_nowait(json.dumps({"type": "cancel", "stream_id": "unknown"}))
+        websocket.incoming.put_nowait(json.dumps({"type": "cancel"}))
+        await asyncio.sleep(0.05)
+        assert cancelled == list(registry._streams["alice"])
+        session.cancel()
+        await asyncio.gather(session, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_client_piling_up_replies_is_disconnected(monkeypatch) -> None:
+    websocket = stalled_client(monkeypatch, queue_size=2)
+
+    async def scenario() -> None:
+        for _ in range(4):
+            websocket.incoming.put_nowait("not json")
+        await asyncio.wait_for(chat_routes.chat_socket(websocket), 1)
+
+    asyncio.run(scenario())
+    assert websocket.closed == (chat_routes.WS_POLICY_VIOLATION, "Client is not reading its messages")
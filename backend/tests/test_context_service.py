@@ -0,0 +1,74 @@
+from src.services.context_service import TRUNCATION_MARKER, ContextWindowService
+
+
+def turn(role: str, words: int, tag: str = "") -> dict:
+    return {"role": role, "content": " ".join(f"{tag}{index}" for index in range(words))}
+
+
+def test_within_budget_is_unchanged() -> None:
+    service = ContextWindowService()
+    messages = [turn("user", 10), turn("assistant", 10)]
+    fit = service.fit(messages, 1000)
+    assert fit.messages is messages
+    assert fit.messages_dropped == 0 and fit.tokens_saved == 0
+
+
+def test_oldest_turns_dropped_system_and_latest_kept() -> None:
+    service = ContextWindowService()
+    messages = [
+        turn("system", 5, "s"),
+        turn("user", 100, "old"), turn("assistant", 100, "old"),
+        turn("user", 20, "mid"), turn("assistant", 20, "mid"),
+        turn("user", 10, "new"),
+    ]
+    budget = sum(service.message_tokens(messages[index]) for index in (0, 3, 4, 5))
+    fit = service.fit(messages, budget)
+    assert fit.messages == [messages[0], messages[3], messages[4], messages[5]]
+    assert fit.first_kept == 3
+    assert fit.messages_dropped == 2
+    assert fit.prompt_tokens <= budget
+
+
+def test_history_resumes_on_a_user_turn() -> None:
+    service = ContextWindowService()
+    messages = [turn("user", 100, "a"), turn("assistant", 10, "b"), turn("user", 10, "c")]
+    # Room for the last assistant turn, but it would open the history
+    budget = service.message_tokens(messages[1]) + service.message_tokens(messages[2])
+    fit = service.fit(messages, budget)
+    assert fit.messages == [messages[2]]
+
+
+def test_prefill_after_latest_user_turn_is_pinned() -> None:
+    service = ContextWindowService()
+    prefill = turn("assistant", 30, "p")
+    messages = [turn("user", 200, "old"), turn("assistant", 200, "old"), turn("user", 10, "q"), prefill]
+    budget = service.message_tokens(messages[2]) + service.message_tokens(prefill)
+    fit = service.fit(messages, budget)
+    assert fit.messages == [messages[2], prefill]
+
+
+def test_oversized_user_turn_truncated_before_prefill() -> None:
+    service = ContextWindowService()
+    prefill = turn("assistant", 30, "p")
+    question = turn("user", 2000, "q")
+    budget = service.message_tokens(prefill) + 200
+    fit = service.fit([question, prefill], budget)
+    assert fit.prompt_tokens <= budget
+    assert TRUNCATION_MARKER in fit.messages[0]["content"]
+    assert fit.messages[1] == prefill
+
+
+def test_prefill_keeps_its_tail_as_a_last_resort() -> None:
+    service = ContextWindowService()
+    prefill = turn("assistant", 2000, "p")
+    fit = service.fit([turn("user", 5, "q"), prefill], 300)
+    assert fit.prompt_tokens <= 300
+    kept = fit.messages[-1]["content"]
+    assert kept and prefill["content"].endswith(kept)
+
+
+def test_only_system_messages() -> None:
+    service = ContextWindowService()
+    fit = service.fit([{"role": "system", "content": "x " * 5000}], 100)
+    assert fit.prompt_tokens <= 100
+    assert TRUNCATION_MARKER in fit.messages[0]["content"]
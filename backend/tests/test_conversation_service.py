@@ -0,0 +1,70 @@
+import pytest
+from fastapi import HTTPException
+
+from src.services import conversation_service, state_store_service
+from src.services.conversation_service import ConversationService
+from src.services.state_store_service import SQLiteStateStore
+
+
+def test_turns_are_shared_through_the_store(tmp_path) -> None:
+    path = str(tmp_path / "state.sqlite3")
+    worker, other_worker = ConversationService(SQLiteStateStore(path)), ConversationService(SQLiteStateStore(path))
+    conversation = worker.start("alice")
+    worker.add_turn(conversation, [{"role": "user", "content": "hi"}], ["d1", "d2", "d1"])
+    worker.add_reply(conversation, "hello")
+
+    resumed = other_worker.get("alice", conversation.id)
+    assert resumed.messages == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    assert resumed.images == [("d1", 0), ("d2", 0)]
+    with pytest.raises(HTTPException):
+        other_worker.get("bob", conversation.id)
+
+
+def test_not_stored_until_first_turn() -> None:
+    service = ConversationService()
+    conversation = service.start("alice")
+    with pytest.raises(HTTPException):
+        service.get("alice", conversation.id)
+
+
+def test_oldest_messages_dropped_beyond_max_chars() -> None:
+    service = ConversationService(max_chars=10)
+    conversation = service.start("alice")
+    service.add_turn(conversation, [{"role": "user", "content": "aaaaaa"}])
+    service.add_reply(conversation, "bbbbbb")
+    assert [m["content"] for m in service.get("alice", conversation.id).messages] == ["bbbbbb"]
+    # The newest message is kept whatever its size
+    service.add_turn(conversation, [{"role": "user", "content": "c" * 50}])
+    assert [m["content"] for m in service.get("alice", conversation.id).messages] == ["c" * 50]
+
+
+def test_idle_conversations_expire(clock, monkeypatch) -> None:
+    monkeypatch.setattr(state_store_service, "time", clock)
+    monkeypatch.setattr(conversation_service, "time", clock)
+    service = ConversationService(idle_ttl_seconds=60)
+    conversation = service.start("alice")
+    service.add_turn(conversation, [{"role": "user", "content": "hi"}])
+    clock.advance(59)
+    service.get("alice", conversation.id)
+    clock.advance(1)
+    with pytest.raises(HTTPException):
+        service.get("alice", conversation.id)
+
+
+def test_images_go_with_their_turns() -> None:
+    service = ConversationService(max_chars=10, max_images=3)
+    conversation = service.start("alice")
+    service.add_turn(conversation, [{"role": "user", "content": "aaaa"}], ["d1", "d2"])
+    service.add_reply(conversation, "bb")
+    service.add_turn(conversation, [{"role": "user", "content": "cc"}], ["d3", "d1"])
+    # d1 was cited again, so it now belongs to the latest turn
+    assert conversation.images == [("d2", 0), ("d3", 2), ("d1", 2)]
+    assert conversation.images_since(2, 1) == ["d1"]
+
+    service.add_reply(conversation, "dddd")
+    # The first turn was trimmed, and its image with it
+    assert [m["content"] for m in conversation.messages] == ["bb", "cc", "dddd"]
+    assert conversation.images == [("d3", 1), ("d1", 1)]
+
+    service.add_turn(conversation, [{"role": "user", "content": "e"}], ["d4", "d5"])
+    assert [digest for digest, _ in conversation.images] == ["d1", "d4", "d5"]
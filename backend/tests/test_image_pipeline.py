@@ -0,0 +1,63 @@
+import base64
+import io
+import struct
+import zlib
+
+import pytest
+from fastapi import HTTPException
+
+pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+from src.providers.image_pipeline import _transcode, exceeds_pixel_limit  # noqa: E402
+from src.services.upload_ingest_service import ingest_encoded_image  # noqa: E402
+
+
+def png_header(width: int, height: int) -> bytes:
+    """A tiny PNG that declares `width` x `height` 1-bit pixels."""
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\0")) + chunk(b"IEND", b"")
+
+
+def encode(img: Image.Image, pil_format: str, **options) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format=pil_format, **options)
+    return out.getvalue()
+
+
+def test_bomb_is_refused_from_its_header() -> None:
+    bomb = png_header(20000, 20000)
+    assert exceeds_pixel_limit(bomb)
+    assert _transcode(bomb, "image/png", 1024) == (bomb, "image/png")
+    with pytest.raises(HTTPException) as refused:
+        ingest_encoded_image(base64.b64encode(bomb).decode())
+    assert refused.value.status_code == 400
+
+
+def test_pixel_cap() -> None:
+    raw = encode(Image.new("RGB", (40, 30)), "PNG")
+    assert not exceeds_pixel_limit(raw, max_pixels=1200)
+    assert exceeds_pixel_limit(raw, max_pixels=1199)
+    assert not exceeds_pixel_limit(b"not an image")
+
+
+def test_exif_orientation_is_applied() -> None:
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+    raw = encode(Image.new("RGB", (40, 20)), "JPEG", exif=exif.tobytes())
+    payload, _ = _transcode(raw, "image/jpeg", 1024)
+    with Image.open(io.BytesIO(payload)) as img:
+        assert img.size == (20, 40)
+        assert img.getexif().get(0x0112, 1) == 1
+
+
+def test_large_images_are_downscaled() -> None:
+    raw = encode(Image.effect_noise((600, 300), 64).convert("RGB"), "JPEG", quality=95)
+    payload, mime_type = _transcode(raw, "image/jpeg", 200)
+    with Image.open(io.BytesIO(payload)) as img:
+        assert max(img.size) == 200
+    assert mime_type == "image/jpeg"
@@ -0,0 +1,62 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+from src.services import quota_service
+from src.services.quota_service import QuotaExceeded, QuotaService, parse_reset, parse_retry_after
+
+
+def make_service(**kwargs) -> QuotaService:
+    return QuotaService(["groq"], rpm={}, tpm={}, **kwargs)
+
+
+def test_retry_delay_backs_off_exponentially_with_jitter() -> None:
+    service = make_service(max_retries=3)
+    base = quota_service.QUOTA_RETRY_BASE_SECONDS
+    for attempt in range(3):
+        ceiling = base * 2 ** attempt
+        delay = service.retry_delay("groq", 503, {}, attempt)
+        assert ceiling / 2 <= delay <= ceiling
+    assert service.stats()["groq"]["retried"] == 3
+
+
+def test_retry_delay_honours_retry_after() -> None:
+    service = make_service()
+    delay = service.retry_delay("groq", 429, {"retry-after": "2"}, 0)
+    assert 2.0 <= delay <= 2.2
+
+
+@pytest.mark.parametrize(
+    "status, headers, attempt",
+    [
+        (400, {}, 0),  # not retryable
+        (429, {}, 2),  # out of attempts
+        (429, {"retry-after": "3600"}, 0),  # longer than is worth waiting
+    ],
+)
+def test_retry_delay_gives_up(status, headers, attempt) -> None:
+    service = make_service(max_retries=2)
+    assert service.retry_delay("groq", status, headers, attempt) is None
+    assert service.stats()["groq"]["retried"] == 0
+
+
+def test_retry_delay_unknown_provider() -> None:
+    assert make_service().retry_delay("gemini", 429, {}, 0) is None
+
+
+def test_header_parsing() -> None:
+    assert parse_retry_after("1.5") == 1.5
+    assert parse_retry_after("soon") is None
+    assert 0 < parse_retry_after(formatdate(timeval=time.time() + 30, usegmt=True)) <= 30
+    assert parse_reset("2m59.5s") == pytest.approx(179.5)
+    assert parse_reset("250ms") == pytest.approx(0.25)
+
+
+def test_429_pauses_the_provider() -> None:
+    service = make_service(max_wait_seconds=1.0)
+    service.observe("groq", 429, {"retry-after": "30"})
+    with pytest.raises(QuotaExceeded) as exceeded:
+        asyncio.run(service.reserve("groq", 10))
+    assert exceeded.value.retry_after == pytest.approx(30, abs=1)
@@ -0,0 +1,65 @@
+import pytest
+
+from src.services import state_store_service
+from src.services.rate_limit_service import RateLimit, RateLimitExceeded, RateLimitService
+from src.services.state_store_service import InMemoryStateStore
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch) -> RateLimitService:
+    monkeypatch.setattr(state_store_service, "time", clock)
+    # 3 requests per 3 seconds: one every second, bursts of three
+    return RateLimitService(
+        limits={("chat", "default"): RateLimit(3, 3), ("chat", "premium"): RateLimit(6, 3)},
+        store=InMemoryStateStore(),
+    )
+
+
+def test_burst_then_retry_after(limiter, clock) -> None:
+    for _ in range(3):
+        limiter.check_rate_limit("alice")
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        limiter.check_rate_limit("alice")
+    assert exceeded.value.retry_after == pytest.approx(1.0)
+
+    clock.advance(1.0)
+    limiter.check_rate_limit("alice")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check_rate_limit("alice")
+
+
+def test_refused_requests_do_not_consume_capacity(limiter, clock) -> None:
+    for _ in range(3):
+        limiter.check_rate_limit("alice")
+    for _ in range(5):
+        with pytest.raises(RateLimitExceeded):
+            limiter.check_rate_limit("alice")
+    clock.advance(1.0)
+    limiter.check_rate_limit("alice")
+
+
+def test_keys_are_independent_per_user_and_route(limiter) -> None:
+    for _ in range(3):
+        limiter.check_rate_limit("alice")
+    limiter.check_rate_limit("bob")
+    limiter.check_rate_limit("alice", route="images")
+
+
+def test_tier_selects_its_limit(limiter) -> None:
+    for _ in range(6):
+        limiter.check_rate_limit("alice", tier="premium")
+    with pytest.raises(RateLimitExceeded):
+        limiter.check_rate_limit("alice", tier="premium")
+    # Unlisted tiers fall back to the route's default limit
+    assert limiter.limit_for("chat", "gold").requests == 3
+
+
+def test_idle_keys_are_evicted_once_recovered(limiter, clock) -> None:
+    limiter.check_rate_limit("alice")
+    limiter.check_rate_limit("bob")
+    limiter.check_rate_limit("bob")
+    clock.advance(1.0)
+    assert limiter.evict_idle() == 1
+    clock.advance(1.0)
+    assert limiter.evict_idle() == 1
+    assert limiter.evict_idle() == 0
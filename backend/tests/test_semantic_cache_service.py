@@ -0,0 +1,25 @@
+import pytest
+
+from src.services import semantic_cache_service
+from src.services.semantic_cache_service import SemanticCacheService
+
+
+def prompt(text: str) -> list:
+    return [{"role": "user", "content": text}]
+
+
+def test_enabling_without_numpy_fails_fast(monkeypatch) -> None:
+    monkeypatch.setattr(semantic_cache_service, "np", None)
+    with pytest.raises(RuntimeError):
+        SemanticCacheService(enabled=True)
+    assert SemanticCacheService(enabled=False).stats()["enabled"] is False
+
+
+def test_near_duplicate_prompt_hits() -> None:
+    pytest.importorskip("numpy")
+    cache = SemanticCacheService(enabled=True, threshold=0.9, dimensions=256)
+    cache.put("groq", prompt("What is the capital of France?"), ["Paris"], [0.0])
+    hit = cache.get("groq", prompt("what is the capital of  france"))
+    assert hit is not None and hit[0].chunks == ["Paris"]
+    assert cache.get("gemini", prompt("What is the capital of France?")) is None
+    assert cache.get("groq", prompt("How do I bake sourdough bread?")) is None
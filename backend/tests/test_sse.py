@@ -0,0 +1,47 @@
+from src.providers.sse import SSEDecoder
+
+
+def feed_all(decoder: SSEDecoder, chunks) -> list:
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    return events + decoder.flush()
+
+
+def test_events_split_at_every_byte() -> None:
+    stream = b'data: {"a": 1}\n\ndata: {"b": 2}\n\n'
+    decoder = SSEDecoder()
+    assert feed_all(decoder, [stream[i:i + 1] for i in range(len(stream))]) == ['{"a": 1}', '{"b": 2}']
+
+
+def test_utf8_sequence_split_across_chunks() -> None:
+    stream = "data: héllo 🌍\n\n".encode()
+    cut = stream.index("🌍".encode()) + 2
+    decoder = SSEDecoder()
+    assert decoder.feed(stream[:cut]) == []
+    assert decoder.feed(stream[cut:]) == ["héllo 🌍"]
+
+
+def test_crlf_split_between_chunks() -> None:
+    decoder = SSEDecoder()
+    assert feed_all(decoder, [b"data: one\r", b"\n\r", b"\ndata: two\r\n\r\n"]) == ["one", "two"]
+
+
+def test_multiline_data_comments_and_event_id() -> None:
+    decoder = SSEDecoder()
+    events = decoder.feed(b": keep-alive\nid: 7\ndata: first\ndata:second\n\n")
+    assert events == ["first\nsecond"]
+    assert decoder.last_event_id == "7"
+
+
+def test_done_stops_decoding() -> None:
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: x\n\ndata: [DONE]\n\ndata: y\n\n") == ["x"]
+    assert decoder.done
+    assert decoder.feed(b"data: z\n\n") == []
+
+
+def test_flush_dispatches_unterminated_event() -> None:
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: tail") == []
+    assert decoder.flush() == ["tail"]
@@ -0,0 +1,65 @@
+import pytest
+
+from src.services import state_store_service
+from src.services.rate_limit_service import RateLimit, RateLimitExceeded, RateLimitService
+from src.services.state_store_service import InMemoryStateStore, SQLiteStateStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, clock, monkeypatch, tmp_path):
+    monkeypatch.setattr(state_store_service, "time", clock)
+    store = InMemoryStateStore() if request.param == "memory" else SQLiteStateStore(str(tmp_path / "state.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_entries_expire(store, clock) -> None:
+    store.set("tokens", "a", "1", clock.now + 10)
+    assert store.get("tokens", "a") == "1"
+    assert store.get("other", "a") is None
+    clock.advance(10)
+    assert store.get("tokens", "a") is None
+    assert store.pop("tokens", "a") is None
+
+
+def test_pop_removes_once(store, clock) -> None:
+    store.set("tokens", "a", "1", clock.now + 10)
+    assert store.pop("tokens", "a") == "1"
+    assert store.pop("tokens", "a") is None
+
+
+def test_purge_expired_in_batches(store, clock) -> None:
+    for index in range(5):
+        store.set("tokens", str(index), "v", clock.now + 1)
+    store.set("tokens", "live", "v", clock.now + 100)
+    clock.advance(1)
+    assert store.purge_expired(limit=3) == 3
+    assert store.purge_expired() == 2
+    assert store.count("tokens") == 1
+
+
+def test_throttle(store, clock) -> None:
+    assert store.throttle("chat", "alice", 1.0, 1.0) is None
+    assert store.throttle("chat", "alice", 1.0, 1.0) is None
+    assert store.throttle("chat", "alice", 1.0, 1.0) == pytest.approx(1.0)
+    clock.advance(2.0)
+    assert store.evict_idle() == 1
+    assert store.throttle("chat", "alice", 1.0, 1.0) is None
+
+
+def test_sqlite_limit_is_shared_across_workers(clock, monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(state_store_service, "time", clock)
+    path = str(tmp_path / "state.sqlite3")
+    # Each worker opens its own connection to the same file
+    workers = [
+        RateLimitService(limits={("chat", "default"): RateLimit(2, 2)}, store=SQLiteStateStore(path))
+        for _ in range(2)
+    ]
+    workers[0].check_rate_limit("alice")
+    workers[1].check_rate_limit("alice")
+    with pytest.raises(RateLimitExceeded):
+        workers[0].check_rate_limit("alice")
+    with pytest.raises(RateLimitExceeded):
+        workers[1].check_rate_limit("alice")
+    for worker in workers:
+        worker.store.close()
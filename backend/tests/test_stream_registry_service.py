@@ -0,0 +1,55 @@
+import pytest
+
+from src.services.state_store_service import SQLiteStateStore
+from src.services.stream_registry_service import StreamRegistryService
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    registries = [StreamRegistryService(store=SQLiteStateStore(path)) for _ in range(2)]
+    yield registries
+    for registry in registries:
+        registry.store.close()
+
+
+def test_local_stop_is_immediate() -> None:
+    registry = StreamRegistryService()
+    handle = registry.open("alice")
+    stopped = []
+    handle.on_cancel(lambda: stopped.append(handle.id))
+    assert registry.cancel("bob", handle.id) == []
+    assert registry.cancel("alice", handle.id) == [handle.id]
+    assert stopped == [handle.id]
+
+
+def test_stop_reaches_a_stream_on_another_worker(workers) -> None:
+    owner, other = workers
+    handle = owner.open("alice")
+    assert other.cancel("bob", handle.id) == []
+    assert other.cancel("alice", handle.id) == [handle.id]
+    assert not handle.cancelled
+    assert owner.poll_cancellations() == 1
+    assert handle.cancelled
+
+
+def test_stop_all_reaches_only_earlier_streams(workers) -> None:
+    owner, other = workers
+    first = owner.open("alice")
+    unrelated = owner.open("bob")
+    other.cancel("alice")
+    owner.poll_cancellations()
+    assert first.cancelled and not unrelated.cancelled
+    # Streams started after the stop request keep running
+    later = owner.open("alice")
+    later.opened_at += 1
+    owner.poll_cancellations()
+    assert not later.cancelled
+
+
+def test_stopping_a_finished_stream_is_a_no_op(workers) -> None:
+    owner, other = workers
+    handle = owner.open("alice")
+    owner.close(handle)
+    assert other.cancel("alice", handle.id) == []
+    assert owner.cancel("alice", handle.id) == []
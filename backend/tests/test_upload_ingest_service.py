@@ -0,0 +1,53 @@
+import hashlib
+import tracemalloc
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.upload_ingest_service import ImageIngest
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def ingest(data: bytes, chunk: int = 64 * 1024) -> ImageIngest:
+    image = ImageIngest("a.png", max_bytes=len(data))
+    for start in range(0, len(data), chunk):
+        image.feed(data[start:start + chunk])
+    return image
+
+
+def test_image_is_a_read_only_view_of_the_received_bytes() -> None:
+    data = PNG + bytes(range(256)) * 40
+    stored = ingest(data, chunk=5).finish()
+    assert stored.content_type == "image/png"
+    assert stored.digest == hashlib.sha256(data).hexdigest()
+    assert isinstance(stored.data, memoryview) and stored.data.readonly
+    assert stored.data == data
+
+    upload = stored.as_upload()
+    assert upload.file.read(8) == PNG
+    upload.file.seek(0)
+    assert upload.file.read() == data
+
+
+def test_peak_memory_stays_near_the_upload_size() -> None:
+    data = PNG + b"\0" * (4 * 1024 * 1024)
+    # Image plugins load on first use; keep them out of the measurement
+    ingest(PNG + b"\0" * 64).finish()
+    tracemalloc.start()
+    try:
+        image = ingest(data)
+        stored = image.finish()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(stored.data) == len(data)
+    assert peak < 1.3 * len(data)
+
+
+def test_rejected_early() -> None:
+    image = ImageIngest("a.gif", max_bytes=100)
+    with pytest.raises(HTTPException):
+        image.feed(b"GIF89a" + b"\0" * 10)
+    with pytest.raises(HTTPException):
+        ingest(PNG + b"\0" * 100, chunk=50).feed(b"\0")